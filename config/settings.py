@@ -49,6 +49,7 @@ INSTALLED_APPS = [
     'flocks',
     'finances',
     'reports',
+    'sync',
 ]
 
 MIDDLEWARE = [
@@ -150,6 +151,7 @@ REST_FRAMEWORK = {
 
 from datetime import timedelta
 import os
+from celery.schedules import crontab
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=24),
@@ -164,6 +166,14 @@ EMAIL_USE_TLS = False
 EMAIL_USE_SSL = False
 DEFAULT_FROM_EMAIL = 'noreply@poultryfarm.com'
 
+# Cache (per-farm response cache, see core.cache)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('CACHE_URL', 'redis://redis:6379/1'),
+    }
+}
+
 # Channels
 ASGI_APPLICATION = 'config.asgi.application'
 CHANNEL_LAYERS = {
@@ -182,10 +192,46 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Report exports run on their own queue and workers (see docker-compose.yml)
+CELERY_TASK_ROUTES = {
+    'reports.tasks.generate_report_export': {'queue': 'exports'},
+}
 
 CELERY_BEAT_SCHEDULE = {
-    'check-deadlines-every-30-minutes': {
+    'check-deadlines-every-5-minutes': {
         'task': 'reports.tasks.check_deadlines',
-        'schedule': 1800 # Run every 30 minutes
+        'schedule': 300 # Only reads configs that are due, so it can run often
+    },
+    'prune-report-notifications-daily': {
+        'task': 'reports.tasks.prune_report_notifications',
+        'schedule': 86400
+    },
+    'prune-report-exports-daily': {
+        'task': 'reports.tasks.prune_report_exports',
+        'schedule': 86400
+    },
+    'prune-sync-tombstones-daily': {
+        'task': 'sync.tasks.prune_tombstones',
+        'schedule': 86400
+    },
+    'materialize-flock-daily-stats-nightly': {
+        'task': 'flocks.tasks.materialize_flock_daily_stats',
+        'schedule': crontab(hour=1, minute=0)
+    },
+    'create-log-partitions-daily': {
+        'task': 'core.tasks.create_log_partitions',
+        'schedule': 86400
     },
 }
+
+# Cold storage for old logs and reports (see core/archive.py)
+ARCHIVE_ROOT = os.environ.get('ARCHIVE_ROOT', str(BASE_DIR / 'archive'))
+ARCHIVE_HORIZON_DAYS = int(os.environ.get('ARCHIVE_HORIZON_DAYS', 730))
+
+# Background report export packs (see reports/exports.py)
+REPORT_EXPORT_ROOT = os.environ.get('REPORT_EXPORT_ROOT', str(BASE_DIR / 'exports'))
+REPORT_EXPORT_MAX_DAYS = int(os.environ.get('REPORT_EXPORT_MAX_DAYS', 366))
+# Exports queued or running at once, across all farms; further requests get a 429
+REPORT_EXPORT_QUEUE_LIMIT = int(os.environ.get('REPORT_EXPORT_QUEUE_LIMIT', 20))
+REPORT_EXPORT_TIME_LIMIT = int(os.environ.get('REPORT_EXPORT_TIME_LIMIT', 15 * 60))
+REPORT_EXPORT_RETENTION_DAYS = int(os.environ.get('REPORT_EXPORT_RETENTION_DAYS', 7))
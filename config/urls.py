@@ -10,5 +10,6 @@ urlpatterns = [
     path('api/', include('flocks.urls')),
     path('api/', include('finances.urls')),
     path('api/reports/', include('reports.urls')),
+    path('api/', include('sync.urls')),
     path('api/', include('core.urls')),
 ]
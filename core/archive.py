@@ -0,0 +1,161 @@
+"""
+Cold storage for old log and report rows.
+
+The archive_cold_data command moves rows out of the hot tables into one
+zstd-compressed Parquet file per farm, year and table under
+settings.ARCHIVE_ROOT:
+
+    <ARCHIVE_ROOT>/farm_<id>/<year>/<name>.parquet
+
+Columns are the model's field names (foreign keys hold the related id), so
+archived rows line up with `.values()` of the live table. pyarrow is only
+needed once something has been archived.
+"""
+import heapq
+import os
+from itertools import islice
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional until data is archived
+    pa = pq = None
+
+# Archive name -> (model label, date field). Names match the sync API's.
+ARCHIVES = {
+    'feed_logs': ('flocks.FeedLog', 'date'),
+    'health_logs': ('flocks.HealthLog', 'date'),
+    'egg_collections': ('flocks.EggCollection', 'date'),
+    'daily_reports': ('reports.DailyReport', 'reference_date'),
+    'report_answers': ('reports.ReportAnswer', 'reference_date'),
+}
+# Rows held in memory at a time while an archive file is written
+WRITE_BATCH_SIZE = 5000
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImproperlyConfigured('pyarrow is required to read or write archived data.')
+
+
+def archive_model(name):
+    return apps.get_model(ARCHIVES[name][0])
+
+
+def archive_columns(name):
+    return [field.name for field in archive_model(name)._meta.concrete_fields]
+
+
+def archive_path(farm_id, year, name):
+    return Path(settings.ARCHIVE_ROOT) / f'farm_{farm_id}' / str(year) / f'{name}.parquet'
+
+
+def archived_years(farm_id, name, start=None, end=None):
+    """Years with an archive file for this farm and table, within [start, end]."""
+    farm_dir = Path(settings.ARCHIVE_ROOT) / f'farm_{farm_id}'
+    if not farm_dir.is_dir():
+        return []
+    years = sorted(int(path.name) for path in farm_dir.iterdir() if path.name.isdigit())
+    return [
+        year for year in years
+        if (start is None or year >= start.year) and (end is None or year <= end.year)
+        and archive_path(farm_id, year, name).exists()
+    ]
+
+
+def _arrow_type(field):
+    if isinstance(field, models.ForeignKey):
+        return pa.int64()
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC')
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    if isinstance(field, models.DecimalField):
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, (models.IntegerField, models.AutoField)):
+        return pa.int64()
+    return pa.string()
+
+
+def archive_schema(name):
+    return pa.schema([
+        pa.field(field.name, _arrow_type(field)) for field in archive_model(name)._meta.concrete_fields
+    ])
+
+
+def write_archive(farm_id, year, name, rows):
+    """
+    Add `rows` (dicts from `.values(*archive_columns(name))`, ordered by date
+    then id) to the farm's archive file for `year`. They are merged with the
+    rows already archived and written WRITE_BATCH_SIZE at a time, so memory
+    stays flat however many rows are archived. Rows whose id is already
+    archived are skipped, so an interrupted archive run can be repeated. The
+    file is replaced atomically. Returns the number of rows added.
+    """
+    require_pyarrow()
+    path = archive_path(farm_id, year, name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    schema = archive_schema(name)
+    date_field = ARCHIVES[name][1]
+
+    archived = []
+    if path.exists():
+        existing = pq.ParquetFile(path)
+        archived_ids = set(existing.read(columns=['id']).column('id').to_pylist())
+        rows = (row for row in rows if row['id'] not in archived_ids)
+        archived = (
+            row for batch in existing.iter_batches(batch_size=WRITE_BATCH_SIZE, columns=schema.names)
+            for row in batch.to_pylist()
+        )
+
+    added = 0
+
+    def count_added(rows):
+        nonlocal added
+        for row in rows:
+            added += 1
+            yield row
+
+    # Both sides are ordered by date then id, so the file stays ordered for read_archive
+    merged = heapq.merge(archived, count_added(rows), key=lambda row: (row[date_field], row['id']))
+    partial = path.with_suffix('.parquet.tmp')
+    try:
+        with pq.ParquetWriter(partial, schema, compression='zstd') as writer:
+            while batch := list(islice(merged, WRITE_BATCH_SIZE)):
+                writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+        os.replace(partial, path)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    return added
+
+
+def read_archive(farm_id, name, start=None, end=None, **equals):
+    """
+    Yield archived rows of one farm and table as dicts, ordered by date then
+    id, reading one year's file at a time. `start`/`end` bound the date
+    inclusively and `equals` adds exact-match filters on other columns,
+    e.g. read_archive(1, 'feed_logs', flock=4).
+    """
+    years = archived_years(farm_id, name, start, end)
+    if not years:
+        return
+    require_pyarrow()
+
+    date_field = ARCHIVES[name][1]
+    filters = [(column, '=', value) for column, value in equals.items()]
+    if start:
+        filters.append((date_field, '>=', start))
+    if end:
+        filters.append((date_field, '<=', end))
+
+    for year in years:
+        yield from pq.read_table(archive_path(farm_id, year, name), filters=filters or None).to_pylist()
@@ -0,0 +1,248 @@
+import hashlib
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from rest_framework import status
+from rest_framework.response import Response
+
+FARM_VERSION_KEY = 'farm:{farm_id}:version'
+FARM_MODIFIED_KEY = 'farm:{farm_id}:modified'
+FARM_RESPONSE_KEY = 'farm:{farm_id}:v{version}:{endpoint}:{digest}'
+STATS_KEY = 'farm_cache:stats:{endpoint}:{outcome}'
+STATS_ENDPOINTS_KEY = 'farm_cache:stats:endpoints'
+LOCK_KEY = 'lock:{name}'
+RESPONSE_TIMEOUT = 60 * 15
+
+
+def _initial_version():
+    # Seeding from the clock keeps versions increasing even if Redis evicts the counter
+    return int(time.time() * 1000)
+
+
+def get_version(key):
+    """Current value of a version counter, seeding it if missing."""
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def incr_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), timeout=None)
+
+
+def get_farm_version(farm_id):
+    return get_version(FARM_VERSION_KEY.format(farm_id=farm_id))
+
+
+def get_farm_last_modified(farm_id):
+    """Unix time of the farm's last committed write, or now if it was evicted."""
+    key = FARM_MODIFIED_KEY.format(farm_id=farm_id)
+    modified = cache.get(key)
+    if modified is None:
+        cache.add(key, int(time.time()), timeout=None)
+        modified = cache.get(key)
+    return modified
+
+
+def bump_farm_version(farm_id):
+    """
+    Invalidate every cached response for a farm once the current transaction
+    commits, so a concurrent reader cannot cache pre-commit data under the new
+    version.
+    """
+    if farm_id is None:
+        return
+
+    def bump():
+        incr_version(FARM_VERSION_KEY.format(farm_id=farm_id))
+        cache.set(FARM_MODIFIED_KEY.format(farm_id=farm_id), int(time.time()), timeout=None)
+
+    transaction.on_commit(bump)
+
+
+def record_cache_stat(endpoint, outcome):
+    key = STATS_KEY.format(endpoint=endpoint, outcome=outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+    if outcome == 'miss':
+        endpoints = cache.get(STATS_ENDPOINTS_KEY) or set()
+        if endpoint not in endpoints:
+            cache.set(STATS_ENDPOINTS_KEY, endpoints | {endpoint}, timeout=None)
+
+
+def get_cache_stats():
+    """Return {endpoint: {'hit': n, 'miss': n}} for every endpoint seen so far."""
+    endpoints = sorted(cache.get(STATS_ENDPOINTS_KEY) or ())
+    keys = {
+        STATS_KEY.format(endpoint=endpoint, outcome=outcome): (endpoint, outcome)
+        for endpoint in endpoints
+        for outcome in ('hit', 'miss')
+    }
+    stats = {endpoint: {'hit': 0, 'miss': 0} for endpoint in endpoints}
+    for key, value in cache.get_many(keys).items():
+        endpoint, outcome = keys[key]
+        stats[endpoint][outcome] = value
+    return stats
+
+
+def farm_cache_key(farm_id, endpoint, params):
+    digest = hashlib.md5(params.encode()).hexdigest()
+    return FARM_RESPONSE_KEY.format(
+        farm_id=farm_id, version=get_farm_version(farm_id), endpoint=endpoint, digest=digest
+    )
+
+
+def get_or_compute_for_farm(farm_id, endpoint, params, compute, timeout=RESPONSE_TIMEOUT):
+    """Return compute() through the per-farm cache, counting hits and misses."""
+    key = farm_cache_key(farm_id, endpoint, params)
+    data = cache.get(key)
+    if data is not None:
+        record_cache_stat(endpoint, 'hit')
+        return data
+
+    record_cache_stat(endpoint, 'miss')
+    data = compute()
+    cache.set(key, data, timeout)
+    return data
+
+
+def response_day(view):
+    """
+    The local date for viewsets whose responses change with it even without a
+    write (vary_by_day = True, e.g. "last 7 days" figures or ranges defaulting
+    to today), else None.
+    """
+    return timezone.localdate() if getattr(view, 'vary_by_day', False) else None
+
+
+def cache_per_farm(view_method):
+    """
+    Cache a viewset handler's response per farm, endpoint and query string,
+    and per day for vary_by_day viewsets. Keys embed the farm's current
+    version, so bump_farm_version() invalidates them all at once and stale
+    entries simply expire.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        farm_id = getattr(request.user, 'farm_id', None)
+        if farm_id is None:
+            return view_method(self, request, *args, **kwargs)
+
+        endpoint = f'{self.basename}.{self.action}'
+        day = response_day(self)
+        params = f'{request.get_full_path()}@{day}' if day else request.get_full_path()
+        key = farm_cache_key(farm_id, endpoint, params)
+
+        data = cache.get(key)
+        if data is not None:
+            record_cache_stat(endpoint, 'hit')
+            return Response(data)
+
+        record_cache_stat(endpoint, 'miss')
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, RESPONSE_TIMEOUT)
+        return response
+    return wrapper
+
+
+class FarmCacheMixin:
+    """Serve list and retrieve from the per-farm response cache."""
+
+    @cache_per_farm
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_per_farm
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+
+def farm_etag(farm_id, version, request, day=None):
+    digest = hashlib.md5(
+        f"{version}:{day or ''}:{request.get_full_path()}:{request.META.get('HTTP_ACCEPT', '')}".encode()
+    ).hexdigest()
+    return f'"{farm_id}-{digest}"'
+
+
+def conditional_per_farm(view_method):
+    """
+    Give a viewset handler's GET responses a strong ETag and Last-Modified
+    derived from the farm's write version, and answer 304 Not Modified when
+    the client's copy is current, before any query or serialization runs.
+    For vary_by_day viewsets both validators also move at local midnight.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        farm_id = getattr(request.user, 'farm_id', None)
+        if farm_id is None or request.method not in ('GET', 'HEAD'):
+            return view_method(self, request, *args, **kwargs)
+
+        # Read both before computing, so a write racing the handler yields an
+        # older validator and the next poll fetches again.
+        day = response_day(self)
+        etag = farm_etag(farm_id, get_farm_version(farm_id), request, day)
+        last_modified = get_farm_last_modified(farm_id)
+        if day:
+            midnight = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+            last_modified = max(last_modified, int(midnight.timestamp()))
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    return wrapper
+
+
+class ConditionalGetMixin:
+    """
+    Serve list and retrieve with per-farm ETag/Last-Modified validators.
+    List it before FarmCacheMixin so a 304 skips the cache lookup as well.
+    """
+
+    @conditional_per_farm
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_per_farm
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+
+@contextmanager
+def cache_lock(name, timeout):
+    """
+    Hold a lock shared by every process using the cache, e.g. duplicate beat
+    schedulers running the same periodic task. Yields whether it was acquired;
+    callers that did not get it should skip their work. The lock expires after
+    `timeout` seconds in case its holder dies, and is only released by its holder.
+    """
+    key = LOCK_KEY.format(name=name)
+    token = uuid.uuid4().hex
+    acquired = cache.add(key, token, timeout=timeout)
+    try:
+        yield acquired
+    finally:
+        if acquired and cache.get(key) == token:
+            cache.delete(key)
@@ -0,0 +1,110 @@
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from core.archive import WRITE_BATCH_SIZE, archive_columns, require_pyarrow, write_archive
+from core.cache import bump_farm_version
+from flocks.models import Flock, FeedLog, HealthLog, EggCollection
+from reports.models import DailyReport, ReportAnswer
+
+FLOCK_ARCHIVES = (
+    ('feed_logs', FeedLog),
+    ('health_logs', HealthLog),
+    ('egg_collections', EggCollection),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the logs of closed flocks (no birds left, nothing logged within the horizon) "
+        "and daily reports older than the horizon into Parquet files, one per farm, year "
+        "and table, and delete them from the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horizon-days', type=int, default=settings.ARCHIVE_HORIZON_DAYS,
+            help='Only archive data older than this many days (default: ARCHIVE_HORIZON_DAYS)',
+        )
+        parser.add_argument('--farm', type=int, help='Only archive this farm id')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be archived without moving it')
+
+    def handle(self, *args, **options):
+        if not options['dry_run']:
+            require_pyarrow()
+        cutoff = timezone.now().date() - timedelta(days=options['horizon_days'])
+
+        flocks = Flock.objects.filter(
+            farm__isnull=False, archived_at__isnull=True, current_quantity=0, date_added__lt=cutoff,
+        )
+        reports = DailyReport.objects.filter(reference_date__lt=cutoff)
+        if options['farm']:
+            flocks = flocks.filter(farm_id=options['farm'])
+            reports = reports.filter(farm_id=options['farm'])
+        for _, model in FLOCK_ARCHIVES:
+            flocks = flocks.exclude(Exists(model.objects.filter(flock=OuterRef('pk'), date__gte=cutoff)))
+
+        for flock in list(flocks.only('id', 'name', 'farm_id')):
+            counts = self.archive_flock(flock, options['dry_run'])
+            self.stdout.write(f"Flock {flock.id} ({flock.name}): {self.describe(counts)}")
+
+        farm_ids = list(reports.order_by().values_list('farm_id', flat=True).distinct())
+        for farm_id in farm_ids:
+            counts = self.archive_reports(farm_id, reports.filter(farm_id=farm_id), options['dry_run'])
+            self.stdout.write(f"Farm {farm_id} reports: {self.describe(counts)}")
+
+        self.stdout.write(self.style.SUCCESS('Dry run finished.' if options['dry_run'] else 'Archive finished.'))
+
+    def describe(self, counts):
+        return ', '.join(f"{count} {name}" for name, count in counts.items()) or 'nothing to archive'
+
+    def write_by_year(self, farm_id, name, queryset, date_field):
+        """Stream the queryset into its yearly archive files, in date order."""
+        rows = (
+            queryset.order_by(date_field, 'id').values(*archive_columns(name))
+            .iterator(chunk_size=WRITE_BATCH_SIZE)
+        )
+        return sum(
+            write_archive(farm_id, year, name, year_rows)
+            for year, year_rows in groupby(rows, key=lambda row: row[date_field].year)
+        )
+
+    def archive_flock(self, flock, dry_run):
+        counts = {}
+        for name, model in FLOCK_ARCHIVES:
+            queryset = model.objects.filter(flock=flock)
+            counts[name] = queryset.count() if dry_run else self.write_by_year(flock.farm_id, name, queryset, 'date')
+        if dry_run:
+            return counts
+
+        # The files are written before anything is deleted. Raw deletes skip the
+        # per-row signals: archived rows are not removals, so they must not
+        # leave sync tombstones or touch headcounts.
+        with transaction.atomic():
+            for _, model in FLOCK_ARCHIVES:
+                queryset = model.objects.filter(flock=flock)
+                queryset._raw_delete(queryset.db)
+            now = timezone.now()
+            Flock.objects.filter(pk=flock.pk).update(archived_at=now, updated_at=now)
+            bump_farm_version(flock.farm_id)
+        return counts
+
+    def archive_reports(self, farm_id, reports, dry_run):
+        answers = ReportAnswer.objects.filter(report__in=reports)
+        if dry_run:
+            return {'daily_reports': reports.count(), 'report_answers': answers.count()}
+
+        counts = {
+            'daily_reports': self.write_by_year(farm_id, 'daily_reports', reports, 'reference_date'),
+            'report_answers': self.write_by_year(farm_id, 'report_answers', answers, 'reference_date'),
+        }
+        with transaction.atomic():
+            answers._raw_delete(answers.db)
+            reports._raw_delete(reports.db)
+            bump_farm_version(farm_id)
+        return counts
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.cache import get_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counters for the per-farm response cache."
+
+    def handle(self, *args, **options):
+        stats = get_cache_stats()
+        if not stats:
+            self.stdout.write("No cached endpoints have been requested yet.")
+            return
+
+        for endpoint, counts in stats.items():
+            total = counts['hit'] + counts['miss']
+            ratio = counts['hit'] / total * 100 if total else 0
+            self.stdout.write(f"{endpoint}: {counts['hit']} hits, {counts['miss']} misses ({ratio:.1f}% hit rate)")
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.partitioning import (
+    PARTITIONED_TABLES, add_months, detach_partitions, ensure_partitions, is_postgres, list_partitions, month_start,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create monthly partitions of the log and report answer tables ahead of time, "
+        "and optionally detach (or drop) partitions older than a retention window. Only "
+        "partitions that archive_cold_data has already emptied are detached."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3, help='Months past the current one to create (default 3)')
+        parser.add_argument('--retain-months', type=int, help='Detach emptied partitions that ended more than this many months ago, '
+                                 'no later than the archive horizon')
+        parser.add_argument('--drop', action='store_true', help='Drop detached partitions instead of keeping them for archiving')
+        parser.add_argument('--list', action='store_true', help='Only list the attached partitions')
+
+    def handle(self, *args, **options):
+        if not is_postgres():
+            raise CommandError('Table partitioning is only available on PostgreSQL.')
+
+        if options['list']:
+            for table in PARTITIONED_TABLES:
+                for name, month in list_partitions(table):
+                    self.stdout.write(f"{table}: {name} ({month or 'DEFAULT'})")
+            return
+
+        for name in ensure_partitions(options['months_ahead']):
+            self.stdout.write(f"Created {name}")
+
+        if options['retain_months'] is not None:
+            if options['retain_months'] < 1:
+                raise CommandError('--retain-months must be at least 1')
+            cutoff = add_months(month_start(timezone.localdate()), -options['retain_months'])
+            try:
+                detached = detach_partitions(cutoff, drop=options['drop'])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            for name in detached:
+                self.stdout.write(f"{'Dropped' if options['drop'] else 'Detached'} {name}")
+        self.stdout.write(self.style.SUCCESS('Partitions are up to date.'))
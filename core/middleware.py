@@ -0,0 +1,31 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import TokenError
+
+
+@database_sync_to_async
+def get_token_user(raw_token):
+    authentication = JWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (AuthenticationFailed, TokenError):
+        return AnonymousUser()
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authenticate websocket connections from a `?token=<access token>` query
+    param, since the mobile app cannot set headers on the handshake. Without
+    a token the user set by the inner session middleware is kept.
+    """
+
+    async def __call__(self, scope, receive, send):
+        token = parse_qs(scope.get('query_string', b'').decode()).get('token')
+        if token:
+            scope['user'] = await get_token_user(token[0])
+        return await super().__call__(scope, receive, send)
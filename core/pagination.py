@@ -0,0 +1,24 @@
+from rest_framework.pagination import CursorPagination
+
+
+class DateCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (date, id), newest first.
+    Each page seeks past the previous page's last (date, id) instead of using
+    an OFFSET, so later pages cost no more than the first. Transactions and
+    daily reports have a (farm, date) index to serve that seek directly; flock
+    logs are filtered through their flock's farm and use the (flock, date)
+    index per flock.
+    """
+    ordering = ('-date', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class FlockCursorPagination(DateCursorPagination):
+    ordering = ('-date_added', '-id')
+
+
+class DailyReportCursorPagination(DateCursorPagination):
+    ordering = ('-reference_date', '-id')
@@ -0,0 +1,239 @@
+"""
+Monthly range partitioning of the append-only log tables on PostgreSQL.
+
+The models keep `id` as their Django primary key; on the database side the
+primary key becomes (id, <date column>) because PostgreSQL requires the
+partition key in every unique constraint. Ids still come from one sequence per
+table, so ORM lookups by pk are unaffected. A DEFAULT partition catches rows
+outside the created ranges, so an insert never fails because a partition is
+missing; ensure_partitions() moves such rows into their month when it runs.
+Old partitions are only detached once archive_cold_data has moved their rows
+to the Parquet archive, where core.archive.read_archive still serves them.
+Everything here is a no-op on other database backends.
+"""
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+# db_table -> partition key column
+PARTITIONED_TABLES = {
+    'flocks_feedlog': 'date',
+    'flocks_healthlog': 'date',
+    'flocks_eggcollection': 'date',
+    'reports_reportanswer': 'reference_date',
+}
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+
+def default_partition_name(table):
+    return f"{table}_default"
+
+
+def is_postgres(conn=None):
+    return (conn or connection).vendor == 'postgresql'
+
+
+def _quote(conn, name):
+    return conn.ops.quote_name(name)
+
+
+def _bounds(month):
+    return f"FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+
+
+def _is_partitioned(cursor, table):
+    cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table])
+    return cursor.fetchone() is not None
+
+
+def partition_table(schema_editor, table, column, months_ahead=3):
+    """
+    Rebuild `table` as a range-partitioned table on `column`, keeping its
+    columns, indexes, foreign keys and id sequence, and copy its rows across.
+    Meant to be called from a migration's RunPython.
+    """
+    conn = schema_editor.connection
+    if not is_postgres(conn):
+        return
+    q = lambda name: _quote(conn, name)
+    legacy = f"{table}_unpartitioned"
+    with conn.cursor() as cursor:
+        if _is_partitioned(cursor, table):
+            return
+
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'", [table]
+        )
+        (primary_key,) = cursor.fetchone()
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = current_schema() "
+            "AND tablename = %s AND indexname <> %s",
+            [table, primary_key],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f"SELECT MIN({q(column)}), MAX(id) FROM {q(table)}")
+        first_day, max_id = cursor.fetchone()
+
+        cursor.execute(f"ALTER TABLE {q(table)} RENAME TO {q(legacy)}")
+        cursor.execute(f"ALTER TABLE {q(legacy)} RENAME CONSTRAINT {q(primary_key)} TO {q(legacy + '_pkey')}")
+        for name, _ in indexes:
+            cursor.execute(f"DROP INDEX {q(name)}")
+        for name, _ in foreign_keys:
+            cursor.execute(f"ALTER TABLE {q(legacy)} DROP CONSTRAINT {q(name)}")
+
+        cursor.execute(
+            f"CREATE TABLE {q(table)} (LIKE {q(legacy)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE) "
+            f"PARTITION BY RANGE ({q(column)})"
+        )
+        cursor.execute(f"ALTER TABLE {q(table)} ALTER COLUMN id DROP DEFAULT")
+        cursor.execute(f"ALTER TABLE {q(table)} ADD PRIMARY KEY (id, {q(column)})")
+        for _, definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {q(table)} ADD CONSTRAINT {q(name)} {definition}")
+
+        cursor.execute(f"CREATE TABLE {q(default_partition_name(table))} PARTITION OF {q(table)} DEFAULT")
+        today = timezone.localdate()
+        month = month_start(first_day or today)
+        last = add_months(month_start(today), months_ahead)
+        while month <= last:
+            cursor.execute(
+                f"CREATE TABLE {q(partition_name(table, month))} PARTITION OF {q(table)} FOR VALUES {_bounds(month)}"
+            )
+            month = add_months(month, 1)
+
+        cursor.execute(f"INSERT INTO {q(table)} SELECT * FROM {q(legacy)}")
+        cursor.execute(f"DROP TABLE {q(legacy)}")
+
+        sequence = f"{table}_id_seq"
+        cursor.execute(f"CREATE SEQUENCE {q(sequence)} OWNED BY {q(table)}.id")
+        cursor.execute("SELECT setval(%s, %s, %s)", [sequence, max_id or 1, max_id is not None])
+        cursor.execute(f"ALTER TABLE {q(table)} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+
+
+def list_partitions(table):
+    """[(name, lower bound month or None for DEFAULT)] for the attached partitions of `table`."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname",
+            [table],
+        )
+        rows = cursor.fetchall()
+    partitions = []
+    for name, bound in rows:
+        if bound == 'DEFAULT':
+            partitions.append((name, None))
+        else:
+            partitions.append((name, date.fromisoformat(bound.split("'")[1])))
+    return partitions
+
+
+def ensure_partitions(months_ahead=3, today=None):
+    """
+    Create the monthly partitions of every partitioned table up to
+    `months_ahead` months past the current one. Rows that landed in the
+    DEFAULT partition for a month being created are moved into it.
+    Returns the names of the partitions created.
+    """
+    if not is_postgres():
+        return []
+    q = lambda name: _quote(connection, name)
+    current = month_start(today or timezone.localdate())
+    created = []
+    for table, column in PARTITIONED_TABLES.items():
+        with connection.cursor() as cursor:
+            if not _is_partitioned(cursor, table):
+                continue
+        existing = {month for _, month in list_partitions(table) if month}
+        default = default_partition_name(table)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT DISTINCT date_trunc('month', {q(column)})::date FROM {q(default)}")
+            stray = {row[0] for row in cursor.fetchall()}
+        wanted = {add_months(current, offset) for offset in range(months_ahead + 1)} | stray
+        for month in sorted(wanted - existing):
+            name = partition_name(table, month)
+            bounds = (month, add_months(month, 1))
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute("SELECT to_regclass(%s)", [name])
+                if cursor.fetchone()[0] is not None:
+                    # A detached (archived) partition still holds this month;
+                    # leave its stray rows in DEFAULT rather than clobbering it.
+                    continue
+                cursor.execute(f"CREATE TABLE {q(name)} (LIKE {q(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+                if month in stray:
+                    cursor.execute(
+                        f"WITH moved AS (DELETE FROM {q(default)} WHERE {q(column)} >= %s AND {q(column)} < %s "
+                        f"RETURNING *) INSERT INTO {q(name)} SELECT * FROM moved",
+                        bounds,
+                    )
+                cursor.execute(f"ALTER TABLE {q(table)} ATTACH PARTITION {q(name)} FOR VALUES {_bounds(month)}")
+            created.append(name)
+    return created
+
+
+def archive_horizon():
+    """The first day archive_cold_data may still leave in the hot tables."""
+    return timezone.localdate() - timedelta(days=settings.ARCHIVE_HORIZON_DAYS)
+
+
+def detach_partitions(before, drop=False):
+    """
+    Detach every monthly partition that ends on or before the month of
+    `before` and holds no rows. Rows are only read back from the archive once
+    archive_cold_data has moved them there, so `before` may not be later than
+    the archive horizon and partitions that still hold rows are left attached.
+    Detached tables are kept unless `drop`; their foreign keys are dropped so
+    deleting a flock or report is not blocked by them. Returns the names of
+    the partitions detached.
+    """
+    if before > archive_horizon():
+        raise ValueError(
+            f"Cannot detach partitions newer than the archive horizon ({archive_horizon()}); "
+            "their rows have not been archived yet."
+        )
+    if not is_postgres():
+        return []
+    q = lambda name: _quote(connection, name)
+    cutoff = month_start(before)
+    detached = []
+    for table in PARTITIONED_TABLES:
+        for name, month in list_partitions(table):
+            if month is None or add_months(month, 1) > cutoff:
+                continue
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {q(name)})")
+                if cursor.fetchone()[0]:
+                    # Rows of open flocks are never archived, so they stay queryable
+                    continue
+                cursor.execute(f"ALTER TABLE {q(table)} DETACH PARTITION {q(name)}")
+                if drop:
+                    cursor.execute(f"DROP TABLE {q(name)}")
+                else:
+                    cursor.execute(
+                        "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f'", [name]
+                    )
+                    for (constraint,) in cursor.fetchall():
+                        cursor.execute(f"ALTER TABLE {q(name)} DROP CONSTRAINT {q(constraint)}")
+            detached.append(name)
+    return detached
@@ -1,12 +1,114 @@
 from django.contrib.auth import get_user_model
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
 
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
 from .models import Farm, PushToken
 
 User = get_user_model()
 
+def query_param_set(request, name):
+    """Comma-separated query param as a set, or None when it is absent."""
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    return {part.strip() for part in value.split(',') if part.strip()}
+
+class DynamicFieldsMixin:
+    """
+    Lets GET requests shape a ModelSerializer's output:
+    - ?fields=id,name serializes only those fields
+    - ?expand=farm nests the relations in Meta.expandable_fields, which map a
+      field name to a serializer class or (class, kwargs). Unexpanded
+      relations render as primary keys. Meta.default_expand applies when the
+      param is absent, so existing clients see the same payload; an empty
+      ?expand= returns primary keys only.
+    Only the top-level serializer of a response reads the params. Views using
+    FieldSelectionMixin narrow their queryset to the same fields.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        shaped = request is not None and request.method in SAFE_METHODS and self.is_response_root()
+
+        expand = query_param_set(request, 'expand') if shaped else None
+        if expand is None:
+            expand = set(getattr(self.Meta, 'default_expand', ()))
+        for name, spec in getattr(self.Meta, 'expandable_fields', {}).items():
+            if name in expand and name in fields:
+                serializer_class, kwargs = spec if isinstance(spec, tuple) else (spec, {})
+                fields[name] = serializer_class(read_only=True, **kwargs)
+
+        only = query_param_set(request, 'fields') if shaped else None
+        if only:
+            fields = {name: field for name, field in fields.items() if name in only}
+        return fields
+
+    def is_response_root(self):
+        return self.root is self or (self.parent is self.root and isinstance(self.parent, serializers.ListSerializer))
+
+    @classmethod
+    def select_queryset(cls, queryset, request=None, required=()):
+        """
+        Add the select_related/prefetch_related the serialized fields need and,
+        when ?fields= narrows them, load only those columns. `required` names
+        extra columns to keep, e.g. the pagination ordering.
+        """
+        fields = cls(context={'request': request} if request else {}).fields
+        model = cls.Meta.model
+        narrowed = request is not None and bool(query_param_set(request, 'fields'))
+        columns = {'pk', *required}
+        for name, field in fields.items():
+            if field.source == '*':
+                continue
+            path = field.source.split('.')
+            try:
+                model_field = model._meta.get_field(path[0])
+            except FieldDoesNotExist:
+                continue  # annotation or property
+
+            if model_field.many_to_many or model_field.one_to_many:
+                nested = getattr(field, 'child', None)
+                related = model_field.related_model.objects.all()
+                back = model_field.field.name if model_field.one_to_many else None
+                if isinstance(nested, serializers.ModelSerializer) and hasattr(nested, 'select_queryset'):
+                    related = nested.select_queryset(related, required=[back] if back else ())
+                elif not isinstance(nested, serializers.BaseSerializer):
+                    related = related.only('pk', *([back] if back else []))
+                queryset = queryset.prefetch_related(Prefetch(path[0], queryset=related))
+            elif model_field.is_relation and (len(path) > 1 or isinstance(field, serializers.BaseSerializer)):
+                queryset = queryset.select_related(path[0])
+                columns.add('__'.join(path))
+            else:
+                columns.add(path[0])
+
+        if narrowed:
+            queryset = queryset.only(*columns)
+        return queryset
+
+class FieldSelectionMixin:
+    """
+    For viewsets whose serializer uses DynamicFieldsMixin: list and retrieve
+    querysets get the joins and prefetches the response needs, and only the
+    columns picked with ?fields=.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer_class = self.get_serializer_class()
+        if self.action not in ('list', 'retrieve') or not hasattr(serializer_class, 'select_queryset'):
+            return queryset
+        ordering = getattr(self.paginator, 'ordering', None) or ()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        return serializer_class.select_queryset(
+            queryset, self.request, required=[field.lstrip('-') for field in ordering]
+        )
+
 class FarmSerializer(serializers.ModelSerializer):
     class Meta:
         model = Farm
@@ -18,14 +120,15 @@ class PushTokenSerializer(serializers.ModelSerializer):
         model = PushToken
         fields = ('token',)
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
-    farm = FarmSerializer(read_only=True)
 
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'role', 'password', 'farm', 'has_joined', 'can_manage_flocks', 'can_manage_finances', 'can_manage_users', 'can_add_logs')
-        read_only_fields = ('has_joined',)
+        read_only_fields = ('has_joined', 'farm')
+        expandable_fields = {'farm': FarmSerializer}
+        default_expand = ('farm',)
 
     def create(self, validated_data):
         # Extract fields that may be passed via save() but not in validated_data
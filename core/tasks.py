@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from .partitioning import ensure_partitions
+
+
+@shared_task
+def create_log_partitions():
+    """Keep the next few monthly partitions of the log tables created ahead of time."""
+    return ensure_partitions()
@@ -1,3 +1,205 @@
-from django.test import TestCase
+from datetime import date, time, timedelta
+from unittest import skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import Farm, User
+from finances.models import Transaction
+from flocks.models import EggCollection, FeedLog, Flock, HealthLog
+from reports.models import DailyReport, ReportConfig
+
+from .partitioning import (
+    PARTITIONED_TABLES, add_months, detach_partitions, ensure_partitions, is_postgres, list_partitions,
+    month_start, partition_name,
+)
+
+
+class PartitionHelperTests(TestCase):
+    def test_months(self):
+        self.assertEqual(month_start(date(2026, 3, 17)), date(2026, 3, 1))
+        self.assertEqual(add_months(date(2026, 11, 1), 2), date(2027, 1, 1))
+        self.assertEqual(add_months(date(2026, 1, 1), -1), date(2025, 12, 1))
+        self.assertEqual(partition_name('flocks_feedlog', date(2026, 3, 1)), 'flocks_feedlog_p202603')
+
+
+@override_settings(ARCHIVE_HORIZON_DAYS=730)
+class DetachPartitionTests(TestCase):
+    def test_rejects_dates_newer_than_the_archive_horizon(self):
+        # Rows that recent are still in the hot tables, not the archive
+        with self.assertRaises(ValueError):
+            detach_partitions(timezone.localdate() - timedelta(days=365))
+
+
+@skipUnless(is_postgres(), 'Table partitioning is PostgreSQL-only')
+@override_settings(ARCHIVE_HORIZON_DAYS=730)
+class PostgresPartitionTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('owner', password='password', role='superuser')
+        farm = Farm.objects.create(name='Test Farm', owner=user)
+        self.flock = Flock.objects.create(
+            name='House 1', breed='Isa Brown', initial_quantity=100, current_quantity=100, user=user, farm=farm,
+        )
+        self.today = timezone.localdate()
+
+    def partition_of(self, log):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text FROM flocks_feedlog WHERE id = %s', [log.id])
+            return cursor.fetchone()[0]
+
+    def test_rows_land_in_their_month(self):
+        ensure_partitions(months_ahead=1)
+        for table in PARTITIONED_TABLES:
+            months = {month for _, month in list_partitions(table)}
+            self.assertIn(month_start(self.today), months)
+            self.assertIn(None, months)  # DEFAULT
+
+        log = FeedLog.objects.create(flock=self.flock, date=self.today, quantity_kg=5, feed_type='Layer mash', cost=10)
+        self.assertEqual(self.partition_of(log), partition_name('flocks_feedlog', month_start(self.today)))
+
+    def test_stray_rows_move_out_of_default(self):
+        month = add_months(month_start(self.today), 24)
+        log = FeedLog.objects.create(flock=self.flock, date=month, quantity_kg=5, feed_type='Layer mash', cost=10)
+        self.assertEqual(self.partition_of(log), 'flocks_feedlog_default')
+
+        self.assertIn(partition_name('flocks_feedlog', month), ensure_partitions(months_ahead=0))
+        self.assertEqual(self.partition_of(log), partition_name('flocks_feedlog', month))
+
+    def test_only_emptied_partitions_are_detached(self):
+        old = add_months(month_start(self.today), -30)
+        emptied = add_months(old, 1)
+        FeedLog.objects.create(flock=self.flock, date=old, quantity_kg=5, feed_type='Layer mash', cost=10)
+        FeedLog.objects.create(flock=self.flock, date=emptied, quantity_kg=5, feed_type='Layer mash', cost=10)
+        ensure_partitions(months_ahead=0)
+        FeedLog.objects.filter(date=emptied).delete()
+
+        detached = detach_partitions(add_months(emptied, 1))
+
+        self.assertIn(partition_name('flocks_feedlog', emptied), detached)
+        self.assertNotIn(partition_name('flocks_feedlog', old), detached)
+        self.assertEqual(FeedLog.objects.filter(date=old).count(), 1)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+)
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', password='password', role='superuser')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.user.farm = self.farm
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.today = timezone.localdate()
+
+        neighbour = User.objects.create_user('neighbour', password='password', role='superuser')
+        other_farm = Farm.objects.create(name='Other Farm', owner=neighbour)
+        for farm, birds in ((self.farm, 95), (self.farm, 50), (other_farm, 500)):
+            flock = Flock.objects.create(
+                name='House', breed='Isa Brown', initial_quantity=100, current_quantity=birds, user=farm.owner, farm=farm,
+            )
+            for day in (self.today, self.today - timedelta(days=1)):
+                EggCollection.objects.create(flock=flock, date=day, quantity_collected=80, damaged=2)
+                FeedLog.objects.create(flock=flock, date=day, quantity_kg=10, feed_type='Layer mash', cost=25)
+                HealthLog.objects.create(flock=flock, date=day, log_type='mortality', description='', affected_birds=1)
+            Transaction.objects.create(
+                user=farm.owner, farm=farm, date=self.today, type='income', category='egg_sales', amount=40,
+            )
+        Transaction.objects.create(
+            user=self.user, farm=self.farm, date=self.today, type='expense', category='feed', amount=15,
+        )
+        Transaction.objects.create(
+            user=self.user, farm=self.farm, date=self.today - timedelta(days=40), type='income', category='other',
+            amount=1000,
+        )
+
+    def dashboard(self):
+        response = self.client.get('/api/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_snapshot(self):
+        with self.assertNumQueries(7):
+            data = self.dashboard()
+
+        self.assertEqual(data['date'], self.today.isoformat())
+        self.assertEqual((data['flocks'], data['birds_alive']), (2, 145))
+        self.assertEqual((data['eggs_collected'], data['eggs_damaged']), (160, 4))
+        self.assertEqual((data['feed_used_kg'], data['feed_cost'], data['mortality']), (20.0, 50.0, 2))
+        self.assertEqual(data['month_to_date'], {'income': 80.0, 'expenses': 15.0, 'net': 65.0})
+        self.assertEqual(data['report']['status'], 'not_configured')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.dashboard(), data)
+
+    def test_report_status(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            config = ReportConfig.objects.create(farm=self.farm, is_enabled=True, deadline_time=time.max)
+        self.assertEqual(self.dashboard()['report']['status'], 'pending')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            config.deadline_time = time.min
+            config.save()
+        self.assertEqual(self.dashboard()['report']['status'], 'overdue')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            report = DailyReport.objects.create(farm=self.farm, user=self.user, reference_date=self.today)
+        self.assertEqual(
+            {key: self.dashboard()['report'][key] for key in ('status', 'report_id')},
+            {'status': 'submitted', 'report_id': report.id},
+        )
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FieldSelectionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='password', role='superuser')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.user.farm = self.farm
+        self.user.save()
+        for index in range(3):
+            User.objects.create_user(f'staff{index}', password='password', role='staff', farm=self.farm)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def list_users(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/users/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), [query['sql'] for query in queries]
+
+    def test_farm_is_nested_by_default_with_a_join(self):
+        users, queries = self.list_users()
+
+        self.assertEqual(len(users), 4)
+        self.assertEqual({user['farm']['name'] for user in users}, {'Test Farm'})
+        self.assertEqual(len(queries), 1)
+        self.assertIn('JOIN "core_farm"', queries[0])
+
+    def test_empty_expand_returns_ids_without_a_join(self):
+        users, queries = self.list_users(expand='')
+
+        self.assertEqual({user['farm'] for user in users}, {self.farm.id})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('JOIN', queries[0])
+
+    def test_fields_narrow_the_payload_and_the_columns(self):
+        users, queries = self.list_users(fields='id,username')
+
+        self.assertEqual({tuple(user) for user in users}, {('id', 'username')})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"email"', queries[0])
+        self.assertNotIn('JOIN', queries[0])
+
+    def test_fields_do_not_shape_writes(self):
+        response = self.client.patch(f'/api/users/{self.user.id}/?fields=id', {'email': 'owner@example.com'})
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['email'], 'owner@example.com')
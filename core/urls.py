@@ -1,6 +1,8 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import UserViewSet, FarmViewSet, RegisterFarmOwnerView, RegisterFarmMemberView, RegisterPushTokenView
+from .views import (
+    UserViewSet, FarmViewSet, RegisterFarmOwnerView, RegisterFarmMemberView, RegisterPushTokenView, DashboardViewSet
+)
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet, basename='user')
@@ -8,6 +10,7 @@ router.register(r'farms', FarmViewSet, basename='farm')
 router.register(r'register-owner', RegisterFarmOwnerView, basename='register-owner')
 router.register(r'register-member', RegisterFarmMemberView, basename='register-member')
 router.register(r'register-token', RegisterPushTokenView, basename='register-token')
+router.register(r'dashboard', DashboardViewSet, basename='dashboard')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -6,8 +6,11 @@ from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
 from django.template.loader import render_to_string
+from django.utils.dateparse import parse_date
 from django.utils.html import strip_tags
 
+from rest_framework.exceptions import ValidationError
+
 from exponent_server_sdk import (
     PushClient,
     PushMessage,
@@ -132,18 +135,13 @@ def send_push_notification(users, title, message, data=None):
         response = PushClient().publish_multiple(push_messages)
         print(f"Sent {len(push_messages)} push notifications.")
         
-        # Optional: Inspect response for errors (like invalid tokens) and remove them
+        # Inspect response for errors and drop tokens of uninstalled apps
         try:
-            breakpoint()
             for ticket in response:
-                print(ticket.__dict__, response.__dict__)
-                #  if ticket.is_error():
-                #      print(f"Push error: {ticket.message} - {ticket.details}")
-                #      if ticket.details and ticket.details.get('error') == 'DeviceNotRegistered':
-                #          # Remove invalid token
-                #          # Note: mapping back to DB object from ticket is hard in batch without tracking indices
-                #          # For now, just logging.
-                #          pass
+                if not ticket.is_success():
+                    print(f"Push error: {ticket.message} - {ticket.details}")
+                    if ticket.details and ticket.details.get('error') == 'DeviceNotRegistered':
+                        PushToken.objects.filter(token=ticket.push_message.to).delete()
         except Exception as e:
              print(f"Error inspecting push response: {e}")
 
@@ -152,3 +150,28 @@ def send_push_notification(users, title, message, data=None):
         print(f"Push Server Response: {exc.response_data}")
     except Exception as exc:
         print(f"Error sending push notifications: {exc}")
+
+
+def parse_date_range(params, start_param='from', end_param='to'):
+    """
+    Parse an optional ISO date range from query params.
+    Returns (start, end), either of which may be None.
+    """
+    dates = []
+    for name in (start_param, end_param):
+        value = params.get(name)
+        if not value:
+            dates.append(None)
+            continue
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError({name: 'Enter a valid date in YYYY-MM-DD format.'})
+        dates.append(parsed)
+
+    start, end = dates
+    if start and end and start > end:
+        raise ValidationError({start_param: f'Must be on or before {end_param}.'})
+    return start, end
@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model
 from django.db import transaction
+from django.db.models import Count, Q, Sum
 from django.utils import timezone
 from datetime import timedelta
 
@@ -10,15 +11,22 @@ from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 
+from finances.models import FarmDailyFinanceRollup
+from flocks.models import Flock, FeedLog, HealthLog, EggCollection
+from reports.models import ReportConfig, DailyReport
+
+from .cache import get_or_compute_for_farm
 from .models import Farm, PushToken
 from .utils import (generate_invitation_code, generate_temporary_password, 
                     send_invitation_email, generate_password_reset_token, send_password_reset_email)
 from .permissions import IsSuperUser
-from .serializers import UserSerializer, FarmSerializer, CustomTokenObtainPairSerializer, PushTokenSerializer
+from .serializers import (
+    UserSerializer, FarmSerializer, CustomTokenObtainPairSerializer, PushTokenSerializer, FieldSelectionMixin,
+)
 
 User = get_user_model()
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(FieldSelectionMixin, viewsets.ModelViewSet):
     serializer_class = UserSerializer
     permission_classes = [IsSuperUser]
 
@@ -421,3 +429,82 @@ class RegisterPushTokenView(viewsets.ViewSet):
             
         return Response({'status': 'success'}, status=status.HTTP_201_CREATED)
 
+
+class DashboardViewSet(viewsets.ViewSet):
+    """Today's snapshot of the user's farm, for the app's home screen."""
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        farm = request.user.farm
+        if not farm:
+            return Response({'error': 'User has no farm'}, status=status.HTTP_400_BAD_REQUEST)
+
+        now = timezone.localtime()
+        today = now.date()
+        snapshot = get_or_compute_for_farm(
+            farm.id, 'dashboard.list', today.isoformat(), lambda: self.snapshot(farm, today)
+        )
+
+        # Report status depends on the clock, so it is derived outside the cache
+        report = dict(snapshot['report'])
+        if report['submitted']:
+            report['status'] = 'submitted'
+        elif not report['is_enabled'] or report['deadline_time'] is None:
+            report['status'] = 'not_configured'
+        elif now.time() > report['deadline_time']:
+            report['status'] = 'overdue'
+        else:
+            report['status'] = 'pending'
+
+        return Response({**snapshot, 'report': report})
+
+    def snapshot(self, farm, today):
+        """Aggregate the farm's current state with one query per source table."""
+        flocks = Flock.objects.filter(farm=farm).aggregate(
+            flocks=Count('id'),
+            birds_alive=Sum('current_quantity'),
+        )
+        eggs = EggCollection.objects.filter(flock__farm=farm, date=today).aggregate(
+            collected=Sum('quantity_collected'),
+            damaged=Sum('damaged'),
+        )
+        feed = FeedLog.objects.filter(flock__farm=farm, date=today).aggregate(
+            quantity_kg=Sum('quantity_kg'),
+            cost=Sum('cost'),
+        )
+        mortality = HealthLog.objects.filter(flock__farm=farm, date=today, log_type='mortality').aggregate(
+            deaths=Sum('affected_birds'),
+        )
+        finances = FarmDailyFinanceRollup.objects.filter(
+            farm=farm, date__gte=today.replace(day=1), date__lte=today
+        ).aggregate(
+            income=Sum('total', filter=Q(type='income')),
+            expenses=Sum('total', filter=Q(type='expense')),
+        )
+        config = ReportConfig.objects.filter(farm=farm).values('is_enabled', 'deadline_time').first() or {}
+        report = DailyReport.objects.filter(farm=farm, reference_date=today).values('id', 'submitted_at').first()
+
+        income = finances['income'] or 0
+        expenses = finances['expenses'] or 0
+        return {
+            'date': today,
+            'flocks': flocks['flocks'],
+            'birds_alive': flocks['birds_alive'] or 0,
+            'eggs_collected': eggs['collected'] or 0,
+            'eggs_damaged': eggs['damaged'] or 0,
+            'feed_used_kg': feed['quantity_kg'] or 0,
+            'feed_cost': feed['cost'] or 0,
+            'mortality': mortality['deaths'] or 0,
+            'month_to_date': {
+                'income': income,
+                'expenses': expenses,
+                'net': income - expenses,
+            },
+            'report': {
+                'is_enabled': config.get('is_enabled', False),
+                'deadline_time': config.get('deadline_time'),
+                'submitted': report is not None,
+                'report_id': report['id'] if report else None,
+                'submitted_at': report['submitted_at'] if report else None,
+            },
+        }
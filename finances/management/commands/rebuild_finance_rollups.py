@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from finances.models import Transaction, FarmDailyFinanceRollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the per-farm daily finance rollups from the raw transactions "
+        "and verify them against the Transaction sums."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--farm', type=int, help='Only process this farm id')
+        parser.add_argument(
+            '--verify-only', action='store_true',
+            help='Compare the rollups with the raw transactions without rebuilding',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        transactions = Transaction.objects.filter(farm__isnull=False)
+        rollups = FarmDailyFinanceRollup.objects.all()
+        if options['farm']:
+            transactions = transactions.filter(farm_id=options['farm'])
+            rollups = rollups.filter(farm_id=options['farm'])
+
+        expected = (
+            transactions.values('farm_id', 'date', 'type', 'category')
+            .annotate(amount=Sum('amount'), entries=Count('id'))
+            .order_by()
+        )
+
+        if not options['verify_only']:
+            with transaction.atomic():
+                deleted, _ = rollups.delete()
+                created = FarmDailyFinanceRollup.objects.bulk_create(
+                    (
+                        FarmDailyFinanceRollup(
+                            farm_id=row['farm_id'], date=row['date'], type=row['type'],
+                            category=row['category'], total=row['amount'], count=row['entries'],
+                        )
+                        for row in expected.iterator()
+                    ),
+                    batch_size=options['batch_size'],
+                )
+            self.stdout.write(f"Replaced {deleted} rollup rows with {len(created)} rebuilt rows.")
+
+        mismatches = self.verify(expected, rollups)
+        if mismatches:
+            for key, want, got in mismatches[:50]:
+                self.stdout.write(self.style.ERROR(f"Mismatch {key}: expected {want}, found {got}"))
+            self.stdout.write(self.style.ERROR(f"{len(mismatches)} rollup rows do not match the transactions."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Rollups match the transactions."))
+
+    def verify(self, expected, rollups):
+        actual = {
+            (r['farm_id'], r['date'], r['type'], r['category']): (r['total'], r['count'])
+            for r in rollups.exclude(count=0).values('farm_id', 'date', 'type', 'category', 'total', 'count').iterator()
+        }
+        mismatches = []
+        for row in expected.iterator():
+            key = (row['farm_id'], row['date'], row['type'], row['category'])
+            want = (row['amount'], row['entries'])
+            got = actual.pop(key, None)
+            if got != want:
+                mismatches.append((key, want, got))
+        mismatches.extend((key, None, got) for key, got in actual.items())
+        return mismatches
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rollups(apps, schema_editor):
+    Transaction = apps.get_model('finances', 'Transaction')
+    FarmDailyFinanceRollup = apps.get_model('finances', 'FarmDailyFinanceRollup')
+    rows = (
+        Transaction.objects.filter(farm__isnull=False)
+        .values('farm_id', 'date', 'type', 'category')
+        .annotate(amount=Sum('amount'), entries=Count('id'))
+        .order_by()
+    )
+    FarmDailyFinanceRollup.objects.bulk_create(
+        (
+            FarmDailyFinanceRollup(
+                farm_id=row['farm_id'], date=row['date'], type=row['type'],
+                category=row['category'], total=row['amount'], count=row['entries'],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_pushtoken'),
+        ('finances', '0003_alter_transaction_category'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FarmDailyFinanceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('type', models.CharField(choices=[('income', 'Income'), ('expense', 'Expense')], max_length=10)),
+                ('category', models.CharField(choices=[('feed', 'Feed'), ('medication', 'Medication'), ('equipment', 'Equipment'), ('labor', 'Labor'), ('utilities', 'Utilities'), ('egg_sales', 'Egg Sales'), ('bird_sales', 'Bird Sales'), ('manure_sales', 'Manure Sales'), ('other', 'Other')], max_length=50)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('farm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='finance_rollups', to='core.farm')),
+            ],
+            options={
+                'unique_together': {('farm', 'date', 'type', 'category')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
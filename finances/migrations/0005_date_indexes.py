@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_pushtoken'),
+        ('finances', '0004_farmdailyfinancerollup'),
+        ('flocks', '0002_flock_farm'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['farm', 'date'], name='finances_tr_farm_id_09d4f5_idx'),
+        ),
+    ]
@@ -1,4 +1,7 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from core.models import User, Farm
 
 class Transaction(models.Model):
@@ -30,6 +33,61 @@ class Transaction(models.Model):
     
     # Optional link to specific flock if applicable
     related_flock = models.ForeignKey('flocks.Flock', on_delete=models.SET_NULL, null=True, blank=True, related_name='transactions')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['farm', 'date'])]
 
     def __str__(self):
         return f"{self.type} - {self.category} - {self.amount}"
+
+
+class FarmDailyFinanceRollupManager(models.Manager):
+    def apply(self, transactions, sign=1):
+        """
+        Add (sign=1) or remove (sign=-1) transactions from the daily rollups.
+        Deltas are merged per (farm, date, type, category) first so that a batch
+        costs one atomic UPDATE per touched rollup row rather than per transaction.
+        A removal never creates a row: when the row is gone, it was deleted along
+        with its farm in the same cascade.
+        """
+        deltas = {}
+        for t in transactions:
+            if t.farm_id is None:
+                continue
+            key = (t.farm_id, t.date, t.type, t.category)
+            total, count = deltas.get(key, (0, 0))
+            deltas[key] = (total + sign * Decimal(str(t.amount)), count + sign)
+
+        for (farm_id, date, type, category), (total, count) in deltas.items():
+            lookup = {'farm_id': farm_id, 'date': date, 'type': type, 'category': category}
+            changes = {'total': F('total') + total, 'count': F('count') + count}
+            if self.filter(**lookup).update(**changes) or count < 0:
+                continue
+            try:
+                with transaction.atomic():
+                    self.create(total=total, count=count, **lookup)
+            except IntegrityError:
+                # Another request created the row first, add to it instead
+                self.filter(**lookup).update(**changes)
+
+
+class FarmDailyFinanceRollup(models.Model):
+    """
+    Per-farm daily totals of Transaction.amount, kept in step with every write
+    by finances/signals.py (bulk_create callers apply their rows themselves).
+    """
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='finance_rollups')
+    date = models.DateField()
+    type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    category = models.CharField(max_length=50, choices=Transaction.CATEGORIES)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    objects = FarmDailyFinanceRollupManager()
+
+    class Meta:
+        unique_together = ('farm', 'date', 'type', 'category')
+
+    def __str__(self):
+        return f"{self.farm_id} - {self.date} - {self.type} - {self.category} - {self.total}"
@@ -1,7 +1,11 @@
 from rest_framework import serializers
+from core.serializers import DynamicFieldsMixin
+from flocks.serializers import FarmFlockField
 from .models import Transaction
 
-class TransactionSerializer(serializers.ModelSerializer):
+class TransactionSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    related_flock = FarmFlockField(allow_null=True, required=False)
+
     class Meta:
         model = Transaction
         fields = '__all__'
@@ -0,0 +1,38 @@
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from core.cache import bump_farm_version
+from .models import FarmDailyFinanceRollup, Transaction
+
+
+@receiver([post_save, post_delete], sender=Transaction)
+def invalidate_transaction_cache(sender, instance, **kwargs):
+    bump_farm_version(instance.farm_id)
+
+
+# Rollups follow every save and delete, including cascades from User/Farm
+# deletes and admin edits, not just the API's.
+
+@receiver(pre_save, sender=Transaction)
+def remember_rolled_up_row(sender, instance, raw=False, **kwargs):
+    # The row as stored, so post_save can take it back out of the rollups
+    instance._rolled_up = None
+    if instance.pk and not raw:
+        instance._rolled_up = (
+            Transaction.objects.filter(pk=instance.pk).only('farm', 'date', 'type', 'category', 'amount').first()
+        )
+
+
+@receiver(post_save, sender=Transaction)
+def apply_saved_transaction(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_rolled_up', None)
+    if previous is not None:
+        FarmDailyFinanceRollup.objects.apply([previous], sign=-1)
+    FarmDailyFinanceRollup.objects.apply([instance])
+
+
+@receiver(post_delete, sender=Transaction)
+def remove_deleted_transaction(sender, instance, **kwargs):
+    FarmDailyFinanceRollup.objects.apply([instance], sign=-1)
@@ -1,3 +1,248 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import Farm, User
+from flocks.models import Flock
+
+from .models import FarmDailyFinanceRollup, Transaction
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FinanceRollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('owner', password='password', role='superuser')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.owner)
+        self.owner.farm = self.farm
+        self.owner.save()
+        self.manager = User.objects.create_user('manager', password='password', role='manager', farm=self.farm)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.today = timezone.now().date()
+
+    def rollup(self, category, day=None):
+        row = FarmDailyFinanceRollup.objects.filter(
+            farm=self.farm, date=day or self.today, category=category
+        ).values_list('total', 'count').first()
+        return row or (Decimal('0'), 0)
+
+    def post(self, category='egg_sales', amount='10.00', type='income'):
+        response = self.client.post('/api/transactions/', {
+            'date': self.today.isoformat(), 'type': type, 'category': category, 'amount': amount,
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['id']
+
+    def total_income(self):
+        cache.clear()
+        return self.client.get('/api/transactions/analytics/').json()['total_income']
+
+    def test_create_update_delete(self):
+        transaction_id = self.post(amount='12.50')
+        self.post(amount='2.50')
+        self.assertEqual(self.rollup('egg_sales'), (Decimal('15.00'), 2))
+
+        response = self.client.patch(
+            f'/api/transactions/{transaction_id}/', {'amount': '4.00', 'category': 'bird_sales'}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.rollup('egg_sales'), (Decimal('2.50'), 1))
+        self.assertEqual(self.rollup('bird_sales'), (Decimal('4.00'), 1))
+
+        self.client.delete(f'/api/transactions/{transaction_id}/')
+        self.assertEqual(self.rollup('bird_sales'), (Decimal('0.00'), 0))
+        self.assertEqual(self.total_income(), 2.5)
+
+    def test_writes_outside_the_api(self):
+        transaction = Transaction.objects.create(
+            user=self.owner, farm=self.farm, date=self.today, type='expense', category='feed', amount='7.00'
+        )
+        self.assertEqual(self.rollup('feed'), (Decimal('7.00'), 1))
+
+        yesterday = self.today - timezone.timedelta(days=1)
+        transaction.date = yesterday
+        transaction.save()
+        self.assertEqual(self.rollup('feed'), (Decimal('0.00'), 0))
+        self.assertEqual(self.rollup('feed', yesterday), (Decimal('7.00'), 1))
+
+    def test_user_delete_cascade(self):
+        Transaction.objects.create(
+            user=self.manager, farm=self.farm, date=self.today, type='income', category='egg_sales', amount='10.00'
+        )
+        self.assertEqual(self.total_income(), 10.0)
+
+        self.manager.delete()
+        self.assertEqual(Transaction.objects.count(), 0)
+        self.assertEqual(self.rollup('egg_sales'), (Decimal('0.00'), 0))
+        self.assertEqual(self.total_income(), 0)
+
+    def test_farm_delete_cascade(self):
+        self.post()
+        self.farm.delete()
+        self.assertFalse(Transaction.objects.exists())
+        self.assertFalse(FarmDailyFinanceRollup.objects.exists())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class AnalyticsTests(TestCase):
+    BUCKETS = {
+        'day': lambda day: day,
+        'week': lambda day: day - timedelta(days=day.weekday()),
+        'month': lambda day: day.replace(day=1),
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', password='password', role='superuser')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.user.farm = self.farm
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.today = timezone.now().date()
+
+        self.entries = [
+            (0, 'income', 'egg_sales', '30.50'),
+            (0, 'expense', 'feed', '10.00'),
+            (3, 'income', 'bird_sales', '100.00'),
+            (3, 'expense', 'feed', '5.25'),
+            (20, 'expense', 'labor', '20.00'),
+        ]
+        for days_ago, type, category, amount in self.entries + [(40, 'income', 'egg_sales', '999.00')]:
+            self.add(self.farm, self.today - timedelta(days=days_ago), type, category, amount)
+        neighbour = User.objects.create_user('neighbour', password='password', role='superuser')
+        self.add(Farm.objects.create(name='Other Farm', owner=neighbour), self.today, 'income', 'egg_sales', '500.00')
+
+    def add(self, farm, day, type, category, amount):
+        Transaction.objects.create(
+            user=farm.owner, farm=farm, date=day, type=type, category=category, amount=Decimal(amount),
+        )
+
+    def analytics(self, **params):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/transactions/analytics/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def assert_totals(self, data):
+        self.assertEqual((data['total_income'], data['total_expenses']), (130.5, 35.25))
+        self.assertEqual(data['net_profit'], 95.25)
+        self.assertEqual(data['income_by_category'], {'egg_sales': 30.5, 'bird_sales': 100.0})
+        self.assertEqual(data['expense_by_category'], {'feed': 15.25, 'labor': 20.0})
+        self.assertEqual(data['top_expenses'], [{'category': 'labor', 'amount': 20.0}, {'category': 'feed', 'amount': 15.25}])
+
+    def test_totals(self):
+        data = self.analytics()
+        self.assert_totals(data)
+        self.assertNotIn('series', data)
+
+    def test_series_per_granularity(self):
+        for granularity, bucket in self.BUCKETS.items():
+            with self.subTest(granularity=granularity):
+                expected = {}
+                for days_ago, type, _, amount in self.entries:
+                    point = expected.setdefault(bucket(self.today - timedelta(days=days_ago)).isoformat(), [0, 0])
+                    point[type == 'expense'] += float(amount)
+
+                data = self.analytics(granularity=granularity)
+
+                self.assert_totals(data)
+                self.assertEqual(
+                    [(point['date'], point['income'], point['expenses'], point['net']) for point in data['series']],
+                    [(day, income, expenses, income - expenses) for day, (income, expenses) in sorted(expected.items())],
+                )
+
+    def test_period(self):
+        data = self.analytics(period=60)
+        self.assertEqual(data['total_income'], 1129.5)
+        self.assertEqual(self.client.get('/api/transactions/analytics/', {'period': 'week'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/transactions/analytics/', {'granularity': 'hour'}).status_code, 400)
+
+
+class BulkImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='password', role='superuser')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.user.farm = self.farm
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.today = timezone.now().date().isoformat()
+
+    def test_csv_upload(self):
+        upload = SimpleUploadedFile('transactions.csv', (
+            'date,type,category,amount\n'
+            f'{self.today},income,egg_sales,12.50\n'
+            f'{self.today},income,egg_sales,not a number\n'
+            f'{self.today},expense,feed,5.00\n'
+        ).encode(), content_type='text/csv')
+
+        response = self.client.post('/api/transactions/bulk_import/', {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        report = response.json()
+        self.assertEqual((report['created'], report['failed']), (2, 1))
+        # Row 1 is the header
+        self.assertEqual(report['errors'][0]['row'], 3)
+        self.assertIn('amount', report['errors'][0]['errors'])
+        self.assertEqual(set(Transaction.objects.values_list('farm_id', 'user_id')), {(self.farm.id, self.user.id)})
+        rollup = FarmDailyFinanceRollup.objects.get(farm=self.farm, category='egg_sales')
+        self.assertEqual((rollup.total, rollup.count), (Decimal('12.50'), 1))
+
+    def test_ndjson_body(self):
+        body = '\n'.join([
+            f'{{"date": "{self.today}", "type": "income", "category": "bird_sales", "amount": "40.00"}}',
+            '{"date": ',
+            '[1, 2]',
+            '',
+            f'{{"date": "{self.today}", "type": "expense", "category": "labor", "amount": "15.00"}}',
+        ])
+
+        response = self.client.post('/api/transactions/bulk_import/', body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        report = response.json()
+        self.assertEqual((report['created'], report['failed']), (2, 2))
+        self.assertEqual([error['row'] for error in report['errors']], [2, 3])
+        self.assertEqual(Transaction.objects.count(), 2)
+
+    def test_flocks_are_scoped_to_the_farm(self):
+        flock = Flock.objects.create(
+            name='House 1', breed='Isa Brown', initial_quantity=100, current_quantity=100, user=self.user, farm=self.farm,
+        )
+        other_user = User.objects.create_user('neighbour', password='password', role='superuser')
+        other_farm = Farm.objects.create(name='Other Farm', owner=other_user)
+        other_flock = Flock.objects.create(
+            name='House 1', breed='Isa Brown', initial_quantity=100, current_quantity=100, user=other_user, farm=other_farm,
+        )
+        body = '\n'.join(
+            f'{{"date": "{self.today}", "type": "expense", "category": "feed", "amount": "5.00", "related_flock": {flock_id}}}'
+            for flock_id in (flock.id, other_flock.id, 'null')
+        )
+
+        response = self.client.post('/api/transactions/bulk_import/', body, content_type='application/x-ndjson')
+
+        report = response.json()
+        self.assertEqual((report['created'], report['failed']), (2, 1))
+        self.assertEqual(report['errors'][0]['row'], 2)
+        self.assertIn('related_flock', report['errors'][0]['errors'])
+        self.assertEqual(set(Transaction.objects.values_list('related_flock', flat=True)), {flock.id, None})
+        self.assertFalse(other_flock.transactions.exists())
+
+    def test_nothing_imported(self):
+        body = f'{{"date": "{self.today}", "type": "income", "category": "nope", "amount": "1.00"}}'
+        response = self.client.post('/api/transactions/bulk_import/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['failed'], 1)
+
+    def test_unsupported_format(self):
+        response = self.client.post('/api/transactions/bulk_import/', '<rows/>', content_type='application/xml')
+        self.assertEqual(response.status_code, 415)
+        self.assertFalse(Transaction.objects.exists())
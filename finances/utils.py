@@ -0,0 +1,47 @@
+import codecs
+import csv
+import json
+
+CSV_CONTENT_TYPES = ('text/csv', 'application/csv')
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+
+def detect_import_format(content_type, filename=''):
+    """Return 'csv' or 'ndjson' for an upload, or None if it is neither."""
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    filename = (filename or '').lower()
+    if content_type in CSV_CONTENT_TYPES or filename.endswith('.csv'):
+        return 'csv'
+    if content_type in NDJSON_CONTENT_TYPES or filename.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return None
+
+
+def iter_import_rows(source, import_format):
+    """
+    Lazily yield (row_number, data, error) tuples from a binary line iterator.
+    Only one line is decoded at a time, so memory use does not grow with the
+    size of the upload. Exactly one of data/error is set for each row.
+    """
+    lines = codecs.iterdecode(source, 'utf-8-sig')
+
+    if import_format == 'csv':
+        reader = csv.DictReader(lines)
+        for data in reader:
+            # Row 1 is the header line
+            yield reader.line_num, data, None
+        return
+
+    for row_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, {'non_field_errors': [f'Invalid JSON: {e}']}
+            continue
+        if not isinstance(data, dict):
+            yield row_number, None, {'non_field_errors': ['Each line must be a JSON object']}
+            continue
+        yield row_number, data, None
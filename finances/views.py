@@ -1,82 +1,203 @@
+from decimal import Decimal
+
 from django.db import transaction
-from django.db.models import Sum, Q
+from django.db.models import DateField, Sum
+from django.db.models.functions import Trunc
 from django.utils import timezone
 from datetime import timedelta
 
-from rest_framework import viewsets, permissions
+from rest_framework import viewsets, permissions, status, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from core.cache import ConditionalGetMixin, bump_farm_version, cache_per_farm
+from core.exports import ExportMixin
+from core.pagination import DateCursorPagination
 from core.permissions import IsManager
+from core.serializers import FieldSelectionMixin
+from flocks.models import Flock
 
-from .models import Transaction
+from .models import Transaction, FarmDailyFinanceRollup
 from .serializers import TransactionSerializer
+from .utils import detect_import_format, iter_import_rows
 
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(ConditionalGetMixin, FieldSelectionMixin, ExportMixin, viewsets.ModelViewSet):
     serializer_class = TransactionSerializer
+    pagination_class = DateCursorPagination
     permission_classes = [IsManager] # Only managers can manage finances
+    export_fields = ('id', 'date', 'type', 'category', 'amount', 'description', 'related_flock', 'user')
+    export_flock_field = 'related_flock'
+    # The analytics period ends today
+    vary_by_day = True
+    GRANULARITIES = ('day', 'week', 'month')
+    IMPORT_BATCH_SIZE = 500
+    MAX_REPORTED_ERRORS = 1000
 
     def get_queryset(self):
         return Transaction.objects.filter(farm=self.request.user.farm)
 
+    # Rollups are updated by finances/signals.py; the atomic blocks keep them
+    # in the same database transaction as the write.
     @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(user=self.request.user, farm=self.request.user.farm)
 
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+
+    @action(detail=False, methods=['post'])
+    def bulk_import(self, request):
+        """
+        Import transactions from a CSV or NDJSON upload.
+        Accepts either a multipart upload in the 'file' field or a raw body sent
+        with a text/csv or application/x-ndjson content type. Rows are parsed
+        incrementally, validated with TransactionSerializer and inserted in
+        batches, each batch in its own database transaction.
+        """
+        content_type = request.content_type or ''
+        if content_type.startswith('multipart/form-data'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response({'error': 'A file is required'}, status=status.HTTP_400_BAD_REQUEST)
+            import_format = detect_import_format(upload.content_type, upload.name)
+            source = upload
+        else:
+            import_format = detect_import_format(content_type)
+            source = request.stream
+
+        if import_format is None or source is None:
+            return Response(
+                {'error': 'Upload must be CSV (text/csv) or NDJSON (application/x-ndjson)'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+
+        report = {'created': 0, 'failed': 0, 'errors': [], 'errors_truncated': False}
+        batch = []
+        validator = TransactionSerializer(context=self.get_serializer_context())
+        # related_flock ids resolve against the farm's flocks without a query per row
+        validator.context['flocks'] = Flock.objects.filter(farm=request.user.farm).in_bulk()
+        for row_number, data, error in iter_import_rows(source, import_format):
+            if error is None:
+                try:
+                    data = validator.run_validation(data)
+                except serializers.ValidationError as e:
+                    error = e.detail
+            if error is not None:
+                report['failed'] += 1
+                if len(report['errors']) < self.MAX_REPORTED_ERRORS:
+                    report['errors'].append({'row': row_number, 'errors': error})
+                else:
+                    report['errors_truncated'] = True
+                continue
+
+            batch.append(data)
+            if len(batch) >= self.IMPORT_BATCH_SIZE:
+                report['created'] += self._import_batch(batch)
+                batch = []
+
+        if batch:
+            report['created'] += self._import_batch(batch)
+
+        return Response(report, status=status.HTTP_201_CREATED if report['created'] else status.HTTP_400_BAD_REQUEST)
+
+    @transaction.atomic
+    def _import_batch(self, batch):
+        farm = self.request.user.farm
+        created = Transaction.objects.bulk_create(
+            Transaction(**{**data, 'user': self.request.user, 'farm': farm}) for data in batch
+        )
+        FarmDailyFinanceRollup.objects.apply(created)
+        # bulk_create skips post_save, so invalidate the farm's cache here
+        bump_farm_version(farm.id if farm else None)
+        return len(created)
+
     @action(detail=False, methods=['get'])
+    @cache_per_farm
     def analytics(self, request):
         """
         Get financial analytics for the farm
         Query params:
         - period: number of days to analyze (default: 30)
+        - granularity: optional time bucket for the series (day, week or month)
+
+        Everything is computed from a single query over the daily rollups,
+        grouped by (type, category) and, when a granularity is requested, by
+        time bucket as well.
         """
-        period = int(request.query_params.get('period', 30))
+        try:
+            period = int(request.query_params.get('period', 30))
+        except ValueError:
+            return Response({'error': 'Period must be a number of days'}, status=status.HTTP_400_BAD_REQUEST)
+
+        granularity = request.query_params.get('granularity')
+        if granularity and granularity not in self.GRANULARITIES:
+            return Response(
+                {'error': f"Granularity must be one of: {', '.join(self.GRANULARITIES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
         farm = request.user.farm
         
         # Calculate date range
         end_date = timezone.now().date()
         start_date = end_date - timedelta(days=period)
         
-        # Get transactions in period
-        transactions = Transaction.objects.filter(
+        rows = FarmDailyFinanceRollup.objects.filter(
             farm=farm,
             date__gte=start_date,
             date__lte=end_date
         )
-        
-        # Calculate totals
-        income_total = transactions.filter(type='income').aggregate(
-            total=Sum('amount')
-        )['total'] or 0
-        
-        expense_total = transactions.filter(type='expense').aggregate(
-            total=Sum('amount')
-        )['total'] or 0
-        
-        # Category breakdown
-        expense_by_category = {}
-        income_by_category = {}
-        
-        for t in transactions:
-            if t.type == 'expense':
-                expense_by_category[t.category] = expense_by_category.get(t.category, 0) + float(t.amount)
-            else:
-                income_by_category[t.category] = income_by_category.get(t.category, 0) + float(t.amount)
+        group_by = ['type', 'category']
+        if granularity:
+            rows = rows.annotate(bucket=Trunc('date', granularity, output_field=DateField()))
+            group_by.insert(0, 'bucket')
+        rows = rows.values(*group_by).annotate(amount=Sum('total')).order_by()
+
+        totals = {'income': Decimal('0'), 'expense': Decimal('0')}
+        by_category = {'income': {}, 'expense': {}}
+        series = {}
+
+        for row in rows:
+            kind, category, amount = row['type'], row['category'], row['amount']
+            totals[kind] += amount
+            by_category[kind][category] = by_category[kind].get(category, Decimal('0')) + amount
+            if granularity:
+                point = series.setdefault(row['bucket'], {'income': Decimal('0'), 'expense': Decimal('0')})
+                point[kind] += amount
+
+        expense_by_category = by_category['expense']
+        income_by_category = by_category['income']
         
         # Top categories
         top_expenses = sorted(expense_by_category.items(), key=lambda x: x[1], reverse=True)[:3]
         top_income = sorted(income_by_category.items(), key=lambda x: x[1], reverse=True)[:3]
         
-        return Response({
+        data = {
             'period_days': period,
             'start_date': start_date,
             'end_date': end_date,
-            'total_income': float(income_total),
-            'total_expenses': float(expense_total),
-            'net_profit': float(income_total - expense_total),
+            'total_income': totals['income'],
+            'total_expenses': totals['expense'],
+            'net_profit': totals['income'] - totals['expense'],
             'expense_by_category': expense_by_category,
             'income_by_category': income_by_category,
             'top_expenses': [{'category': cat, 'amount': amt} for cat, amt in top_expenses],
             'top_income': [{'category': cat, 'amount': amt} for cat, amt in top_income],
-        })
-
+        }
+        if granularity:
+            data['granularity'] = granularity
+            data['series'] = [
+                {
+                    'date': bucket,
+                    'income': point['income'],
+                    'expenses': point['expense'],
+                    'net': point['income'] - point['expense'],
+                }
+                for bucket, point in sorted(series.items())
+            ]
+        return Response(data)
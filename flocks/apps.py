@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class FlocksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'flocks'
+
+    def ready(self):
+        import flocks.signals
@@ -0,0 +1,130 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import DateField, F, Func, IntegerField, Sum, Window
+from django.db.models.functions import Trunc
+
+from core.archive import read_archive
+
+from .models import FeedLog, HealthLog, EggCollection
+
+BUCKETS = ('day', 'week')
+# Used to turn egg counts into egg mass for the feed conversion ratio
+AVERAGE_EGG_WEIGHT_KG = Decimal('0.06')
+
+
+class RunningSum(Func):
+    """SUM() that can wrap an aggregate inside a window: SUM(SUM(x)) OVER (...)."""
+    function = 'SUM'
+    window_compatible = True
+
+
+def bucket_start(day, bucket):
+    return day - timedelta(days=day.weekday()) if bucket == 'week' else day
+
+
+def percent(numerator, denominator, places=2):
+    return round(float(numerator) / float(denominator) * 100, places) if denominator else None
+
+
+def ratio(numerator, denominator, places=4):
+    return round(float(numerator) / float(denominator), places) if denominator else None
+
+
+def merge_archived_logs(flock, start, end, bucket, eggs, feed, lost):
+    """
+    Fold an archived flock's cold-storage logs into the per-bucket maps built
+    by flock_kpis and return the archived losses dated before `start`.
+    """
+    for row in read_archive(flock.farm_id, 'egg_collections', start, end, flock=flock.id):
+        entry = eggs.setdefault(bucket_start(row['date'], bucket), {'eggs': 0, 'damaged': 0})
+        entry['eggs'] = (entry['eggs'] or 0) + row['quantity_collected']
+        entry['damaged'] = (entry['damaged'] or 0) + row['damaged']
+    for row in read_archive(flock.farm_id, 'feed_logs', start, end, flock=flock.id):
+        day = bucket_start(row['date'], bucket)
+        feed[day] = (feed.get(day) or Decimal('0')) + row['quantity_kg']
+
+    lost_before = 0
+    for row in read_archive(flock.farm_id, 'health_logs', None, end, flock=flock.id):
+        if row['log_type'] not in HealthLog.LOSS_TYPES:
+            continue
+        if row['date'] < start:
+            lost_before += row['affected_birds']
+            continue
+        entry = lost.setdefault(bucket_start(row['date'], bucket), {'lost': 0})
+        entry['lost'] += row['affected_birds']
+    running = 0
+    for day in sorted(lost):
+        running += lost[day]['lost']
+        lost[day]['cumulative'] = running
+    return lost_before
+
+
+def flock_kpis(flock, start, end, bucket='day'):
+    """
+    Production KPIs for one flock, one entry per day or ISO week in [start, end].
+    Each source table is aggregated per bucket in the database; cumulative
+    losses come from a window over the grouped rows plus one aggregate for the
+    losses before `start`. Archived flocks also read their cold-storage logs.
+    """
+    bucketed = Trunc('date', bucket, output_field=DateField())
+
+    eggs = {
+        row['bucket']: row
+        for row in EggCollection.objects.filter(flock=flock, date__range=(start, end))
+        .annotate(bucket=bucketed).values('bucket')
+        .annotate(eggs=Sum('quantity_collected'), damaged=Sum('damaged')).order_by()
+    }
+    feed = {
+        row['bucket']: row['feed_kg']
+        for row in FeedLog.objects.filter(flock=flock, date__range=(start, end))
+        .annotate(bucket=bucketed).values('bucket')
+        .annotate(feed_kg=Sum('quantity_kg')).order_by()
+    }
+    losses = HealthLog.objects.filter(flock=flock, log_type__in=HealthLog.LOSS_TYPES)
+    lost_before = losses.filter(date__lt=start).aggregate(total=Sum('affected_birds'))['total'] or 0
+    lost = {
+        row['bucket']: row
+        for row in losses.filter(date__range=(start, end))
+        .annotate(bucket=bucketed).values('bucket')
+        .annotate(lost=Sum('affected_birds'))
+        .annotate(cumulative=Window(
+            RunningSum(Sum('affected_birds'), output_field=IntegerField()),
+            order_by=F('bucket').asc(),
+        ))
+        .order_by('bucket')
+    }
+    if flock.archived_at:
+        lost_before += merge_archived_logs(flock, start, end, bucket, eggs, feed, lost)
+
+    series = []
+    cumulative = lost_before
+    day = bucket_start(start, bucket)
+    step = timedelta(days=7 if bucket == 'week' else 1)
+    while day <= end:
+        days = (min(day + step - timedelta(days=1), end) - max(day, start)).days + 1
+        birds_at_start = max(flock.initial_quantity - cumulative, 0)
+        if day in lost:
+            cumulative = lost_before + lost[day]['cumulative']
+        egg_row = eggs.get(day, {})
+        collected = egg_row.get('eggs') or 0
+        damaged = egg_row.get('damaged') or 0
+        feed_kg = feed.get(day) or Decimal('0')
+        bird_days = birds_at_start * days
+
+        series.append({
+            'date': day,
+            'days': days,
+            'eggs': collected,
+            'damaged': damaged,
+            'feed_kg': feed_kg,
+            'deaths': lost[day]['lost'] if day in lost else 0,
+            'birds_alive': max(flock.initial_quantity - cumulative, 0),
+            'hen_day_production': percent(collected, bird_days),
+            'damage_rate': percent(damaged, collected),
+            'feed_per_bird_kg': ratio(feed_kg, bird_days),
+            'fcr': ratio(feed_kg, collected * AVERAGE_EGG_WEIGHT_KG),
+            'cumulative_mortality': percent(cumulative, flock.initial_quantity),
+        })
+        day += step
+    return series
@@ -0,0 +1,26 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from flocks.tasks import materialize_daily_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute FlockDailyStats rows for a date range. Rows are upserted, so an "
+        "interrupted backfill can simply be run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', type=date.fromisoformat, help='First day (YYYY-MM-DD), defaults to --to')
+        parser.add_argument('--to', dest='end', type=date.fromisoformat, help='Last day (YYYY-MM-DD), defaults to yesterday')
+        parser.add_argument('--farm', type=int, action='append', help='Only this farm id (repeatable)')
+
+    def handle(self, *args, **options):
+        end = options['end'] or timezone.now().date() - timedelta(days=1)
+        start = options['start'] or end
+        if start > end:
+            raise CommandError('--from must not be after --to')
+        written = materialize_daily_stats(start, end, options['farm'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} flock daily stats rows for {start} to {end}."))
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.cache import bump_farm_version
+from flocks.models import Flock
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every flock's current_quantity as initial_quantity minus the birds "
+        "lost in mortality and cull health logs, in one set-based UPDATE. Headcount "
+        "changes that are not logged as losses (birds sold, transferred or edited by "
+        "hand) are overwritten, so run it with --dry-run first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--farm', type=int, help='Only reconcile flocks of this farm id')
+        parser.add_argument('--dry-run', action='store_true', help='List mismatched flocks without updating them')
+        parser.add_argument(
+            '--noinput', '--no-input', action='store_false', dest='interactive',
+            help='Reconcile without asking for confirmation',
+        )
+
+    def handle(self, *args, **options):
+        # Archived flocks have no logs left to derive a headcount from
+        flocks = Flock.objects.filter(archived_at__isnull=True)
+        if options['farm']:
+            flocks = flocks.filter(farm_id=options['farm'])
+        mismatched = flocks.with_expected_headcount().exclude(current_quantity=F('expected_quantity'))
+
+        if options['dry_run']:
+            rows = mismatched.annotate(expected=F('expected_quantity')).values_list('id', 'name', 'current_quantity', 'expected')
+            count = 0
+            for flock_id, name, current, expected in rows.iterator():
+                count += 1
+                self.stdout.write(f"Flock {flock_id} ({name}): current {current}, expected {expected}")
+            self.stdout.write(f"{count} flocks need reconciling.")
+            return
+
+        if options['interactive']:
+            scope = f"farm {options['farm']}" if options['farm'] else "EVERY farm"
+            answer = input(
+                f"This overwrites current_quantity for {scope}, discarding sales, transfers "
+                "and manual edits that were not logged as losses. Type 'yes' to continue: "
+            )
+            if answer != 'yes':
+                raise CommandError("Reconciliation cancelled.")
+
+        with transaction.atomic():
+            farm_ids = set(mismatched.order_by().values_list('farm_id', flat=True).distinct())
+            updated = mismatched.update(current_quantity=F('expected_quantity'), updated_at=timezone.now())
+            # The UPDATE sends no signals, so cached flock responses are invalidated here
+            for farm_id in farm_ids:
+                bump_farm_version(farm_id)
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {updated} flocks across {len(farm_ids)} farms."))
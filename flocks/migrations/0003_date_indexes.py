@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_pushtoken'),
+        ('flocks', '0002_flock_farm'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='eggcollection',
+            index=models.Index(fields=['flock', 'date'], name='flocks_eggc_flock_i_d924ee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedlog',
+            index=models.Index(fields=['flock', 'date'], name='flocks_feed_flock_i_a51f77_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flock',
+            index=models.Index(fields=['farm', 'date_added'], name='flocks_floc_farm_id_e7ca48_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='healthlog',
+            index=models.Index(fields=['flock', 'date'], name='flocks_heal_flock_i_c4300f_idx'),
+        ),
+    ]
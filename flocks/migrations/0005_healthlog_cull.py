@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flocks', '0004_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='healthlog',
+            name='log_type',
+            field=models.CharField(choices=[('vaccination', 'Vaccination'), ('medication', 'Medication'), ('mortality', 'Mortality'), ('cull', 'Cull'), ('other', 'Other')], max_length=20),
+        ),
+    ]
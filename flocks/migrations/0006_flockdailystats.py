@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flocks', '0005_healthlog_cull'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlockDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('eggs', models.PositiveIntegerField(default=0)),
+                ('damaged', models.PositiveIntegerField(default=0)),
+                ('feed_kg', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('feed_cost', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('health_cost', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('deaths', models.PositiveIntegerField(default=0)),
+                ('culls', models.PositiveIntegerField(default=0)),
+                ('birds_alive', models.PositiveIntegerField(default=0)),
+                ('cumulative_eggs', models.PositiveIntegerField(default=0)),
+                ('cumulative_feed_kg', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cumulative_feed_cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cumulative_losses', models.PositiveIntegerField(default=0)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('flock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='flocks.flock')),
+            ],
+            options={
+                'unique_together': {('flock', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+from core.partitioning import partition_table
+
+
+def partition_logs(apps, schema_editor):
+    for table in ('flocks_feedlog', 'flocks_healthlog', 'flocks_eggcollection'):
+        partition_table(schema_editor, table, 'date')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flocks', '0006_flockdailystats'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_logs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flocks', '0007_partition_logs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flock',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,6 +1,120 @@
+from datetime import timedelta
+
 from django.db import models
+from django.dispatch import Signal
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, FloatField, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest, Least, NullIf
+from django.utils import timezone
 from core.models import User, Farm
 
+# Sent with (farm_id, ids) after flock logs are deleted, in place of post_delete:
+# a post_delete receiver on the log models would turn off Django's single-query
+# cascade delete of a flock's logs. See FlockLog, FlockLogQuerySet and flocks/signals.py.
+flock_logs_deleted = Signal()
+
+
+def flock_total(queryset, field, output_field, flock_field='flock'):
+    """Correlated subquery summing `field` over the rows of `queryset` for each flock."""
+    total = queryset.order_by().values(flock_field).annotate(total=Sum(field)).values('total')
+    return Coalesce(Subquery(total, output_field=output_field), Value(0), output_field=output_field)
+
+
+class FlockQuerySet(models.QuerySet):
+    def adjust_headcounts(self, changes):
+        """
+        Apply {flock_id: change in birds} to current_quantity in a single UPDATE.
+        Each flock's row is only matched if the result stays non-negative, so
+        concurrent writers cannot drive a headcount below zero, and restored
+        birds are capped at the flock's initial_quantity. Returns False if any
+        flock was left unchanged; callers should roll back in that case.
+        """
+        changes = {flock_id: change for flock_id, change in changes.items() if change}
+        if not changes:
+            return True
+
+        condition = Q()
+        for flock_id, change in changes.items():
+            condition |= Q(pk=flock_id, current_quantity__gte=-change) if change < 0 else Q(pk=flock_id)
+        updated = self.filter(condition).update(
+            current_quantity=Case(*[
+                When(pk=flock_id, then=(
+                    F('current_quantity') + change if change < 0 else Greatest(
+                        # A restore never lowers a headcount already edited above the cap
+                        F('current_quantity'),
+                        Least(F('current_quantity') + change, F('initial_quantity'), output_field=IntegerField()),
+                    )
+                ))
+                for flock_id, change in changes.items()
+            ]),
+            updated_at=timezone.now(),
+        )
+        return updated == len(changes)
+
+    def with_summary(self):
+        """
+        Annotate the fields shown on the flock list: the latest day's egg count,
+        the last feed date, mortality over the last 7 days and total feed cost.
+        Every value is a correlated subquery, so the list stays one query.
+        """
+        week_start = timezone.localdate() - timedelta(days=6)
+        return self.annotate(
+            latest_egg_date=Subquery(
+                EggCollection.objects.filter(flock=OuterRef('pk')).order_by('-date').values('date')[:1]
+            ),
+            last_feed_date=Subquery(FeedLog.objects.filter(flock=OuterRef('pk')).order_by('-date').values('date')[:1]),
+        ).annotate(
+            latest_egg_count=flock_total(
+                EggCollection.objects.filter(flock=OuterRef('pk'), date=OuterRef('latest_egg_date')),
+                'quantity_collected', IntegerField(),
+            ),
+            mortality_7d=flock_total(
+                HealthLog.objects.filter(flock=OuterRef('pk'), log_type='mortality', date__gte=week_start),
+                'affected_birds', IntegerField(),
+            ),
+            total_feed_cost=flock_total(
+                FeedLog.objects.filter(flock=OuterRef('pk')), 'cost', DecimalField(max_digits=14, decimal_places=2),
+            ),
+        )
+
+    def with_expected_headcount(self):
+        """Annotate the headcount implied by initial_quantity minus logged losses."""
+        losses = flock_total(
+            HealthLog.objects.filter(flock=OuterRef('pk'), log_type__in=HealthLog.LOSS_TYPES),
+            'affected_birds', IntegerField(),
+        )
+        return self.alias(expected_quantity=Greatest(F('initial_quantity') - losses, Value(0)))
+
+    def with_economics(self):
+        """
+        Annotate each flock with its income, costs and unit economics, computed
+        entirely with correlated subqueries so any number of flocks costs one query.
+        """
+        from finances.models import Transaction
+
+        money = DecimalField(max_digits=14, decimal_places=2)
+        ratio = DecimalField(max_digits=14, decimal_places=4)
+        transactions = Transaction.objects.filter(related_flock=OuterRef('pk'))
+        return self.annotate(
+            income=flock_total(transactions.filter(type='income'), 'amount', money, 'related_flock'),
+            other_expenses=flock_total(transactions.filter(type='expense'), 'amount', money, 'related_flock'),
+            feed_cost=flock_total(FeedLog.objects.filter(flock=OuterRef('pk')), 'cost', money),
+            health_cost=flock_total(HealthLog.objects.filter(flock=OuterRef('pk')), 'cost', money),
+            eggs_collected=flock_total(EggCollection.objects.filter(flock=OuterRef('pk')), 'quantity_collected', IntegerField()),
+        ).annotate(
+            total_cost=F('feed_cost') + F('health_cost') + F('other_expenses'),
+        ).annotate(
+            net_margin=F('income') - F('total_cost'),
+            # SQLite keeps whole-number decimals as integers, so divide as floats
+            # rather than truncating; the ratio is rounded to 4 places anyway
+            cost_per_bird=ExpressionWrapper(
+                Cast('total_cost', FloatField()) / NullIf(F('initial_quantity'), 0), output_field=ratio,
+            ),
+            cost_per_egg=ExpressionWrapper(
+                Cast('total_cost', FloatField()) / NullIf(F('eggs_collected'), 0), output_field=ratio,
+            ),
+        )
+
+
 class Flock(models.Model):
     name = models.CharField(max_length=100)
     breed = models.CharField(max_length=100)
@@ -9,45 +123,133 @@ class Flock(models.Model):
     date_added = models.DateField(auto_now_add=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='flocks', null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Set once the flock's logs have been moved to cold storage (core.archive)
+    archived_at = models.DateTimeField(null=True, blank=True)
+
+    objects = FlockQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['farm', 'date_added'])]
 
     def __str__(self):
         return self.name
 
-class FeedLog(models.Model):
+class FlockLogQuerySet(models.QuerySet):
+    def delete(self):
+        """
+        Delete the logs, then send flock_logs_deleted once per farm, as
+        FlockLog.delete does for a single log.
+        """
+        deleted = {}
+        for pk, farm_id in self.values_list('pk', 'flock__farm_id'):
+            deleted.setdefault(farm_id, []).append(pk)
+        result = super().delete()
+        for farm_id, ids in deleted.items():
+            flock_logs_deleted.send(sender=self.model, farm_id=farm_id, ids=ids)
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class FlockLog(models.Model):
+    objects = FlockLogQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def delete(self, *args, **kwargs):
+        farm_id = Flock.objects.filter(pk=self.flock_id).values_list('farm_id', flat=True).first()
+        pk = self.pk
+        result = super().delete(*args, **kwargs)
+        flock_logs_deleted.send(sender=type(self), farm_id=farm_id, ids=[pk])
+        return result
+
+
+class FeedLog(FlockLog):
     flock = models.ForeignKey(Flock, on_delete=models.CASCADE, related_name='feed_logs')
     date = models.DateField()
     quantity_kg = models.DecimalField(max_digits=10, decimal_places=2)
     feed_type = models.CharField(max_length=100)
     cost = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta(FlockLog.Meta):
+        indexes = [models.Index(fields=['flock', 'date'])]
 
     def __str__(self):
         return f"{self.flock.name} - {self.date} - {self.feed_type}"
 
-class HealthLog(models.Model):
+class HealthLog(FlockLog):
     LOG_TYPES = (
         ('vaccination', 'Vaccination'),
         ('medication', 'Medication'),
         ('mortality', 'Mortality'),
+        ('cull', 'Cull'),
         ('other', 'Other'),
     )
+    # Log types whose affected_birds are removed from Flock.current_quantity
+    LOSS_TYPES = ('mortality', 'cull')
+
     flock = models.ForeignKey(Flock, on_delete=models.CASCADE, related_name='health_logs')
     date = models.DateField()
     log_type = models.CharField(max_length=20, choices=LOG_TYPES)
     description = models.TextField()
     cost = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     
-    # For mortality, we might want to deduct from flock quantity automatically, 
-    # but let's keep it simple for now and maybe handle in signals or view.
+    # For mortality and culls, the views deduct these from the flock's
+    # current_quantity in the same transaction as the log write.
     affected_birds = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta(FlockLog.Meta):
+        indexes = [models.Index(fields=['flock', 'date'])]
+
+    @property
+    def birds_lost(self):
+        return self.affected_birds if self.log_type in self.LOSS_TYPES else 0
 
     def __str__(self):
         return f"{self.flock.name} - {self.log_type} - {self.date}"
 
-class EggCollection(models.Model):
+class EggCollection(FlockLog):
     flock = models.ForeignKey(Flock, on_delete=models.CASCADE, related_name='egg_collections')
     date = models.DateField()
     quantity_collected = models.PositiveIntegerField()
     damaged = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta(FlockLog.Meta):
+        indexes = [models.Index(fields=['flock', 'date'])]
 
     def __str__(self):
         return f"{self.flock.name} - {self.date} - {self.quantity_collected}"
+
+class FlockDailyStats(models.Model):
+    """
+    One precomputed row per flock per day, written by the nightly
+    materialize_flock_daily_stats task. Cumulative values run from the
+    flock's first log up to and including `date`.
+    """
+    flock = models.ForeignKey(Flock, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    eggs = models.PositiveIntegerField(default=0)
+    damaged = models.PositiveIntegerField(default=0)
+    feed_kg = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    feed_cost = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    health_cost = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    deaths = models.PositiveIntegerField(default=0)
+    culls = models.PositiveIntegerField(default=0)
+    birds_alive = models.PositiveIntegerField(default=0)
+    cumulative_eggs = models.PositiveIntegerField(default=0)
+    cumulative_feed_kg = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cumulative_feed_cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cumulative_losses = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('flock', 'date')
+
+    def __str__(self):
+        return f"{self.flock_id} - {self.date}"
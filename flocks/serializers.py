@@ -1,23 +1,119 @@
 from rest_framework import serializers
+from core.serializers import DynamicFieldsMixin
 from .models import Flock, FeedLog, HealthLog, EggCollection
 
-class FlockSerializer(serializers.ModelSerializer):
+class FarmFlockField(serializers.PrimaryKeyRelatedField):
+    """
+    A flock belonging to the requesting user's farm.
+    When the view preloads the farm's flocks into context['flocks'], ids are
+    resolved from that dict instead of with one query per record.
+    """
+    def get_queryset(self):
+        request = self.context.get('request')
+        if request is None:
+            return Flock.objects.all()
+        return Flock.objects.filter(farm=request.user.farm)
+
+    def to_internal_value(self, data):
+        flocks = self.context.get('flocks')
+        if flocks is None:
+            return super().to_internal_value(data)
+        try:
+            return flocks[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+class FlockSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    # Summary fields, present when the queryset is annotated with with_summary()
+    latest_egg_count = serializers.IntegerField(read_only=True)
+    latest_egg_date = serializers.DateField(read_only=True)
+    last_feed_date = serializers.DateField(read_only=True)
+    mortality_7d = serializers.IntegerField(read_only=True)
+    total_feed_cost = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+
     class Meta:
         model = Flock
         fields = '__all__'
-        read_only_fields = ('user',)
+        read_only_fields = ('user', 'archived_at')
+
+class FlockEconomicsTotalsSerializer(serializers.Serializer):
+    SUMMED_FIELDS = (
+        'initial_quantity', 'current_quantity', 'income', 'feed_cost', 'health_cost',
+        'other_expenses', 'total_cost', 'net_margin', 'eggs_collected',
+    )
+
+    initial_quantity = serializers.IntegerField(read_only=True)
+    current_quantity = serializers.IntegerField(read_only=True)
+    income = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    feed_cost = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    health_cost = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    other_expenses = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    total_cost = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    net_margin = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    eggs_collected = serializers.IntegerField(read_only=True)
+    cost_per_bird = serializers.DecimalField(max_digits=14, decimal_places=4, read_only=True, allow_null=True)
+    cost_per_egg = serializers.DecimalField(max_digits=14, decimal_places=4, read_only=True, allow_null=True)
+
+class FlockEconomicsSerializer(FlockEconomicsTotalsSerializer, serializers.ModelSerializer):
+    class Meta:
+        model = Flock
+        fields = (
+            'id', 'name', 'initial_quantity', 'current_quantity', 'income', 'feed_cost', 'health_cost',
+            'other_expenses', 'total_cost', 'net_margin', 'eggs_collected', 'cost_per_bird', 'cost_per_egg',
+        )
+
+class FeedLogSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    flock = FarmFlockField()
 
-class FeedLogSerializer(serializers.ModelSerializer):
     class Meta:
         model = FeedLog
         fields = '__all__'
 
-class HealthLogSerializer(serializers.ModelSerializer):
+class HealthLogSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    flock = FarmFlockField()
+
     class Meta:
         model = HealthLog
         fields = '__all__'
 
-class EggCollectionSerializer(serializers.ModelSerializer):
+class EggCollectionSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    flock = FarmFlockField()
+
     class Meta:
         model = EggCollection
         fields = '__all__'
+
+class BulkLogSerializer(serializers.Serializer):
+    feed_logs = FeedLogSerializer(many=True, required=False)
+    health_logs = HealthLogSerializer(many=True, required=False)
+    egg_collections = EggCollectionSerializer(many=True, required=False)
+
+    MAX_RECORDS = 1000
+
+    def to_internal_value(self, data):
+        # Reject oversized batches before validating every record
+        if isinstance(data, dict):
+            total = sum(len(data[key]) for key in self.fields if isinstance(data.get(key), list))
+            if total > self.MAX_RECORDS:
+                raise serializers.ValidationError(
+                    {'non_field_errors': [f'At most {self.MAX_RECORDS} records can be sent at once.']}
+                )
+        return super().to_internal_value(data)
+
+    def validate(self, attrs):
+        if not any(attrs.get(key) for key in self.fields):
+            raise serializers.ValidationError('At least one record is required.')
+        return attrs
+
+    def flock_ids(self):
+        """Every well-formed flock id referenced by the raw payload."""
+        ids = set()
+        for key in self.fields:
+            records = self.initial_data.get(key) if isinstance(self.initial_data, dict) else None
+            for record in records if isinstance(records, list) else []:
+                flock = record.get('flock') if isinstance(record, dict) else None
+                if isinstance(flock, int) or (isinstance(flock, str) and flock.isdigit()):
+                    ids.add(int(flock))
+        return ids
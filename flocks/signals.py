@@ -0,0 +1,40 @@
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from core.cache import bump_farm_version
+from .models import Flock, FeedLog, HealthLog, EggCollection, flock_logs_deleted
+
+FLOCK_LOG_MODELS = (FeedLog, HealthLog, EggCollection)
+
+
+def log_farm_id(log):
+    """Farm of a flock log, without a query when the flock is already loaded."""
+    if type(log).flock.is_cached(log):
+        return log.flock.farm_id
+    return Flock.objects.filter(pk=log.flock_id).values_list('farm_id', flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=Flock)
+def invalidate_flock_cache(sender, instance, **kwargs):
+    bump_farm_version(instance.farm_id)
+
+
+@receiver(post_save, sender=FeedLog)
+@receiver(post_save, sender=HealthLog)
+@receiver(post_save, sender=EggCollection)
+def invalidate_log_cache(sender, instance, **kwargs):
+    bump_farm_version(log_farm_id(instance))
+
+
+@receiver(pre_delete, sender=Flock)
+def flock_logs_cascade(sender, instance, **kwargs):
+    # The logs themselves are then removed with one DELETE per table
+    for model in FLOCK_LOG_MODELS:
+        ids = list(model.objects.filter(flock=instance).values_list('id', flat=True))
+        if ids:
+            flock_logs_deleted.send(sender=model, farm_id=instance.farm_id, ids=ids)
+
+
+@receiver(flock_logs_deleted)
+def invalidate_deleted_logs_cache(sender, farm_id, ids, **kwargs):
+    bump_farm_version(farm_id)
@@ -0,0 +1,171 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from celery import shared_task
+from django.db import transaction
+from django.db.models import Min, Q, Sum
+from django.utils import timezone
+
+from core.models import Farm
+from .models import EggCollection, FeedLog, Flock, FlockDailyStats, HealthLog
+
+# Farms materialized per batch, and days per chunk within a batch, so a long
+# backfill never holds more than FARM_BATCH_SIZE farms x CHUNK_DAYS days of rows.
+FARM_BATCH_SIZE = 50
+CHUNK_DAYS = 31
+# The nightly run recomputes a few trailing days to pick up late-entered logs.
+NIGHTLY_LOOKBACK_DAYS = 3
+
+STAT_FIELDS = (
+    'eggs', 'damaged', 'feed_kg', 'feed_cost', 'health_cost', 'deaths', 'culls', 'birds_alive',
+    'cumulative_eggs', 'cumulative_feed_kg', 'cumulative_feed_cost', 'cumulative_losses',
+)
+
+
+def _daily_totals(queryset, start, end, **sums):
+    """{(flock_id, date): {name: total}} for the logs of queryset between start and end."""
+    rows = (
+        queryset.filter(date__gte=start, date__lte=end)
+        .order_by().values('flock_id', 'date')
+        .annotate(**sums)
+    )
+    return {(row.pop('flock_id'), row.pop('date')): row for row in rows}
+
+
+def _totals_before(queryset, day, **sums):
+    """{flock_id: {name: total}} for the logs of queryset dated before day."""
+    rows = (
+        queryset.filter(date__lt=day)
+        .order_by().values('flock_id')
+        .annotate(**sums)
+    )
+    return {row.pop('flock_id'): row for row in rows}
+
+
+def _first_days(flocks):
+    """
+    {flock_id: first day to materialize}: the earlier of the day the flock was
+    entered and its earliest log, since logs are often backdated before the
+    flock row existed.
+    """
+    first = {flock.id: flock.date_added for flock in flocks}
+    for model in (EggCollection, FeedLog, HealthLog):
+        rows = (
+            model.objects.filter(flock_id__in=first).order_by()
+            .values('flock_id').annotate(first_day=Min('date'))
+        )
+        for row in rows:
+            first[row['flock_id']] = min(first[row['flock_id']], row['first_day'])
+    return first
+
+
+def _materialize_chunk(flocks, start, end, first_days):
+    """Upsert one FlockDailyStats row per flock per day from start to end inclusive."""
+    flock_ids = [flock.id for flock in flocks]
+    eggs = EggCollection.objects.filter(flock_id__in=flock_ids)
+    feed = FeedLog.objects.filter(flock_id__in=flock_ids)
+    health = HealthLog.objects.filter(flock_id__in=flock_ids)
+    losses = Sum('affected_birds', filter=Q(log_type__in=HealthLog.LOSS_TYPES))
+
+    egg_days = _daily_totals(eggs, start, end, eggs=Sum('quantity_collected'), damaged=Sum('damaged'))
+    feed_days = _daily_totals(feed, start, end, feed_kg=Sum('quantity_kg'), feed_cost=Sum('cost'))
+    health_days = _daily_totals(
+        health, start, end,
+        health_cost=Sum('cost'),
+        deaths=Sum('affected_birds', filter=Q(log_type='mortality')),
+        culls=Sum('affected_birds', filter=Q(log_type='cull')),
+    )
+    egg_base = _totals_before(eggs, start, eggs=Sum('quantity_collected'))
+    feed_base = _totals_before(feed, start, feed_kg=Sum('quantity_kg'), feed_cost=Sum('cost'))
+    loss_base = _totals_before(health, start, losses=losses)
+
+    rows = []
+    for flock in flocks:
+        cumulative_eggs = egg_base.get(flock.id, {}).get('eggs') or 0
+        cumulative_feed_kg = feed_base.get(flock.id, {}).get('feed_kg') or Decimal('0')
+        cumulative_feed_cost = feed_base.get(flock.id, {}).get('feed_cost') or Decimal('0')
+        cumulative_losses = loss_base.get(flock.id, {}).get('losses') or 0
+
+        day = max(start, first_days[flock.id])
+        while day <= end:
+            egg = egg_days.get((flock.id, day), {})
+            fed = feed_days.get((flock.id, day), {})
+            health_day = health_days.get((flock.id, day), {})
+            deaths = health_day.get('deaths') or 0
+            culls = health_day.get('culls') or 0
+
+            cumulative_eggs += egg.get('eggs') or 0
+            cumulative_feed_kg += fed.get('feed_kg') or 0
+            cumulative_feed_cost += fed.get('feed_cost') or 0
+            cumulative_losses += deaths + culls
+            rows.append(FlockDailyStats(
+                flock_id=flock.id,
+                date=day,
+                eggs=egg.get('eggs') or 0,
+                damaged=egg.get('damaged') or 0,
+                feed_kg=fed.get('feed_kg') or 0,
+                feed_cost=fed.get('feed_cost') or 0,
+                health_cost=health_day.get('health_cost') or 0,
+                deaths=deaths,
+                culls=culls,
+                birds_alive=max(flock.initial_quantity - cumulative_losses, 0),
+                cumulative_eggs=cumulative_eggs,
+                cumulative_feed_kg=cumulative_feed_kg,
+                cumulative_feed_cost=cumulative_feed_cost,
+                cumulative_losses=cumulative_losses,
+                computed_at=timezone.now(),
+            ))
+            day += timedelta(days=1)
+
+    with transaction.atomic():
+        FlockDailyStats.objects.bulk_create(
+            rows,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['flock', 'date'],
+            update_fields=[*STAT_FIELDS, 'computed_at'],
+        )
+    return len(rows)
+
+
+def materialize_daily_stats(start, end, farm_ids=None):
+    """
+    Recompute FlockDailyStats for every flock between start and end inclusive.
+    Rows are upserted, so any range can be re-run after a failure or a backfill
+    of older logs without clearing it first. Archived flocks are skipped since
+    their logs are no longer in the database. Returns the number of rows written.
+    """
+    farms = Farm.objects.order_by('id').values_list('id', flat=True)
+    if farm_ids:
+        farms = farms.filter(id__in=farm_ids)
+    farms = list(farms)
+
+    written = 0
+    for offset in range(0, len(farms), FARM_BATCH_SIZE):
+        batch = farms[offset:offset + FARM_BATCH_SIZE]
+        flocks = list(
+            Flock.objects.filter(farm_id__in=batch, archived_at__isnull=True)
+            .only('id', 'initial_quantity', 'date_added')
+        )
+        if not flocks:
+            continue
+        first_days = _first_days(flocks)
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(chunk_start + timedelta(days=CHUNK_DAYS - 1), end)
+            written += _materialize_chunk(flocks, chunk_start, chunk_end, first_days)
+            chunk_start = chunk_end + timedelta(days=1)
+    return written
+
+
+@shared_task
+def materialize_flock_daily_stats(start=None, end=None, farm_ids=None):
+    """
+    Nightly job writing per-flock daily stats. Without arguments it recomputes
+    the last NIGHTLY_LOOKBACK_DAYS days up to yesterday; pass ISO dates to
+    backfill or re-run any other range.
+    """
+    yesterday = timezone.now().date() - timedelta(days=1)
+    end = date.fromisoformat(end) if end else yesterday
+    start = date.fromisoformat(start) if start else end - timedelta(days=NIGHTLY_LOOKBACK_DAYS - 1)
+    return materialize_daily_stats(start, end, farm_ids)
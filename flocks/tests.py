@@ -1,3 +1,596 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import skipIf
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.archive import pa
+from core.cache import get_farm_version
+from core.models import Farm, User
+from finances.models import Transaction
+
+from .models import Flock, FeedLog, FlockDailyStats, HealthLog, EggCollection
+from .tasks import materialize_daily_stats
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FlockListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='password', role='superuser')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.user.farm = self.farm
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_flock(self, name):
+        today = timezone.now().date()
+        flock = Flock.objects.create(
+            name=name, breed='Isa Brown', initial_quantity=100, current_quantity=100,
+            user=self.user, farm=self.farm,
+        )
+        for days_ago in range(3):
+            day = today - timedelta(days=days_ago)
+            EggCollection.objects.create(flock=flock, date=day, quantity_collected=80 + days_ago)
+            FeedLog.objects.create(flock=flock, date=day, quantity_kg=10, feed_type='Layer mash', cost=25)
+        HealthLog.objects.create(flock=flock, date=today, log_type='mortality', description='', affected_birds=2)
+        return flock
+
+    def list_flocks(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/flocks/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results'], len(queries)
+
+    def test_summary_fields(self):
+        self.add_flock('House 1')
+        results, _ = self.list_flocks()
+
+        flock = results[0]
+        self.assertEqual(flock['latest_egg_count'], 80)
+        self.assertEqual(flock['latest_egg_date'], timezone.now().date().isoformat())
+        self.assertEqual(flock['last_feed_date'], timezone.now().date().isoformat())
+        self.assertEqual(flock['mortality_7d'], 2)
+        self.assertEqual(flock['total_feed_cost'], '75.00')
+
+    def test_query_count_does_not_grow_with_flocks(self):
+        self.add_flock('House 1')
+        results, single_flock_queries = self.list_flocks()
+        self.assertEqual(len(results), 1)
+
+        for number in range(2, 7):
+            self.add_flock(f'House {number}')
+        results, many_flock_queries = self.list_flocks()
+        self.assertEqual(len(results), 6)
+        self.assertEqual(single_flock_queries, many_flock_queries)
+
+    def test_validators_move_with_the_day(self):
+        flock = self.add_flock('House 1')
+        response = self.client.get('/api/flocks/')
+        self.assertEqual(response.json()['results'][0]['mortality_7d'], 2)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertEqual(self.client.get('/api/flocks/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # mortality_7d is relative to today, so the next day's copy is refetched
+        with patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(days=1)):
+            self.assertEqual(self.client.get('/api/flocks/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+            response = self.client.get(f'/api/flocks/{flock.id}/', HTTP_IF_MODIFIED_SINCE=last_modified)
+            self.assertEqual(response.status_code, 200)
+
+        # A week later the deaths have fallen out of it without any write
+        with patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(days=7)):
+            response = self.client.get('/api/flocks/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['results'][0]['mortality_7d'], 0)
+
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FlockKpiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='password', role='superuser')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.user.farm = self.farm
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.today = timezone.now().date()
+        self.start = self.today - timedelta(days=2)
+        self.flock = Flock.objects.create(
+            name='House 1', breed='Isa Brown', initial_quantity=100, current_quantity=91,
+            user=self.user, farm=self.farm,
+        )
+        HealthLog.objects.create(
+            flock=self.flock, date=self.start - timedelta(days=3), log_type='mortality', description='', affected_birds=5,
+        )
+        EggCollection.objects.create(flock=self.flock, date=self.start, quantity_collected=80, damaged=2)
+        FeedLog.objects.create(flock=self.flock, date=self.start, quantity_kg=10, feed_type='Layer mash', cost=25)
+        HealthLog.objects.create(
+            flock=self.flock, date=self.start + timedelta(days=1), log_type='cull', description='', affected_birds=4,
+        )
+
+    def kpis(self, **params):
+        cache.clear()
+        return self.client.get(f'/api/flocks/{self.flock.id}/kpis/', {
+            'from': self.start.isoformat(), 'to': self.today.isoformat(), **params,
+        })
+
+    def test_daily_series(self):
+        response = self.kpis()
+
+        self.assertEqual(response.status_code, 200)
+        first, second, third = response.json()['series']
+        # Losses before the range count against the starting headcount
+        self.assertEqual(first['birds_alive'], 95)
+        self.assertEqual(first['hen_day_production'], 84.21)
+        self.assertEqual(first['damage_rate'], 2.5)
+        self.assertEqual(first['feed_per_bird_kg'], 0.1053)
+        self.assertEqual(first['fcr'], 2.0833)
+        self.assertEqual(first['cumulative_mortality'], 5.0)
+        self.assertEqual((second['deaths'], second['birds_alive'], second['cumulative_mortality']), (4, 91, 9.0))
+        self.assertEqual((third['eggs'], third['hen_day_production'], third['fcr']), (0, 0.0, None))
+
+    def test_weekly_series(self):
+        response = self.kpis(bucket='week')
+
+        self.assertEqual(response.status_code, 200)
+        series = response.json()['series']
+        self.assertEqual(sum(week['days'] for week in series), 3)
+        self.assertEqual(sum(week['eggs'] for week in series), 80)
+        self.assertEqual(series[-1]['birds_alive'], 91)
+
+    def test_invalid_bucket(self):
+        self.assertEqual(self.kpis(bucket='month').status_code, 400)
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FlockEconomicsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', password='password', role='superuser')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.user.farm = self.farm
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        today = timezone.now().date()
+
+        self.flock = self.add_flock(self.farm, 100)
+        self.empty = self.add_flock(self.farm, 50)
+        for cost, eggs in ((25, 80), (15, 120)):
+            FeedLog.objects.create(flock=self.flock, date=today, quantity_kg=10, feed_type='Layer mash', cost=cost)
+            EggCollection.objects.create(flock=self.flock, date=today, quantity_collected=eggs)
+        HealthLog.objects.create(flock=self.flock, date=today, log_type='vaccination', description='', cost=10)
+        for type, category, amount in (('income', 'egg_sales', 200), ('expense', 'equipment', 30)):
+            Transaction.objects.create(
+                user=self.user, farm=self.farm, related_flock=self.flock, date=today, type=type, category=category,
+                amount=amount,
+            )
+
+        neighbour = User.objects.create_user('neighbour', password='password', role='superuser')
+        other = self.add_flock(Farm.objects.create(name='Other Farm', owner=neighbour), 100)
+        FeedLog.objects.create(flock=other, date=today, quantity_kg=10, feed_type='Layer mash', cost=99)
+
+    def add_flock(self, farm, birds):
+        return Flock.objects.create(
+            name='House', breed='Isa Brown', initial_quantity=birds, current_quantity=birds, user=farm.owner, farm=farm,
+        )
+
+    def get(self, url):
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def figures(self, data, *fields):
+        return tuple(data[field] for field in fields)
+
+    def test_flock_economics(self):
+        data = self.get(f'/api/flocks/{self.flock.id}/economics/')
+
+        self.assertEqual(
+            self.figures(data, 'income', 'feed_cost', 'health_cost', 'other_expenses', 'total_cost', 'net_margin'),
+            ('200.00', '40.00', '10.00', '30.00', '80.00', '120.00'),
+        )
+        self.assertEqual(self.figures(data, 'eggs_collected', 'cost_per_bird', 'cost_per_egg'), (200, '0.8000', '0.4000'))
+
+    def test_farm_economics(self):
+        data = self.get('/api/flocks/economics/')
+
+        self.assertEqual([flock['id'] for flock in data['flocks']], [self.flock.id, self.empty.id])
+        empty = data['flocks'][1]
+        self.assertEqual(
+            self.figures(empty, 'total_cost', 'eggs_collected', 'cost_per_bird', 'cost_per_egg'),
+            ('0.00', 0, '0.0000', None),
+        )
+        totals = data['totals']
+        self.assertEqual(
+            self.figures(totals, 'initial_quantity', 'income', 'total_cost', 'net_margin', 'eggs_collected'),
+            (150, '200.00', '80.00', '120.00', 200),
+        )
+        self.assertEqual(self.figures(totals, 'cost_per_bird', 'cost_per_egg'), ('0.5333', '0.4000'))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FlockDailyStatsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='password', role='superuser')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.flock = Flock.objects.create(
+            name='House 1', breed='Isa Brown', initial_quantity=100, current_quantity=100,
+            user=self.user, farm=self.farm,
+        )
+        self.today = timezone.now().date()
+
+    def test_logs_dated_before_the_flock_was_entered(self):
+        # Logs are often backdated, so days before date_added still count
+        EggCollection.objects.create(flock=self.flock, date=self.today - timedelta(days=10), quantity_collected=50)
+        EggCollection.objects.create(flock=self.flock, date=self.today, quantity_collected=50)
+        HealthLog.objects.create(
+            flock=self.flock, date=self.today - timedelta(days=5), log_type='mortality',
+            description='', affected_birds=3,
+        )
+
+        written = materialize_daily_stats(self.today - timedelta(days=30), self.today)
+
+        self.assertEqual(written, 11)
+        first = FlockDailyStats.objects.order_by('date').first()
+        self.assertEqual(first.date, self.today - timedelta(days=10))
+        stats = FlockDailyStats.objects.get(flock=self.flock, date=self.today)
+        self.assertEqual(stats.cumulative_eggs, 100)
+        self.assertEqual(stats.cumulative_losses, 3)
+        self.assertEqual(stats.birds_alive, 97)
+
+    def test_range_after_backdated_logs(self):
+        EggCollection.objects.create(flock=self.flock, date=self.today - timedelta(days=10), quantity_collected=50)
+        EggCollection.objects.create(flock=self.flock, date=self.today, quantity_collected=50)
+
+        materialize_daily_stats(self.today - timedelta(days=1), self.today)
+
+        self.assertEqual(FlockDailyStats.objects.count(), 2)
+        self.assertEqual(FlockDailyStats.objects.get(date=self.today).cumulative_eggs, 100)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ReconcileHeadcountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='password', role='superuser')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.other_farm = Farm.objects.create(name='Other Farm', owner=self.user)
+        self.flock = self.add_flock(self.farm)
+        self.other_flock = self.add_flock(self.other_farm)
+
+    def add_flock(self, farm):
+        flock = Flock.objects.create(
+            name='House 1', breed='Isa Brown', initial_quantity=100, current_quantity=100,
+            user=self.user, farm=farm,
+        )
+        HealthLog.objects.create(
+            flock=flock, date=timezone.now().date(), log_type='mortality', description='', affected_birds=5,
+        )
+        return flock
+
+    def reconcile(self, **options):
+        """Run the command, returning {farm_id: whether its version was bumped}."""
+        farms = (self.farm.id, self.other_farm.id)
+        before = {farm_id: get_farm_version(farm_id) for farm_id in farms}
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reconcile_headcounts', interactive=False, stdout=StringIO(), **options)
+        return {farm_id: get_farm_version(farm_id) != before[farm_id] for farm_id in farms}
+
+    def test_reconciles_and_invalidates_the_farm(self):
+        bumped = self.reconcile(farm=self.farm.id)
+
+        self.flock.refresh_from_db()
+        self.other_flock.refresh_from_db()
+        self.assertEqual(self.flock.current_quantity, 95)
+        self.assertEqual(self.other_flock.current_quantity, 100)
+        self.assertEqual(bumped, {self.farm.id: True, self.other_farm.id: False})
+
+    def test_dry_run_changes_nothing(self):
+        bumped = self.reconcile(dry_run=True)
+
+        self.flock.refresh_from_db()
+        self.assertEqual(self.flock.current_quantity, 100)
+        self.assertEqual(bumped, {self.farm.id: False, self.other_farm.id: False})
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}, ARCHIVE_HORIZON_DAYS=730,
+)
+@skipIf(pa is None, 'pyarrow is not installed')
+class LogExportTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        override = override_settings(ARCHIVE_ROOT=root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user('owner', password='password', role='superuser')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.user.farm = self.farm
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.today = timezone.now().date()
+
+        # A closed flock whose logs archive_cold_data moves to cold storage
+        self.closed = self.add_flock(current_quantity=0, days=(802, 800))
+        Flock.objects.filter(pk=self.closed.pk).update(date_added=self.today - timedelta(days=900))
+        self.live = self.add_flock(current_quantity=100, days=(1, 0))
+        neighbour = User.objects.create_user('neighbour', password='password', role='superuser')
+        self.add_flock(current_quantity=100, days=(0,), farm=Farm.objects.create(name='Other Farm', owner=neighbour))
+        call_command('archive_cold_data', stdout=StringIO())
+
+    def add_flock(self, current_quantity, days, farm=None):
+        farm = farm or self.farm
+        flock = Flock.objects.create(
+            name='House', breed='Isa Brown', initial_quantity=100, current_quantity=current_quantity,
+            user=farm.owner, farm=farm,
+        )
+        for days_ago in days:
+            EggCollection.objects.create(
+                flock=flock, date=self.today - timedelta(days=days_ago), quantity_collected=days_ago,
+            )
+        return flock
+
+    def export(self, **params):
+        response = self.client.get('/api/egg-collections/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_archived_rows_are_merged_in_date_order(self):
+        self.assertEqual(EggCollection.objects.filter(flock=self.closed).count(), 0)
+
+        rows = self.export().splitlines()
+
+        self.assertEqual(rows[0], 'id,flock,date,quantity_collected,damaged')
+        self.assertEqual(
+            [tuple(row.split(',')[1:4]) for row in rows[1:]],
+            [
+                (str(flock.id), (self.today - timedelta(days=days_ago)).isoformat(), str(days_ago))
+                for flock, days_ago in ((self.closed, 802), (self.closed, 800), (self.live, 1), (self.live, 0))
+            ],
+        )
+
+    def test_filters_apply_to_archived_rows(self):
+        lines = self.export(**{
+            'format': 'ndjson', 'flock': self.closed.id,
+            'from': (self.today - timedelta(days=801)).isoformat(), 'to': self.today.isoformat(),
+        }).splitlines()
+        self.assertEqual([json.loads(line)['quantity_collected'] for line in lines], [800])
+
+        lines = self.export(format='ndjson', **{'from': (self.today - timedelta(days=1)).isoformat()}).splitlines()
+        self.assertEqual([json.loads(line)['quantity_collected'] for line in lines], [1, 0])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class LogPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='password', role='superuser')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.user.farm = self.farm
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.flock = Flock.objects.create(
+            name='House 1', breed='Isa Brown', initial_quantity=100, current_quantity=100,
+            user=self.user, farm=self.farm,
+        )
+        self.today = timezone.now().date()
+
+    def add_log(self, days_ago):
+        return FeedLog.objects.create(
+            flock=self.flock, date=self.today - timedelta(days=days_ago), quantity_kg=10, feed_type='Layer mash', cost=25,
+        )
+
+    def page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [log['id'] for log in response.json()['results']], response.json()['next']
+
+    def test_pages_are_stable_while_logs_are_added(self):
+        # Several logs share a date, so ties are broken by id
+        logs = [self.add_log(days_ago) for days_ago in (3, 1, 1, 1, 0, 2)]
+        expected = [log.id for log in sorted(logs, key=lambda log: (log.date, log.id), reverse=True)]
+
+        seen, url = self.page('/api/feed-logs/?page_size=2')
+        while url:
+            # Newer rows written between requests do not shift later pages
+            self.add_log(0)
+            ids, url = self.page(url)
+            seen += ids
+
+        self.assertEqual(seen, expected)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FarmCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', password='password', role='superuser')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.user.farm = self.farm
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.flock = Flock.objects.create(
+            name='House 1', breed='Isa Brown', initial_quantity=100, current_quantity=100,
+            user=self.user, farm=self.farm,
+        )
+        self.today = timezone.now().date()
+
+    def feed_cost(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/flocks/{self.flock.id}/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['total_feed_cost'], len(queries)
+
+    def test_reads_are_served_from_the_cache(self):
+        self.assertEqual(self.feed_cost()[0], '0.00')
+        self.assertEqual(self.feed_cost(), ('0.00', 0))
+
+    def test_api_writes_invalidate(self):
+        self.feed_cost()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/feed-logs/', {
+                'flock': self.flock.id, 'date': self.today.isoformat(), 'quantity_kg': '10', 'feed_type': 'Layer mash',
+                'cost': '25.00',
+            })
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(self.feed_cost()[0], '25.00')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/api/feed-logs/{response.json()['id']}/")
+        self.assertEqual(self.feed_cost()[0], '0.00')
+
+    def test_writes_outside_the_api_invalidate(self):
+        self.feed_cost()
+        with self.captureOnCommitCallbacks(execute=True):
+            FeedLog.objects.create(flock=self.flock, date=self.today, quantity_kg=10, feed_type='Layer mash', cost=25)
+        self.assertEqual(self.feed_cost()[0], '25.00')
+
+    def test_version_moves_only_on_commit(self):
+        version = get_farm_version(self.farm.id)
+        with self.captureOnCommitCallbacks() as callbacks:
+            FeedLog.objects.create(flock=self.flock, date=self.today, quantity_kg=10, feed_type='Layer mash', cost=25)
+        # A reader before the commit still caches under the old version
+        self.assertEqual(get_farm_version(self.farm.id), version)
+
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_farm_version(self.farm.id), version)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class BulkLogTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='password', role='superuser')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.user.farm = self.farm
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.flock = Flock.objects.create(
+            name='House 1', breed='Isa Brown', initial_quantity=100, current_quantity=100,
+            user=self.user, farm=self.farm,
+        )
+        self.today = timezone.now().date().isoformat()
+
+    def post(self, affected_birds=3, flock=None, quantity_collected=80):
+        return self.client.post('/api/logs/bulk/', {
+            'feed_logs': [
+                {'flock': self.flock.id, 'date': self.today, 'quantity_kg': '10', 'feed_type': 'Layer mash', 'cost': '25'},
+            ],
+            'health_logs': [{
+                'flock': flock or self.flock.id, 'date': self.today, 'log_type': 'mortality', 'description': 'Heat',
+                'affected_birds': affected_birds,
+            }],
+            'egg_collections': [
+                {'flock': self.flock.id, 'date': self.today, 'quantity_collected': quantity_collected},
+            ],
+        }, format='json')
+
+    def assert_nothing_written(self, response):
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertFalse(FeedLog.objects.exists() or HealthLog.objects.exists() or EggCollection.objects.exists())
+        self.flock.refresh_from_db()
+        self.assertEqual(self.flock.current_quantity, 100)
+
+    def test_creates_every_log(self):
+        response = self.post()
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual({key: len(ids) for key, ids in response.json().items()}, {
+            'feed_logs': 1, 'health_logs': 1, 'egg_collections': 1,
+        })
+        self.flock.refresh_from_db()
+        self.assertEqual(self.flock.current_quantity, 97)
+
+    def test_invalid_row_writes_nothing(self):
+        self.assert_nothing_written(self.post(quantity_collected=-1))
+
+    def test_other_farms_flock_writes_nothing(self):
+        neighbour = User.objects.create_user('neighbour', password='password', role='superuser')
+        other = Flock.objects.create(
+            name='House 1', breed='Isa Brown', initial_quantity=100, current_quantity=100, user=neighbour,
+            farm=Farm.objects.create(name='Other Farm', owner=neighbour),
+        )
+        self.assert_nothing_written(self.post(flock=other.id))
+
+    def test_failed_headcount_rolls_back_inserted_logs(self):
+        # Feed logs are inserted before the headcount update rejects the batch
+        response = self.post(affected_birds=101)
+        self.assertIn('affected_birds', response.json())
+        self.assert_nothing_written(response)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class HealthLogHeadcountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='password', role='superuser')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.user.farm = self.farm
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.flock = Flock.objects.create(
+            name='House 1', breed='Isa Brown', initial_quantity=100, current_quantity=100,
+            user=self.user, farm=self.farm,
+        )
+        self.today = timezone.now().date().isoformat()
+
+    def headcount(self):
+        self.flock.refresh_from_db()
+        return self.flock.current_quantity
+
+    def test_losses_follow_log_writes(self):
+        response = self.client.post('/api/health-logs/', {
+            'flock': self.flock.id, 'date': self.today, 'log_type': 'mortality', 'description': 'Heat',
+            'affected_birds': 5,
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(self.headcount(), 95)
+        url = f"/api/health-logs/{response.json()['id']}/"
+
+        self.client.patch(url, {'affected_birds': 3})
+        self.assertEqual(self.headcount(), 97)
+        self.client.patch(url, {'log_type': 'vaccination'})
+        self.assertEqual(self.headcount(), 100)
+        self.client.patch(url, {'log_type': 'cull'})
+        self.assertEqual(self.headcount(), 97)
+        self.client.delete(url)
+        self.assertEqual(self.headcount(), 100)
+
+    def test_restores_are_capped_at_the_initial_quantity(self):
+        # A loss that was never deducted, e.g. logged outside the API
+        log = HealthLog.objects.create(
+            flock=self.flock, date=self.today, log_type='mortality', description='Heat', affected_birds=10,
+        )
+        Flock.objects.filter(pk=self.flock.pk).update(current_quantity=96)
+
+        response = self.client.delete(f'/api/health-logs/{log.id}/')
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.headcount(), 100)
+
+    def test_restores_never_lower_an_edited_headcount(self):
+        log = HealthLog.objects.create(
+            flock=self.flock, date=self.today, log_type='mortality', description='Heat', affected_birds=10,
+        )
+        Flock.objects.filter(pk=self.flock.pk).update(current_quantity=120)
+
+        self.client.delete(f'/api/health-logs/{log.id}/')
+
+        self.assertEqual(self.headcount(), 120)
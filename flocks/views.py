@@ -1,47 +1,193 @@
+from datetime import timedelta
+
 from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
-from rest_framework import viewsets, permissions
+from rest_framework import viewsets, permissions, status, serializers
+from rest_framework.decorators import action
+from rest_framework.response import Response
 
+from core.cache import ConditionalGetMixin, FarmCacheMixin, bump_farm_version, cache_per_farm
+from core.exports import ExportMixin
+from core.pagination import DateCursorPagination, FlockCursorPagination
 from core.permissions import IsManager, IsStaff
+from core.serializers import FieldSelectionMixin
+from core.utils import parse_date_range
 
+from .kpis import BUCKETS, flock_kpis
 from .models import Flock, FeedLog, HealthLog, EggCollection
-from .serializers import FlockSerializer, FeedLogSerializer, HealthLogSerializer, EggCollectionSerializer
+from .serializers import (
+    FlockSerializer, FlockEconomicsSerializer, FlockEconomicsTotalsSerializer, FeedLogSerializer, HealthLogSerializer,
+    EggCollectionSerializer, BulkLogSerializer
+)
+
+def update_headcounts(lost=(), restored=()):
+    """
+    Deduct the birds lost in `lost` health logs from their flocks and give back
+    those of `restored` ones, as one atomic UPDATE. Must run inside the
+    transaction that writes the logs.
+    """
+    changes = {}
+    for log in lost:
+        changes[log.flock_id] = changes.get(log.flock_id, 0) - log.birds_lost
+    for log in restored:
+        changes[log.flock_id] = changes.get(log.flock_id, 0) + log.birds_lost
+    if not Flock.objects.adjust_headcounts(changes):
+        raise serializers.ValidationError({'affected_birds': ["Exceeds the flock's current number of birds."]})
 
-class FlockViewSet(viewsets.ModelViewSet):
+class FlockViewSet(ConditionalGetMixin, FarmCacheMixin, FieldSelectionMixin, viewsets.ModelViewSet):
     serializer_class = FlockSerializer
+    pagination_class = FlockCursorPagination
+    # mortality_7d and the default KPI range are relative to today
+    vary_by_day = True
     # permission_classes = [IsManager] # Old: Only managers
     
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'kpis']:
             permission_classes = [IsStaff] # Staff can view
         else:
             permission_classes = [IsManager] # Only managers can create/edit/delete
         return [permission() for permission in permission_classes]
 
     def get_queryset(self):
-        return Flock.objects.filter(farm=self.request.user.farm)
+        queryset = Flock.objects.filter(farm=self.request.user.farm)
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.with_summary()
+        elif self.action in ('economics', 'farm_economics'):
+            queryset = queryset.with_economics()
+        return queryset
 
     @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(user=self.request.user, farm=self.request.user.farm)
 
-class FeedLogViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get'])
+    @cache_per_farm
+    def economics(self, request, pk=None):
+        """Income, costs, cost per bird, cost per egg and net margin for one flock."""
+        return Response(FlockEconomicsSerializer(self.get_object()).data)
+
+    @action(detail=True, methods=['get'])
+    @cache_per_farm
+    def kpis(self, request, pk=None):
+        """
+        Production KPIs per day or week.
+        Query params:
+        - from / to: date range (default: the last 30 days)
+        - bucket: day (default) or week
+        """
+        bucket = request.query_params.get('bucket', 'day')
+        if bucket not in BUCKETS:
+            return Response(
+                {'error': f"Bucket must be one of: {', '.join(BUCKETS)}"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        start, end = parse_date_range(request.query_params)
+        end = end or timezone.now().date()
+        start = start or end - timedelta(days=29)
+
+        flock = self.get_object()
+        return Response({
+            'flock': flock.id,
+            'bucket': bucket,
+            'from': start,
+            'to': end,
+            'initial_quantity': flock.initial_quantity,
+            'series': flock_kpis(flock, start, end, bucket),
+        })
+
+    @action(detail=False, methods=['get'], url_path='economics')
+    @cache_per_farm
+    def farm_economics(self, request):
+        """Per-flock economics for the whole farm plus farm-wide totals, in one query."""
+        flocks = list(self.get_queryset().order_by('id'))
+
+        totals = {field: 0 for field in FlockEconomicsTotalsSerializer.SUMMED_FIELDS}
+        for flock in flocks:
+            for field in totals:
+                totals[field] += getattr(flock, field)
+        totals['cost_per_bird'] = totals['total_cost'] / totals['initial_quantity'] if totals['initial_quantity'] else None
+        totals['cost_per_egg'] = totals['total_cost'] / totals['eggs_collected'] if totals['eggs_collected'] else None
+
+        return Response({
+            'flocks': FlockEconomicsSerializer(flocks, many=True).data,
+            'totals': FlockEconomicsTotalsSerializer(totals).data,
+        })
+
+class FeedLogViewSet(ConditionalGetMixin, FarmCacheMixin, FieldSelectionMixin, ExportMixin, viewsets.ModelViewSet):
     serializer_class = FeedLogSerializer
+    pagination_class = DateCursorPagination
     permission_classes = [IsStaff] # Staff can add logs
+    export_fields = ('id', 'flock', 'date', 'quantity_kg', 'feed_type', 'cost')
+    export_archive = 'feed_logs'
 
     def get_queryset(self):
         return FeedLog.objects.filter(flock__farm=self.request.user.farm)
 
-class HealthLogViewSet(viewsets.ModelViewSet):
+class HealthLogViewSet(ConditionalGetMixin, FarmCacheMixin, FieldSelectionMixin, ExportMixin, viewsets.ModelViewSet):
     serializer_class = HealthLogSerializer
+    pagination_class = DateCursorPagination
     permission_classes = [IsStaff] # Staff can add logs
+    export_fields = ('id', 'flock', 'date', 'log_type', 'description', 'cost', 'affected_birds')
+    export_archive = 'health_logs'
 
     def get_queryset(self):
         return HealthLog.objects.filter(flock__farm=self.request.user.farm)
 
-class EggCollectionViewSet(viewsets.ModelViewSet):
+    @transaction.atomic
+    def perform_create(self, serializer):
+        update_headcounts(lost=[serializer.save()])
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        # Restore the losses as committed, not as read before the lock, so a
+        # concurrent edit of the same log cannot be given back twice
+        previous = get_object_or_404(HealthLog.objects.select_for_update(), pk=serializer.instance.pk)
+        update_headcounts(lost=[serializer.save()], restored=[previous])
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance = get_object_or_404(HealthLog.objects.select_for_update(), pk=instance.pk)
+        update_headcounts(restored=[instance])
+        instance.delete()
+
+class EggCollectionViewSet(ConditionalGetMixin, FarmCacheMixin, FieldSelectionMixin, ExportMixin, viewsets.ModelViewSet):
     serializer_class = EggCollectionSerializer
+    pagination_class = DateCursorPagination
     permission_classes = [IsStaff] # Staff can add logs
+    export_fields = ('id', 'flock', 'date', 'quantity_collected', 'damaged')
+    export_archive = 'egg_collections'
 
     def get_queryset(self):
         return EggCollection.objects.filter(flock__farm=self.request.user.farm)
+
+class BulkLogViewSet(viewsets.ViewSet):
+    """
+    Create feed logs, health logs and egg collections for any of the farm's
+    flocks in a single request.
+    Expects: {"feed_logs": [...], "health_logs": [...], "egg_collections": [...]}
+    """
+    permission_classes = [IsStaff] # Staff can add logs
+    LOG_MODELS = (
+        ('feed_logs', FeedLog),
+        ('health_logs', HealthLog),
+        ('egg_collections', EggCollection),
+    )
+
+    @transaction.atomic
+    def create(self, request):
+        serializer = BulkLogSerializer(data=request.data, context={'request': request})
+        # One query checks every referenced flock against the user's farm
+        serializer.context['flocks'] = Flock.objects.filter(farm=request.user.farm).in_bulk(serializer.flock_ids())
+        serializer.is_valid(raise_exception=True)
+
+        created = {}
+        for key, model in self.LOG_MODELS:
+            logs = model.objects.bulk_create(model(**data) for data in serializer.validated_data.get(key, []))
+            created[key] = [log.id for log in logs]
+            if model is HealthLog:
+                update_headcounts(lost=logs)
+
+        # bulk_create skips post_save, so invalidate the farm's cache here
+        bump_farm_version(request.user.farm_id)
+        return Response(created, status=status.HTTP_201_CREATED)
@@ -0,0 +1,32 @@
+"""
+Daily reports and answers that archive_cold_data moved to cold storage
+(core.archive), read back for the report list, series, export packs and derivations.
+A farm has at most one report a day, so a year of archived reports is a few
+hundred rows.
+"""
+from core.archive import read_archive
+
+ANSWER_COLUMNS = ('answer_text', 'answer_number', 'answer_date', 'answer_boolean')
+
+
+def answer_value(row):
+    """The one answer column set on an answer row, or None."""
+    return next((row[column] for column in ANSWER_COLUMNS if row[column] is not None), None)
+
+
+def archived_reports(farm_id, start=None, end=None):
+    """Archived report rows of a farm between start and end, ordered by date then id."""
+    return read_archive(farm_id, 'daily_reports', start, end)
+
+
+def is_archived_day(farm_id, day):
+    """Whether the farm's report for `day` has been moved to cold storage."""
+    return any(True for _ in archived_reports(farm_id, day, day))
+
+
+def archived_answers(farm_id, start=None, end=None):
+    """{report_id: {question_id: value}} for the farm's archived answers between start and end."""
+    answers = {}
+    for row in read_archive(farm_id, 'report_answers', start, end):
+        answers.setdefault(row['report'], {})[row['question']] = answer_value(row)
+    return answers
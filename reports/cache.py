@@ -0,0 +1,59 @@
+"""
+Per-farm cache of the daily report form: the farm's ReportConfig with its
+questions in display order.
+
+The form has its own version counter, bumped only by ReportConfig and
+Question writes (see signals.py). Log and report submissions bump the farm
+version many times a day, but they leave the form version alone, so a
+client holding the current version never downloads the form again.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+
+from core.cache import RESPONSE_TIMEOUT, get_version, incr_version, record_cache_stat
+from .models import Question, ReportConfig
+from .serializers import ReportConfigSerializer
+
+REPORT_FORM_VERSION_KEY = 'farm:{farm_id}:report_form:version'
+REPORT_FORM_KEY = 'farm:{farm_id}:report_form:v{version}'
+REPORT_FORM_ENDPOINT = 'report-config.form'
+
+
+def get_report_form_version(farm_id):
+    return get_version(REPORT_FORM_VERSION_KEY.format(farm_id=farm_id))
+
+
+def bump_report_form_version(farm_id):
+    """Invalidate the farm's cached form once the current transaction commits."""
+    if farm_id is None:
+        return
+    transaction.on_commit(lambda: incr_version(REPORT_FORM_VERSION_KEY.format(farm_id=farm_id)))
+
+
+def report_form_etag(farm_id, version):
+    return f'"report-form-{farm_id}-{version}"'
+
+
+def get_report_form(farm_id):
+    """
+    {'version': ..., 'config': ...} for the farm, where config is the
+    serialized ReportConfig with its ordered questions, or None if the farm
+    has none yet. Built with two queries on a miss.
+    """
+    version = get_report_form_version(farm_id)
+    key = REPORT_FORM_KEY.format(farm_id=farm_id, version=version)
+    form = cache.get(key)
+    if form is not None:
+        record_cache_stat(REPORT_FORM_ENDPOINT, 'hit')
+        return form
+
+    record_cache_stat(REPORT_FORM_ENDPOINT, 'miss')
+    config = (
+        ReportConfig.objects.filter(farm_id=farm_id)
+        .prefetch_related(Prefetch('questions', queryset=Question.objects.order_by('sort_order', 'id')))
+        .first()
+    )
+    form = {'version': version, 'config': ReportConfigSerializer(config).data if config else None}
+    cache.set(key, form, RESPONSE_TIMEOUT)
+    return form
@@ -1,22 +1,23 @@
+# "key" names questions that reports/derivations.py reads or computes.
 DEFAULT_QUESTIONS = [
     {"text": "Birds received (new placement)", "type": "number"},
     {"text": "Mortality (by cause)", "type": "text"},
     {"text": "Culls", "type": "number"},
     {"text": "Transfers between houses", "type": "text"},
-    {"text": "Closing stock (auto-calculated)", "type": "number"},
+    {"text": "Closing stock (auto-calculated)", "type": "number", "key": "closing_stock"},
     {"text": "Stock variance alerts", "type": "text"},
     {"text": "Feed batch number", "type": "text"},
-    {"text": "Feed issued (kg)", "type": "number"},
-    {"text": "Feed consumed (kg)", "type": "number"},
+    {"text": "Feed issued (kg)", "type": "number", "key": "feed_issued"},
+    {"text": "Feed consumed (kg)", "type": "number", "key": "feed_consumed"},
     {"text": "Feed wastage", "type": "text"},
-    {"text": "Feed balance (auto)", "type": "number"},
-    {"text": "FCR (Feed Conversion Ratio – auto)", "type": "number"},
-    {"text": "Feed days remaining (forecast)", "type": "number"},
-    {"text": "Water consumption (litres)", "type": "number"},
+    {"text": "Feed balance (auto)", "type": "number", "key": "feed_balance"},
+    {"text": "FCR (Feed Conversion Ratio – auto)", "type": "number", "key": "fcr"},
+    {"text": "Feed days remaining (forecast)", "type": "number", "key": "feed_days_remaining"},
+    {"text": "Water consumption (litres)", "type": "number", "key": "water_consumption"},
     {"text": "Water source", "type": "text"},
     {"text": "Drinkers condition", "type": "text"},
     {"text": "Abnormal water intake alerts", "type": "text"},
-    {"text": "Water-to-feed ratio (auto)", "type": "number"},
+    {"text": "Water-to-feed ratio (auto)", "type": "number", "key": "water_to_feed_ratio"},
     {"text": "Sample bird weight", "type": "number"},
     {"text": "Average live weight", "type": "number"},
     {"text": "Uniformity %", "type": "number"},
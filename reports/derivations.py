@@ -0,0 +1,185 @@
+"""
+Values of the auto-calculated default questions ("Closing stock", "Feed
+balance", "FCR", ...).
+
+Each derivation is registered under the "key" its question has in
+DEFAULT_QUESTIONS and reads from a DerivationContext, which loads the farm's
+logs and answers for the day lazily and at most once, so computing every
+derived question of a report costs a handful of aggregate queries in total.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Exists, OuterRef, Q, Sum
+from django.utils.functional import cached_property
+
+from core.archive import read_archive
+from flocks.kpis import AVERAGE_EGG_WEIGHT_KG
+from flocks.models import EggCollection, FeedLog, Flock, HealthLog
+from .defaults import DEFAULT_QUESTIONS
+from .models import ReportAnswer
+
+# Question text -> key, for the default questions that have one
+QUESTION_KEYS = {question['text']: question['key'] for question in DEFAULT_QUESTIONS if 'key' in question}
+# Days of feed logs averaged for the feed forecast
+FEED_FORECAST_DAYS = 7
+
+DERIVATIONS = {}
+
+
+def derivation(key):
+    """Register the decorated function as the derivation of question `key`."""
+    def register(function):
+        DERIVATIONS[key] = function
+        return function
+    return register
+
+
+def question_key(question):
+    """Registry key of a question, or None for custom questions."""
+    if question.input_type != 'default':
+        return None
+    return QUESTION_KEYS.get(question.text)
+
+
+def is_derived(question):
+    return question_key(question) in DERIVATIONS
+
+
+class DerivationContext:
+    """The inputs of every derivation for one farm and day."""
+
+    def __init__(self, farm, day, questions, answers=None):
+        self.farm = farm
+        self.day = day
+        # key -> question, for the farm's default questions
+        self.questions = {question_key(question): question for question in questions if question_key(question)}
+        # key -> submitted value of the non-derived questions
+        self.answers = {
+            key: answers[question.id] for key, question in self.questions.items()
+            if answers and question.id in answers
+        }
+        self._values = {}
+
+    def value(self, key):
+        """A derived value, computing it (and what it depends on) once."""
+        if key not in self._values:
+            self._values[key] = DERIVATIONS[key](self)
+        return self._values[key]
+
+    def answer(self, key):
+        return self.answers.get(key)
+
+    @cached_property
+    def flocks(self):
+        """
+        The farm's flocks as of the day: entered by then, or with a log dated
+        by then, since logs are often backdated before the flock row existed.
+        """
+        on_day = Q(date_added__lte=self.day)
+        for model in (EggCollection, FeedLog, HealthLog):
+            on_day |= Exists(model.objects.filter(flock=OuterRef('pk'), date__lte=self.day))
+        return Flock.objects.filter(on_day, farm=self.farm, archived_at__isnull=True)
+
+    @cached_property
+    def feed_by_day(self):
+        """{date: kg} of feed logged over the forecast window ending today."""
+        rows = (
+            FeedLog.objects.filter(
+                flock__in=self.flocks, date__gt=self.day - timedelta(days=FEED_FORECAST_DAYS), date__lte=self.day,
+            )
+            .values('date').annotate(kg=Sum('quantity_kg')).order_by()
+        )
+        return {row['date']: row['kg'] for row in rows}
+
+    @cached_property
+    def feed_consumed(self):
+        """The submitted "Feed consumed" answer, else the feed logged today."""
+        consumed = self.answer('feed_consumed')
+        return consumed if consumed is not None else self.feed_by_day.get(self.day, Decimal('0'))
+
+    @cached_property
+    def eggs_collected(self):
+        return EggCollection.objects.filter(flock__in=self.flocks, date=self.day).aggregate(
+            total=Sum('quantity_collected')
+        )['total'] or 0
+
+    def previous_answer(self, key):
+        """The latest answer to question `key` on an earlier report, live or archived."""
+        question = self.questions.get(key)
+        if question is None:
+            return None
+        latest = (
+            ReportAnswer.objects.filter(question=question, reference_date__lt=self.day, answer_number__isnull=False)
+            .order_by('-reference_date').values_list('reference_date', 'answer_number').first()
+        )
+        # Archived answers are older than most live ones, so only the days
+        # between the latest live answer and this one are read back
+        after = latest[0] + timedelta(days=1) if latest else None
+        before = self.day - timedelta(days=1)
+        for row in read_archive(self.farm.id, 'report_answers', after, before, question=question.id):
+            if row['answer_number'] is not None:
+                latest = (row['reference_date'], row['answer_number'])
+        return latest[1] if latest else None
+
+
+def rounded(value):
+    return None if value is None else Decimal(value).quantize(Decimal('0.01'))
+
+
+@derivation('closing_stock')
+def closing_stock(context):
+    """Birds placed in the farm's flocks minus every loss logged up to today."""
+    placed = context.flocks.aggregate(total=Sum('initial_quantity'))['total'] or 0
+    lost = HealthLog.objects.filter(
+        flock__in=context.flocks, log_type__in=HealthLog.LOSS_TYPES, date__lte=context.day,
+    ).aggregate(total=Sum('affected_birds'))['total'] or 0
+    return rounded(max(placed - lost, 0))
+
+
+@derivation('feed_balance')
+def feed_balance(context):
+    """Yesterday's balance plus feed issued minus feed consumed today."""
+    previous = context.previous_answer('feed_balance') or Decimal('0')
+    issued = context.answer('feed_issued') or Decimal('0')
+    return rounded(previous + issued - context.feed_consumed)
+
+
+@derivation('fcr')
+def fcr(context):
+    """Feed consumed per kg of eggs collected today."""
+    egg_mass = context.eggs_collected * AVERAGE_EGG_WEIGHT_KG
+    return rounded(context.feed_consumed / egg_mass) if egg_mass else None
+
+
+@derivation('water_to_feed_ratio')
+def water_to_feed_ratio(context):
+    """Litres of water per kg of feed consumed today."""
+    water = context.answer('water_consumption')
+    if water is None or not context.feed_consumed:
+        return None
+    return rounded(water / context.feed_consumed)
+
+
+@derivation('feed_days_remaining')
+def feed_days_remaining(context):
+    """Feed balance divided by the average daily feed over the forecast window."""
+    daily = sum(context.feed_by_day.values(), Decimal('0')) / FEED_FORECAST_DAYS
+    balance = context.value('feed_balance')
+    if not daily or balance is None:
+        return None
+    return rounded(max(balance, Decimal('0')) / daily)
+
+
+def derive_answers(farm, day, questions, answers=None):
+    """
+    {question_id: value} for the derived questions among `questions`, given
+    the submitted {question_id: value} answers to the others. A derivation
+    returns None when its inputs are missing.
+    """
+    context = DerivationContext(farm, day, questions, answers)
+    return {
+        question.id: context.value(key)
+        for key, question in context.questions.items()
+        if key in DERIVATIONS
+    }
@@ -0,0 +1,197 @@
+"""
+Report export packs: a farm's daily reports for a date range with their
+answers, one row per report and one column per question, written as CSV or
+PDF under settings.REPORT_EXPORT_ROOT by reports.tasks.generate_report_export:
+
+    <REPORT_EXPORT_ROOT>/farm_<id>/report-export-<export id>.<format>
+
+Reports are read in keyset-paginated chunks of EXPORT_CHUNK_SIZE, each with
+one answer query bounded to the chunk's dates, so a CSV is written with flat
+memory however long the range is. Archived reports (reports/archive.py) are
+merged in by date. PDFs are laid out once every chunk has been read, one
+question/answer table per report. reportlab is only needed for PDF packs.
+"""
+import csv
+import heapq
+import os
+from itertools import islice
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Q
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import LongTable, Paragraph, SimpleDocTemplate, TableStyle
+except ImportError:  # pragma: no cover - optional until a PDF is requested
+    SimpleDocTemplate = None
+
+from core.models import User
+from .archive import archived_answers, archived_reports
+from .models import DailyReport, Question, ReportAnswer
+
+EXPORT_CHUNK_SIZE = 500
+FIXED_COLUMNS = ('date', 'submitted_by', 'submitted_at')
+
+
+def require_reportlab():
+    if SimpleDocTemplate is None:
+        raise ImproperlyConfigured('reportlab is required to export reports as PDF.')
+
+
+def export_path(export):
+    return (
+        Path(settings.REPORT_EXPORT_ROOT) / f'farm_{export.farm_id}'
+        / f'report-export-{export.id}.{export.format}'
+    )
+
+
+def export_reports(export):
+    return DailyReport.objects.filter(
+        farm_id=export.farm_id, reference_date__range=(export.start_date, export.end_date)
+    )
+
+
+def export_archived_reports(export):
+    return archived_reports(export.farm_id, export.start_date, export.end_date)
+
+
+def count_reports(export):
+    """Reports in the export's range, live and archived."""
+    return export_reports(export).count() + sum(1 for _ in export_archived_reports(export))
+
+
+def _live_rows(export, columns):
+    reports = export_reports(export).order_by('reference_date', 'id')
+    last = None
+    while True:
+        chunk = reports
+        if last:
+            chunk = chunk.filter(Q(reference_date__gt=last[0]) | Q(reference_date=last[0], id__gt=last[1]))
+        chunk = list(chunk.values_list('id', 'reference_date', 'user__username', 'submitted_at')[:EXPORT_CHUNK_SIZE])
+        if not chunk:
+            return
+
+        rows = {
+            report_id: [day, username, submitted_at, *([None] * len(columns))]
+            for report_id, day, username, submitted_at in chunk
+        }
+        answers = ReportAnswer.objects.filter(
+            report_id__in=rows, reference_date__range=(chunk[0][1], chunk[-1][1]),
+        ).values_list('report_id', 'question_id', 'answer_text', 'answer_number', 'answer_date', 'answer_boolean')
+        for report_id, question_id, *values in answers:
+            if question_id in columns:
+                rows[report_id][columns[question_id]] = next((value for value in values if value is not None), None)
+
+        yield from rows.values()
+        last = chunk[-1][1], chunk[-1][0]
+
+
+def _archived_rows(export, columns):
+    reports = iter(export_archived_reports(export))
+    while chunk := list(islice(reports, EXPORT_CHUNK_SIZE)):
+        usernames = dict(User.objects.filter(id__in={report['user'] for report in chunk}).values_list('id', 'username'))
+        answers = archived_answers(export.farm_id, chunk[0]['reference_date'], chunk[-1]['reference_date'])
+        for report in chunk:
+            row = [report['reference_date'], usernames.get(report['user']), report['submitted_at'], *([None] * len(columns))]
+            for question_id, value in answers.get(report['id'], {}).items():
+                if question_id in columns:
+                    row[columns[question_id]] = value
+            yield row
+
+
+def iter_report_rows(export, questions):
+    """
+    Yield the export's rows one chunk (a list of rows) at a time, ordered by
+    date. Each row is the FIXED_COLUMNS followed by one answer per question.
+    """
+    columns = {question.id: index for index, question in enumerate(questions, start=len(FIXED_COLUMNS))}
+    rows = heapq.merge(_archived_rows(export, columns), _live_rows(export, columns), key=lambda row: row[0])
+    while chunk := list(islice(rows, EXPORT_CHUNK_SIZE)):
+        yield chunk
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'Yes' if value else 'No'
+    return str(value)
+
+
+def _write_csv(path, header, chunks, on_chunk):
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        for rows in chunks:
+            writer.writerows([_cell(value) for value in row] for row in rows)
+            on_chunk(len(rows))
+
+
+def _write_pdf(path, header, chunks, on_chunk, title):
+    """
+    One question/answer table per report: a farm's question set is far too
+    wide to lay out as one column per question on a page.
+    """
+    styles = getSampleStyleSheet()
+    cell_style = styles['BodyText'].clone('ExportCell', fontSize=8, leading=10)
+    # Paragraph text is markup, so answers are escaped
+    paragraph = lambda value: Paragraph(escape(_cell(value)), cell_style)
+    table_style = TableStyle([
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+        ('BACKGROUND', (0, 0), (0, -1), colors.whitesmoke),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ])
+    document = SimpleDocTemplate(str(path), pagesize=A4, title=title)
+    width = document.width
+
+    story = [Paragraph(title, styles['Heading1'])]
+    questions = header[len(FIXED_COLUMNS):]
+    for rows in chunks:
+        for day, username, submitted_at, *answers in rows:
+            heading = f"{day}, submitted by {_cell(username)} at {_cell(submitted_at)}"
+            story.append(Paragraph(escape(heading), styles['Heading3']))
+            table = LongTable(
+                [[paragraph(question), paragraph(answer)] for question, answer in zip(questions, answers)],
+                colWidths=[width * 0.55, width * 0.45], repeatRows=0,
+            )
+            table.setStyle(table_style)
+            story.append(table)
+        on_chunk(len(rows))
+    if len(story) == 1:
+        story.append(Paragraph('No reports in this range.', styles['BodyText']))
+    document.build(story)
+
+
+def write_export(export, on_chunk):
+    """
+    Write the export's file, calling on_chunk(rows) after each chunk of
+    reports is read. The file is written beside its final path and moved
+    into place once complete. Returns the path.
+    """
+    if export.format == 'pdf':
+        require_reportlab()
+    questions = list(
+        Question.objects.filter(config__farm_id=export.farm_id).order_by('sort_order', 'id').only('id', 'text')
+    )
+    header = [*FIXED_COLUMNS, *(question.text for question in questions)]
+    chunks = iter_report_rows(export, questions)
+
+    path = export_path(export)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(f'.{export.format}.tmp')
+    try:
+        if export.format == 'pdf':
+            title = f"Daily reports {export.start_date} to {export.end_date}"
+            _write_pdf(partial, header, chunks, on_chunk, title)
+        else:
+            _write_csv(partial, header, chunks, on_chunk)
+        os.replace(partial, path)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    return path
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_reference_dates(apps, schema_editor):
+    DailyReport = apps.get_model('reports', 'DailyReport')
+    ReportAnswer = apps.get_model('reports', 'ReportAnswer')
+    ReportAnswer.objects.update(
+        reference_date=Subquery(DailyReport.objects.filter(pk=OuterRef('report_id')).values('reference_date')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0002_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportanswer',
+            name='reference_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.RunPython(copy_reference_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='reportanswer',
+            name='reference_date',
+            field=models.DateField(),
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations
+
+from core.partitioning import partition_table
+
+
+def partition_answers(apps, schema_editor):
+    partition_table(schema_editor, 'reports_reportanswer', 'reference_date')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0003_reportanswer_reference_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_answers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0004_partition_reportanswer'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reportanswer',
+            index=models.Index(fields=['question', 'reference_date'], name='reports_rep_questio_76da96_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:35
+
+from datetime import datetime, timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def schedule_deadlines(apps, schema_editor):
+    # The schedule as of this migration: a reminder an hour before the first
+    # deadline after now and the missed alert five minutes after it.
+    ReportConfig = apps.get_model('reports', 'ReportConfig')
+    now = timezone.now()
+    today = timezone.localtime(now).date()
+    configs = list(ReportConfig.objects.filter(is_enabled=True, deadline_time__isnull=False))
+    for config in configs:
+        deadline = timezone.make_aware(datetime.combine(today, config.deadline_time))
+        if deadline <= now:
+            deadline = timezone.make_aware(datetime.combine(today + timedelta(days=1), config.deadline_time))
+        config.next_reminder_at = deadline - timedelta(hours=1)
+        config.next_missed_at = deadline + timedelta(minutes=5)
+    ReportConfig.objects.bulk_update(configs, ['next_reminder_at', 'next_missed_at'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_pushtoken'),
+        ('reports', '0005_reportanswer_question_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportconfig',
+            name='next_missed_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='reportconfig',
+            name='next_reminder_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='ReportNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference_date', models.DateField()),
+                ('kind', models.CharField(choices=[('deadline_reminder', 'Deadline reminder'), ('deadline_missed', 'Deadline missed')], max_length=20)),
+                ('sent_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('farm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_notifications', to='core.farm')),
+            ],
+            options={
+                'unique_together': {('farm', 'reference_date', 'kind')},
+            },
+        ),
+        migrations.RunPython(schedule_deadlines, migrations.RunPython.noop),
+    ]
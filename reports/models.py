@@ -1,13 +1,58 @@
+from datetime import datetime, timedelta
+
 from django.db import models
+from django.utils import timezone
+from django.utils.dateparse import parse_time
+
 from core.models import Farm, User
 
+# The "due soon" reminder goes out this long before the deadline and the
+# "missed" alert this long after it.
+REMINDER_LEAD = timedelta(hours=1)
+MISSED_GRACE = timedelta(minutes=5)
+
+
+def deadline_schedule(deadline_time, now=None):
+    """
+    (reminder_at, missed_at) for the first deadline after `now`, or
+    (None, None) without a deadline. A reminder_at already in the past
+    means the deadline is within the hour, so it is due right away.
+    `deadline_time` may still be a string such as "18:00" when the config
+    was built from raw values.
+    """
+    if isinstance(deadline_time, str):
+        deadline_time = parse_time(deadline_time)
+    if deadline_time is None:
+        return None, None
+    now = now or timezone.now()
+    local_now = timezone.localtime(now)
+    deadline = timezone.make_aware(datetime.combine(local_now.date(), deadline_time))
+    if deadline <= now:
+        deadline = timezone.make_aware(datetime.combine(local_now.date() + timedelta(days=1), deadline_time))
+    return deadline - REMINDER_LEAD, deadline + MISSED_GRACE
+
+
 class ReportConfig(models.Model):
     farm = models.OneToOneField(Farm, on_delete=models.CASCADE, related_name='report_config')
     is_enabled = models.BooleanField(default=False)
     deadline_time = models.TimeField(null=True, blank=True)
+    # When the next deadline notifications are due; maintained by save() and
+    # advanced a day at a time by reports.tasks.check_deadlines.
+    next_reminder_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
+    next_missed_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    def save(self, *args, **kwargs):
+        if self.is_enabled:
+            self.next_reminder_at, self.next_missed_at = deadline_schedule(self.deadline_time)
+        else:
+            self.next_reminder_at = self.next_missed_at = None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'next_reminder_at', 'next_missed_at'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"ReportConfig for {self.farm.name}"
 
@@ -29,6 +74,7 @@ class Question(models.Model):
     is_required = models.BooleanField(default=True)
     input_type = models.CharField(max_length=20, choices=INPUT_TYPES, default='custom')
     sort_order = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         ordering = ['sort_order']
@@ -41,6 +87,7 @@ class DailyReport(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='submitted_reports')
     reference_date = models.DateField()
     submitted_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         unique_together = ('farm', 'reference_date')
@@ -56,6 +103,66 @@ class ReportAnswer(models.Model):
     answer_number = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
     answer_date = models.DateField(null=True, blank=True)
     answer_boolean = models.BooleanField(null=True, blank=True)
-    
+    # Copy of report.reference_date; the table is range-partitioned on it.
+    reference_date = models.DateField()
+
+    class Meta:
+        indexes = [models.Index(fields=['question', 'reference_date'])]
+
+    def save(self, *args, **kwargs):
+        if self.reference_date is None:
+            self.reference_date = self.report.reference_date
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Answer to {self.question.text}"
+
+class ReportNotification(models.Model):
+    """A deadline notification sent for a farm's report; one per kind per day."""
+    KINDS = (
+        ('deadline_reminder', 'Deadline reminder'),
+        ('deadline_missed', 'Deadline missed'),
+    )
+
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='report_notifications')
+    reference_date = models.DateField()
+    kind = models.CharField(max_length=20, choices=KINDS)
+    sent_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        unique_together = ('farm', 'reference_date', 'kind')
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.reference_date} - {self.farm_id}"
+
+class ReportExport(models.Model):
+    """A CSV or PDF pack of a farm's daily reports, generated in the background."""
+    FORMATS = (
+        ('csv', 'CSV'),
+        ('pdf', 'PDF'),
+    )
+    STATUSES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    ACTIVE_STATUSES = ('queued', 'running')
+
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='report_exports')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='report_exports')
+    format = models.CharField(max_length=10, choices=FORMATS, default='csv')
+    start_date = models.DateField()
+    end_date = models.DateField()
+    status = models.CharField(max_length=20, choices=STATUSES, default='queued', db_index=True)
+    progress = models.PositiveSmallIntegerField(default=0)
+    row_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Export {self.start_date} - {self.end_date} ({self.format}) - {self.farm_id}"
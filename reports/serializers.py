@@ -1,5 +1,12 @@
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
-from .models import ReportConfig, Question, DailyReport, ReportAnswer
+from core.serializers import DynamicFieldsMixin
+from .archive import is_archived_day
+from .derivations import derive_answers, is_derived
+from .models import ReportConfig, Question, DailyReport, ReportAnswer, ReportExport
+
+ARCHIVED_DAY_ERROR = "The farm's report for this date has been archived and can no longer be changed."
 
 class QuestionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -13,46 +20,160 @@ class ReportConfigSerializer(serializers.ModelSerializer):
         model = ReportConfig
         fields = ['id', 'is_enabled', 'deadline_time', 'questions']
 
-class ReportAnswerSerializer(serializers.ModelSerializer):
+class ReportAnswerSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     question_text = serializers.CharField(source='question.text', read_only=True)
     
     class Meta:
         model = ReportAnswer
         fields = ['id', 'question', 'question_text', 'answer_text', 'answer_number', 'answer_date', 'answer_boolean']
 
-class DailyReportSerializer(serializers.ModelSerializer):
-    answers = ReportAnswerSerializer(many=True, read_only=True)
+class DailyReportSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.username', read_only=True)
 
     class Meta:
         model = DailyReport
         fields = ['id', 'reference_date', 'submitted_at', 'user', 'user_name', 'answers']
+        expandable_fields = {'answers': (ReportAnswerSerializer, {'many': True})}
+        default_expand = ('answers',)
+
+    def validate_reference_date(self, value):
+        report = self.instance
+        if report is None or value == report.reference_date:
+            return value
+        if DailyReport.objects.filter(farm_id=report.farm_id, reference_date=value).exists():
+            raise serializers.ValidationError("The farm already has a report for this date.")
+        if is_archived_day(report.farm_id, value):
+            raise serializers.ValidationError(ARCHIVED_DAY_ERROR)
+        return value
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        previous_date = instance.reference_date
+        report = super().update(instance, validated_data)
+        if report.reference_date != previous_date:
+            # The answers' copy of the date is their partition key, so they are
+            # moved by deleting and re-inserting them under the new date.
+            answers = ReportAnswer.objects.filter(report=report, reference_date=previous_date)
+            moved = list(answers)
+            answers.delete()
+            for answer in moved:
+                answer.reference_date = report.reference_date
+            ReportAnswer.objects.bulk_create(moved)
+        return report
 
 class DailyReportSubmissionSerializer(serializers.ModelSerializer):
-    answers = serializers.ListField(write_only=True)
+    """
+    Submit (or resubmit) a farm's report for a day.
+    Each answer is {"question_id": ..., "answer_<type>": value}, where the key
+    matches the question's type. Resubmitting a day replaces its answers.
+    Auto-calculated default questions (reports/derivations.py) are computed
+    here and stored with the rest; they are never required from the client.
+    """
+    # question_type -> (answer column, field used to validate the value)
+    ANSWER_FIELDS = {
+        'text': ('answer_text', serializers.CharField(allow_blank=True)),
+        'number': ('answer_number', serializers.DecimalField(max_digits=12, decimal_places=2)),
+        'date': ('answer_date', serializers.DateField()),
+        'boolean': ('answer_boolean', serializers.BooleanField()),
+    }
+
+    answers = serializers.ListField(child=serializers.DictField(), write_only=True)
 
     class Meta:
         model = DailyReport
         fields = ['reference_date', 'answers']
 
+    def validate(self, attrs):
+        farm = self.context['request'].user.farm
+        if farm is None:
+            raise serializers.ValidationError("User has no farm")
+        # The archived report no longer holds the (farm, reference_date) row
+        # that would make this a resubmission, so it would be duplicated
+        if is_archived_day(farm.id, attrs['reference_date']):
+            raise serializers.ValidationError({'reference_date': [ARCHIVED_DAY_ERROR]})
+        questions = {question.id: question for question in Question.objects.filter(config__farm=farm)}
+        derived = {question_id for question_id, question in questions.items() if is_derived(question)}
+
+        answers, errors, answered = [], {}, set()
+        for index, answer in enumerate(attrs['answers']):
+            try:
+                question = questions.get(int(answer.get('question_id')))
+            except (TypeError, ValueError):
+                question = None
+            if question is None:
+                errors[index] = {'question_id': ['Not a question of this farm\'s report.']}
+                continue
+            if question.id in answered:
+                errors[index] = {'question_id': ['Answered more than once.']}
+                continue
+            answered.add(question.id)
+
+            column, field = self.ANSWER_FIELDS[question.question_type]
+            value = answer.get(column)
+            if value in (None, ''):
+                if question.is_required and question.id not in derived:
+                    errors[index] = {column: ['This question is required.']}
+                continue
+            try:
+                value = field.run_validation(value)
+            except serializers.ValidationError as exc:
+                errors[index] = {column: exc.detail}
+                continue
+            answers.append(ReportAnswer(question_id=question.id, **{column: value}))
+
+        if derived and not errors:
+            submitted = {answer.question_id: answer.answer_number for answer in answers}
+            values = derive_answers(farm, attrs['reference_date'], questions.values(), submitted)
+            values = {question_id: value for question_id, value in values.items() if value is not None}
+            answers = [answer for answer in answers if answer.question_id not in values]
+            answers += [ReportAnswer(question_id=question_id, answer_number=value) for question_id, value in values.items()]
+
+        missing = [
+            question.text for question in questions.values()
+            if question.is_required and question.id not in answered and question.id not in derived
+        ]
+        if missing:
+            errors['missing'] = [f'"{text}" is required.' for text in missing]
+        if errors:
+            raise serializers.ValidationError({'answers': errors})
+
+        attrs['answers'] = answers
+        return attrs
+
+    @transaction.atomic
     def create(self, validated_data):
-        answers_data = validated_data.pop('answers')
+        answers = validated_data.pop('answers')
         # user and farm are injected into validated_data by perform_create
-        
-        report = DailyReport.objects.create(**validated_data)
-        
-        for ans in answers_data:
-            question_id = ans.get('question_id')
-            # Determine which field to save based on value type or question type
-            # For simplicity, we expect the FE to send specific keys or we infer
-            # But simpler: FE sends 'value' and we put it in right column?
-            # Or FE sends 'answer_text', 'answer_number' etc.
-            
-            ReportAnswer.objects.create(
-                report=report,
-                question_id=question_id,
-                answer_text=ans.get('answer_text'),
-                answer_number=ans.get('answer_number'),
-                answer_date=ans.get('answer_date')
-            )
+        report, created = DailyReport.objects.update_or_create(
+            farm=validated_data['farm'],
+            reference_date=validated_data['reference_date'],
+            defaults={'user': validated_data['user']},
+        )
+        if not created:
+            # Answers always carry their report's date (see DailyReportSerializer.update),
+            # so the delete is pruned to that day's partition.
+            report.answers.filter(reference_date=report.reference_date).delete()
+        for answer in answers:
+            answer.report = report
+            answer.reference_date = report.reference_date
+        ReportAnswer.objects.bulk_create(answers)
         return report
+
+
+class ReportExportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ReportExport
+        fields = [
+            'id', 'format', 'start_date', 'end_date', 'status', 'progress', 'row_count', 'error',
+            'created_at', 'finished_at',
+        ]
+        read_only_fields = ['status', 'progress', 'row_count', 'error', 'created_at', 'finished_at']
+
+    def validate(self, data):
+        if data['start_date'] > data['end_date']:
+            raise serializers.ValidationError({'end_date': 'Must not be before start_date.'})
+        if (data['end_date'] - data['start_date']).days >= settings.REPORT_EXPORT_MAX_DAYS:
+            raise serializers.ValidationError(
+                {'end_date': f'Exports cover at most {settings.REPORT_EXPORT_MAX_DAYS} days.'}
+            )
+        return data
@@ -1,9 +1,26 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import ReportConfig, Question
+
+from core.cache import bump_farm_version
+from .cache import bump_report_form_version
+from .models import ReportConfig, Question, DailyReport
 from .defaults import DEFAULT_QUESTIONS
 
 @receiver(post_save, sender=ReportConfig)
 def seed_default_questions(sender, instance, created, **kwargs):
     # Auto-seeding is disabled to allow users to select their own questions via the UI.
     pass
+
+@receiver([post_save, post_delete], sender=ReportConfig)
+@receiver([post_save, post_delete], sender=DailyReport)
+def invalidate_report_cache(sender, instance, **kwargs):
+    bump_farm_version(instance.farm_id)
+    if sender is ReportConfig:
+        bump_report_form_version(instance.farm_id)
+
+@receiver([post_save, post_delete], sender=Question)
+def invalidate_question_cache(sender, instance, **kwargs):
+    # Questions are served nested in the report config, so they share its farm and form versions
+    farm_id = ReportConfig.objects.filter(pk=instance.config_id).values_list('farm_id', flat=True).first()
+    bump_farm_version(farm_id)
+    bump_report_form_version(farm_id)
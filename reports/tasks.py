@@ -1,53 +1,200 @@
-import os
+from datetime import timedelta
+from functools import partial
+
+from asgiref.sync import async_to_sync
 from celery import shared_task
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
-from datetime import timedelta
-from .models import ReportConfig
+
+from core.cache import cache_lock
 from core.models import User
 from core.utils import send_push_notification
+from .exports import count_reports, export_path, write_export
+from .models import MISSED_GRACE, REMINDER_LEAD, DailyReport, ReportConfig, ReportExport, ReportNotification
+
+# Due configs handled per transaction
+BATCH_SIZE = 500
+# Shorter than the beat interval, so a worker dying mid-run never blocks the next one
+LOCK_TIMEOUT = 4 * 60
+# Missed alerts this late (e.g. after a worker outage) are dropped instead of sent
+MISSED_ALERT_WINDOW = timedelta(hours=2)
+NOTIFICATION_RETENTION = timedelta(days=30)
+
+# kind -> (ReportConfig field holding when it is next due, its offset from the deadline)
+SCHEDULES = {
+    'deadline_reminder': ('next_reminder_at', -REMINDER_LEAD),
+    'deadline_missed': ('next_missed_at', MISSED_GRACE),
+}
+RECIPIENT_ROLES = {
+    'deadline_reminder': ['staff', 'manager', 'superuser', 'admin'],
+    'deadline_missed': ['superuser', 'manager', 'admin'],
+}
+
+
+def _is_current(kind, deadline, now):
+    """Whether a notification about `deadline` is still worth sending at `now`."""
+    if kind == 'deadline_reminder':
+        return now < deadline
+    return now < deadline + MISSED_ALERT_WINDOW
+
+
+def _dispatch_due(kind, now):
+    """
+    Queue `kind` notifications for every config whose schedule field is due,
+    then move those configs to the next day's deadline. Farms that already
+    submitted the day's report or were already notified are skipped. Returns
+    the number of notifications queued.
+    """
+    field, offset = SCHEDULES[kind]
+    due = ReportConfig.objects.filter(**{f'{field}__lte': now}).order_by(field)
+    queued = 0
+    while True:
+        with transaction.atomic():
+            # Row locks keep overlapping runs (e.g. after the lock expired) on
+            # disjoint configs; locked rows are advanced before they are released.
+            batch = list(
+                due.select_for_update(skip_locked=True).values_list('id', 'farm_id', field)[:BATCH_SIZE]
+            )
+            if not batch:
+                return queued
+            deadlines = {farm_id: due_at - offset for _, farm_id, due_at in batch}
+            days = {farm_id: timezone.localdate(deadline) for farm_id, deadline in deadlines.items()}
+            submitted = set(
+                DailyReport.objects.filter(farm_id__in=days, reference_date__in=set(days.values()))
+                .values_list('farm_id', 'reference_date')
+            )
+            notified = set(
+                ReportNotification.objects.filter(kind=kind, farm_id__in=days, reference_date__in=set(days.values()))
+                .values_list('farm_id', 'reference_date')
+            )
+            notifications = [
+                ReportNotification(farm_id=farm_id, reference_date=day, kind=kind)
+                for farm_id, day in days.items()
+                if (farm_id, day) not in submitted and (farm_id, day) not in notified
+                and _is_current(kind, deadlines[farm_id], now)
+            ]
+            ReportNotification.objects.bulk_create(notifications)
+            # A config more than a day behind stays due and is skipped as stale
+            # on the next pass, until it catches up with `now`.
+            ReportConfig.objects.filter(id__in=[config_id for config_id, _, _ in batch]).update(
+                **{field: F(field) + timedelta(days=1)}
+            )
+            for notification in notifications:
+                transaction.on_commit(partial(
+                    send_deadline_notification.delay,
+                    notification.farm_id, kind, notification.reference_date.isoformat(),
+                ))
+        queued += len(notifications)
+
 
 @shared_task
 def check_deadlines():
     """
-    Checks for approaching deadlines (1 hour remaining) and passed deadlines.
-    Sends notifications via Expo Push Notifications.
+    Queue "due soon" reminders (REMINDER_LEAD before the deadline) and
+    "deadline missed" alerts (MISSED_GRACE after it), at most once per farm,
+    day and kind. Only configs whose precomputed next_reminder_at or
+    next_missed_at has come due are read, through their indexes.
+    """
+    with cache_lock('check_deadlines', LOCK_TIMEOUT) as acquired:
+        if not acquired:
+            return 0
+        now = timezone.now()
+        return sum(_dispatch_due(kind, now) for kind in SCHEDULES)
+
+
+@shared_task
+def send_deadline_notification(farm_id, kind, reference_date):
+    """Push one deadline notification to the farm's members."""
+    config = ReportConfig.objects.select_related('farm').filter(farm_id=farm_id).first()
+    if config is None:
+        return
+    if kind == 'deadline_reminder':
+        if DailyReport.objects.filter(farm_id=farm_id, reference_date=reference_date).exists():
+            return
+        title = "Report Deadline"
+        message = f"Reminder: Daily Report is due soon ({config.deadline_time})."
+    else:
+        title = "Deadline Missed"
+        message = f"Alert: Daily Report deadline passed for {config.farm.name}."
+    recipients = User.objects.filter(farm_id=farm_id, role__in=RECIPIENT_ROLES[kind])
+    send_push_notification(recipients, title, message, data={'type': kind, 'config_id': config.id})
+
+
+@shared_task
+def prune_report_notifications():
+    """Delete sent-notification records past the retention horizon."""
+    deleted, _ = ReportNotification.objects.filter(
+        sent_at__lt=timezone.now() - NOTIFICATION_RETENTION
+    ).delete()
+    return deleted
+
+
+def notify_export(export):
+    """Push an export's status and progress to its requester's NotificationConsumer."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(channel_layer.group_send)(f"user_{export.user_id}", {
+        'type': 'notification.message',
+        'message': {
+            'type': 'report_export',
+            'id': export.id,
+            'status': export.status,
+            'progress': export.progress,
+            'row_count': export.row_count,
+            'error': export.error,
+        },
+    })
+
+
+@shared_task(
+    ignore_result=True,
+    soft_time_limit=settings.REPORT_EXPORT_TIME_LIMIT,
+    time_limit=settings.REPORT_EXPORT_TIME_LIMIT + 60,
+)
+def generate_report_export(export_id):
+    """
+    Write a queued ReportExport's file, reporting progress after every chunk.
+    Routed to the dedicated "exports" queue (CELERY_TASK_ROUTES), so exports
+    only ever occupy the export workers.
     """
-    print("DEBUG: check_deadlines task started")
-    now = timezone.now()
-    # Simple logic: Find configs where deadline is soon
-    # Note: deadline_time is just a TimeField, needs to be combined with Date
-    # For now, let's just find configs enabled.
-    
-    configs = ReportConfig.objects.filter(is_enabled=True, deadline_time__isnull=False)
-    print(f"DEBUG: Found {configs.count()} enabled report configs")
-    
-    for config in configs:
-        # Construct deadline datetime for today
-        deadline_time = config.deadline_time
-        today = now.date()
-        deadline_dt = timezone.datetime.combine(today, deadline_time)
-        if timezone.is_aware(now):
-            deadline_dt = timezone.make_aware(deadline_dt)
-        
-        # Check if 1 hour before (allow 5 min window for task execution)
-        time_diff = deadline_dt - now
-        print(f"DEBUG: Config {config.id} (Farm: {config.farm.name}) - Deadline: {deadline_dt}, Now: {now}, Diff: {time_diff}")
-        
-        # 1 Hour Reminder (Repeatedly notify during the last hour)
-        if timedelta(minutes=0) < time_diff <= timedelta(minutes=60):
-            print(f"DEBUG: Sending imminent deadline reminder for Farm {config.farm.name}")
-            # Notify Staff AND Admins
-            recipients = config.farm.members.filter(role__in=['staff', 'manager', 'superuser', 'admin'])
-            
-            message = f"Reminder: Daily Report is due soon ({deadline_time})."
-            send_push_notification(recipients, "Report Deadline", message, data={'type': 'deadline_reminder', 'config_id': config.id})
-
-        # Passed Deadline (e.g. 5 mins past)
-        if timedelta(minutes=-5) >= time_diff >= timedelta(minutes=-15):
-             print(f"DEBUG: Sending past deadline alert for Farm {config.farm.name}")
-             # Notify Admin
-             admins = config.farm.members.filter(role__in=['superuser', 'manager', 'admin']) 
-             
-             message = f"Alert: Daily Report deadline passed for {config.farm.name}."
-             send_push_notification(admins, "Deadline Missed", message, data={'type': 'deadline_missed', 'config_id': config.id})
+    # Claiming the row makes a redelivered message a no-op
+    if not ReportExport.objects.filter(pk=export_id, status='queued').update(status='running'):
+        return
+    export = ReportExport.objects.get(pk=export_id)
+    total = count_reports(export)
+    notify_export(export)
+
+    def on_chunk(rows):
+        export.row_count += rows
+        # 100 is kept for once the file is in place
+        export.progress = min(99, export.row_count * 100 // total) if total else 99
+        ReportExport.objects.filter(pk=export.pk).update(row_count=export.row_count, progress=export.progress)
+        notify_export(export)
+
+    try:
+        write_export(export, on_chunk)
+    except Exception as exc:
+        export.status, export.error = 'failed', str(exc) or exc.__class__.__name__
+        export.finished_at = timezone.now()
+        export.save(update_fields=['status', 'error', 'finished_at'])
+        notify_export(export)
+        raise
 
+    export.status, export.progress, export.finished_at = 'done', 100, timezone.now()
+    export.save(update_fields=['status', 'progress', 'row_count', 'finished_at'])
+    notify_export(export)
+
+
+@shared_task
+def prune_report_exports():
+    """Delete exports and their files past settings.REPORT_EXPORT_RETENTION_DAYS."""
+    cutoff = timezone.now() - timedelta(days=settings.REPORT_EXPORT_RETENTION_DAYS)
+    expired = ReportExport.objects.filter(created_at__lt=cutoff).exclude(status__in=ReportExport.ACTIVE_STATUSES)
+    for export in expired.only('id', 'farm_id', 'format'):
+        export_path(export).unlink(missing_ok=True)
+    deleted, _ = expired.delete()
+    return deleted
@@ -0,0 +1,619 @@
+import shutil
+import tempfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import skipIf
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.archive import pa
+from core.models import Farm, User
+from flocks.models import EggCollection, FeedLog, Flock, HealthLog
+
+from .defaults import DEFAULT_QUESTIONS
+from .derivations import QUESTION_KEYS
+from .exports import export_path
+from .models import (
+    MISSED_GRACE, REMINDER_LEAD, DailyReport, Question, ReportAnswer, ReportConfig, ReportExport, ReportNotification,
+    deadline_schedule,
+)
+from .tasks import SCHEDULES, check_deadlines, generate_report_export
+
+TEST_SETTINGS = {
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    'CHANNEL_LAYERS': {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+}
+
+
+def seed_default_questions(farm):
+    config = ReportConfig.objects.create(farm=farm, is_enabled=True)
+    return Question.objects.bulk_create(
+        Question(config=config, text=question['text'], question_type=question['type'], input_type='default',
+                 sort_order=index)
+        for index, question in enumerate(DEFAULT_QUESTIONS)
+    )
+
+
+@override_settings(**TEST_SETTINGS)
+class ReportExportTests(TestCase):
+    def setUp(self):
+        self.export_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.export_root, ignore_errors=True)
+        override = override_settings(REPORT_EXPORT_ROOT=self.export_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user('manager', password='password', role='manager')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.user.farm = self.farm
+        self.user.save()
+        self.questions = seed_default_questions(self.farm)
+        self.today = timezone.now().date()
+        for days_ago in range(3):
+            report = DailyReport.objects.create(
+                farm=self.farm, user=self.user, reference_date=self.today - timedelta(days=days_ago)
+            )
+            ReportAnswer.objects.bulk_create(
+                ReportAnswer(report=report, question=question, reference_date=report.reference_date,
+                             **({'answer_number': days_ago} if question.question_type == 'number'
+                                else {'answer_text': 'Fine <ok> & dry'}))
+                for question in self.questions
+            )
+
+    def export(self, format):
+        export = ReportExport.objects.create(
+            farm=self.farm, user=self.user, format=format,
+            start_date=self.today - timedelta(days=7), end_date=self.today,
+        )
+        generate_report_export(export.id)
+        export.refresh_from_db()
+        return export
+
+    def test_pdf_with_default_questions(self):
+        export = self.export('pdf')
+
+        self.assertEqual((export.status, export.error), ('done', ''))
+        self.assertEqual((export.row_count, export.progress), (3, 100))
+        path = export_path(export)
+        self.assertTrue(path.read_bytes().startswith(b'%PDF'))
+        self.assertFalse(path.with_suffix('.pdf.tmp').exists())
+
+    def test_csv_has_one_column_per_question(self):
+        export = self.export('csv')
+
+        lines = export_path(export).read_text().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(len(lines[0].split(',')), 3 + len(DEFAULT_QUESTIONS))
+
+
+
+@override_settings(**TEST_SETTINGS, ARCHIVE_HORIZON_DAYS=730)
+@skipIf(pa is None, 'pyarrow is not installed')
+class ArchivedReportTests(TestCase):
+    """Reports moved to cold storage by archive_cold_data are still read back."""
+    def setUp(self):
+        for setting in ('ARCHIVE_ROOT', 'REPORT_EXPORT_ROOT'):
+            root = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+            override = override_settings(**{setting: root})
+            override.enable()
+            self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user('owner', password='password', role='superuser')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.user.farm = self.farm
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        config = ReportConfig.objects.create(farm=self.farm, is_enabled=True)
+        self.question = Question.objects.create(config=config, text='Eggs', question_type='number')
+        self.today = timezone.now().date()
+        for days_ago in (0, 1, 800, 801, 802):
+            report = DailyReport.objects.create(
+                farm=self.farm, user=self.user, reference_date=self.today - timedelta(days=days_ago)
+            )
+            ReportAnswer.objects.create(
+                report=report, question=self.question, reference_date=report.reference_date, answer_number=days_ago,
+            )
+        call_command('archive_cold_data', stdout=StringIO())
+
+    def test_reports_are_archived(self):
+        self.assertEqual(DailyReport.objects.count(), 2)
+        self.assertEqual(ReportAnswer.objects.count(), 2)
+
+    def test_list_continues_into_the_archive(self):
+        pages = []
+        url = '/api/reports/submissions/?compact=true&page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([report['answers'][str(self.question.id)] for report in response.json()['results']])
+            url = response.json()['next']
+
+        self.assertEqual(pages, [['0.00', '1.00'], ['800.00', '801.00'], ['802.00']])
+
+    def test_series_includes_archived_answers(self):
+        response = self.client.get('/api/reports/answers/series/', {
+            'question': self.question.id, 'from': (self.today - timedelta(days=900)).isoformat(), 'bucket': 'month',
+        })
+
+        self.assertEqual(response.status_code, 200)
+        series = response.json()['questions'][0]['series']
+        self.assertEqual(sum(bucket['count'] for bucket in series), 5)
+        self.assertEqual(sum(Decimal(str(bucket['sum'])) for bucket in series), Decimal('2404'))
+
+    def submit(self, day, **answers):
+        return self.client.post('/api/reports/submissions/', {
+            'reference_date': day.isoformat(),
+            'answers': [{'question_id': self.question.id, 'answer_number': '1'}] + [
+                {'question_id': question.id, 'answer_number': value} for question, value in answers.items()
+            ],
+        }, format='json')
+
+    def test_archived_days_cannot_be_resubmitted(self):
+        response = self.submit(self.today - timedelta(days=800))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('reference_date', response.json())
+        self.assertEqual(DailyReport.objects.count(), 2)
+
+    def test_reports_cannot_move_onto_archived_days(self):
+        report = DailyReport.objects.get(reference_date=self.today)
+        response = self.client.patch(
+            f'/api/reports/submissions/{report.id}/',
+            {'reference_date': (self.today - timedelta(days=801)).isoformat()}, format='json',
+        )
+
+        self.assertEqual(response.status_code, 400)
+        report.refresh_from_db()
+        self.assertEqual(report.reference_date, self.today)
+
+    def test_feed_balance_carries_over_from_the_archive(self):
+        balance = Question.objects.create(
+            config=self.question.config, text='Feed balance (auto)', question_type='number', input_type='default',
+            is_required=False,
+        )
+        report = DailyReport.objects.create(
+            farm=self.farm, user=self.user, reference_date=self.today - timedelta(days=900)
+        )
+        ReportAnswer.objects.create(
+            report=report, question=balance, reference_date=report.reference_date, answer_number=40,
+        )
+        call_command('archive_cold_data', stdout=StringIO())
+
+        day = self.today - timedelta(days=2)
+        self.assertEqual(self.submit(day).status_code, 201)
+        self.assertEqual(ReportAnswer.objects.get(question=balance, reference_date=day).answer_number, Decimal('40.00'))
+
+    def test_export_includes_archived_reports(self):
+        export = ReportExport.objects.create(
+            farm=self.farm, user=self.user, format='csv',
+            start_date=self.today - timedelta(days=900), end_date=self.today,
+        )
+        generate_report_export(export.id)
+        export.refresh_from_db()
+
+        self.assertEqual((export.status, export.row_count), ('done', 5))
+        rows = export_path(export).read_text().splitlines()[1:]
+        self.assertEqual([row.split(',')[-1] for row in rows], ['802.00', '801.00', '800.00', '1.00', '0.00'])
+        self.assertTrue(all(row.split(',')[1] == 'owner' for row in rows))
+
+
+
+@override_settings(**TEST_SETTINGS)
+class ReportEditTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='password', role='superuser')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.user.farm = self.farm
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        config = ReportConfig.objects.create(farm=self.farm, is_enabled=True)
+        self.eggs = Question.objects.create(config=config, text='Eggs', question_type='number')
+        self.notes = Question.objects.create(config=config, text='Notes', question_type='text', is_required=False)
+        self.today = timezone.now().date()
+        self.yesterday = self.today - timedelta(days=1)
+
+    def submit(self, day, eggs, notes='Fine'):
+        response = self.client.post('/api/reports/submissions/', {
+            'reference_date': day.isoformat(),
+            'answers': [
+                {'question_id': self.eggs.id, 'answer_number': str(eggs)},
+                {'question_id': self.notes.id, 'answer_text': notes},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return DailyReport.objects.get(farm=self.farm, reference_date=day)
+
+    def test_moving_a_report_moves_its_answers(self):
+        report = self.submit(self.yesterday, 90)
+        answer_ids = set(report.answers.values_list('id', flat=True))
+
+        response = self.client.patch(
+            f'/api/reports/submissions/{report.id}/', {'reference_date': self.today.isoformat()}, format='json',
+        )
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(set(report.answers.values_list('id', flat=True)), answer_ids)
+        self.assertEqual(set(report.answers.values_list('reference_date', flat=True)), {self.today})
+        # Read paths that filter answers by their own date follow the move
+        response = self.client.get('/api/reports/answers/series/', {'question': self.eggs.id})
+        series = response.json()['questions'][0]['series']
+        self.assertEqual([(bucket['date'], bucket['sum']) for bucket in series], [(self.today.isoformat(), 90.0)])
+
+    def test_resubmitting_a_moved_report(self):
+        report = self.submit(self.yesterday, 90)
+        self.client.patch(
+            f'/api/reports/submissions/{report.id}/', {'reference_date': self.today.isoformat()}, format='json',
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            resubmitted = self.submit(self.today, 75, notes='Wet litter')
+
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "reports_reportanswer"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(resubmitted.id, report.id)
+        answers = {
+            question_id: (number, text, day)
+            for question_id, number, text, day in report.answers.values_list(
+                'question_id', 'answer_number', 'answer_text', 'reference_date',
+            )
+        }
+        self.assertEqual(answers, {
+            self.eggs.id: (Decimal('75.00'), None, self.today),
+            self.notes.id: (None, 'Wet litter', self.today),
+        })
+
+    def list_reports(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/reports/submissions/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results'], len(queries)
+
+    def test_list_after_edits(self):
+        for days_ago in (1, 2):
+            self.submit(self.today - timedelta(days=days_ago), 90 + days_ago)
+        moved = DailyReport.objects.get(reference_date=self.yesterday)
+        self.client.patch(
+            f'/api/reports/submissions/{moved.id}/', {'reference_date': self.today.isoformat()}, format='json',
+        )
+        compact, few_queries = self.list_reports(compact='true')
+        nested, few_nested_queries = self.list_reports()
+
+        self.assertEqual(
+            [(report['reference_date'], report['answers'][str(self.eggs.id)]) for report in compact],
+            [(self.today.isoformat(), '91.00'), ((self.today - timedelta(days=2)).isoformat(), '92.00')],
+        )
+        self.assertEqual(
+            {answer['answer_number'] for answer in nested[0]['answers']} - {None}, {'91.00'},
+        )
+
+        for days_ago in range(3, 9):
+            self.submit(self.today - timedelta(days=days_ago), 90 + days_ago)
+        compact, many_queries = self.list_reports(compact='true')
+        nested, many_nested_queries = self.list_reports()
+        self.assertEqual(len(compact), 8)
+        self.assertEqual((few_queries, few_nested_queries), (many_queries, many_nested_queries))
+
+    def test_fields_and_expand_trim_the_answer_prefetch(self):
+        self.submit(self.today, 90)
+        nested, nested_queries = self.list_reports()
+        ids, id_queries = self.list_reports(expand='')
+        dates, date_queries = self.list_reports(fields='id,reference_date')
+
+        self.assertEqual(nested[0]['answers'][0]['question_text'], 'Eggs')
+        self.assertEqual(sorted(ids[0]['answers']), sorted(answer['id'] for answer in nested[0]['answers']))
+        self.assertEqual(set(dates[0]), {'id', 'reference_date'})
+        # Nested answers join their question into the prefetch instead of adding
+        # a query, and without the answers field nothing is prefetched at all
+        self.assertEqual((nested_queries - id_queries, id_queries - date_queries), (0, 1))
+
+    def test_cannot_move_onto_another_report(self):
+        report = self.submit(self.yesterday, 90)
+        self.submit(self.today, 80)
+
+        response = self.client.patch(
+            f'/api/reports/submissions/{report.id}/', {'reference_date': self.today.isoformat()}, format='json',
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('reference_date', response.json())
+
+@override_settings(**TEST_SETTINGS)
+class AnswerSeriesTests(TestCase):
+    START = date(2026, 3, 1)
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='password', role='superuser')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.user.farm = self.farm
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        config = ReportConfig.objects.create(farm=self.farm, is_enabled=True)
+        self.eggs = Question.objects.create(config=config, text='Eggs', question_type='number', sort_order=1)
+        self.feed = Question.objects.create(config=config, text='Feed', question_type='number', sort_order=0)
+        self.notes = Question.objects.create(config=config, text='Notes', question_type='text', is_required=False)
+
+        # 2 and 9 March 2026 are Mondays
+        for day, eggs, feed in ((2, 80, '10.5'), (3, 90, None), (9, 100, None), (10, None, None), (32, 500, None)):
+            report = DailyReport.objects.create(
+                farm=self.farm, user=self.user, reference_date=self.START + timedelta(days=day - 1),
+            )
+            for question, value in ((self.eggs, eggs), (self.feed, feed)):
+                ReportAnswer.objects.create(
+                    report=report, question=question, reference_date=report.reference_date,
+                    answer_number=Decimal(value) if value is not None else None,
+                )
+
+    def series(self, bucket, questions=None, status=200):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/reports/answers/series/', {
+                'question': questions or f'{self.eggs.id},{self.feed.id}', 'bucket': bucket,
+                'from': self.START.isoformat(), 'to': date(2026, 3, 31).isoformat(),
+            })
+        self.assertEqual(response.status_code, status, response.content)
+        if status == 200:
+            # The questions, then every question's buckets in one grouped query
+            self.assertEqual(len(queries), 2)
+        return response.json()
+
+    def points(self, data, question):
+        series = next(entry['series'] for entry in data['questions'] if entry['id'] == question.id)
+        return [(point['date'], point['min'], point['max'], point['avg'], point['sum'], point['count']) for point in series]
+
+    def test_daily_buckets(self):
+        data = self.series('day')
+
+        self.assertEqual([entry['id'] for entry in data['questions']], [self.feed.id, self.eggs.id])
+        self.assertEqual(self.points(data, self.eggs), [
+            ('2026-03-02', 80.0, 80.0, 80.0, 80.0, 1),
+            ('2026-03-03', 90.0, 90.0, 90.0, 90.0, 1),
+            ('2026-03-09', 100.0, 100.0, 100.0, 100.0, 1),
+        ])
+        self.assertEqual(self.points(data, self.feed), [('2026-03-02', 10.5, 10.5, 10.5, 10.5, 1)])
+
+    def test_weekly_and_monthly_buckets(self):
+        self.assertEqual(self.points(self.series('week'), self.eggs), [
+            ('2026-03-02', 80.0, 90.0, 85.0, 170.0, 2),
+            ('2026-03-09', 100.0, 100.0, 100.0, 100.0, 1),
+        ])
+        self.assertEqual(self.points(self.series('month'), self.eggs), [('2026-03-01', 80.0, 100.0, 90.0, 270.0, 3)])
+
+    def test_only_numeric_questions_of_the_farm(self):
+        neighbour = User.objects.create_user('neighbour', password='password', role='superuser')
+        other_config = ReportConfig.objects.create(farm=Farm.objects.create(name='Other Farm', owner=neighbour))
+        other = Question.objects.create(config=other_config, text='Eggs', question_type='number')
+
+        for question in (self.notes, other):
+            data = self.series('day', questions=f'{self.eggs.id},{question.id}', status=400)
+            self.assertIn(str(question.id), data['error'])
+        self.series('hour', status=400)
+
+
+@override_settings(**TEST_SETTINGS)
+class QuestionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='password', role='superuser')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_user_without_farm(self):
+        response = self.client.post('/api/reports/questions/', {'text': 'Eggs', 'question_type': 'number'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_create_adds_the_config(self):
+        self.user.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.user.save()
+
+        response = self.client.post('/api/reports/questions/', {'text': 'Eggs', 'question_type': 'number'})
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Question.objects.get().config.farm, self.user.farm)
+
+@override_settings(**TEST_SETTINGS)
+class ReportFormTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner', password='password', role='superuser')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.user.farm = self.farm
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.config = ReportConfig.objects.create(farm=self.farm, is_enabled=True)
+        self.eggs = Question.objects.create(config=self.config, text='Eggs', question_type='number', sort_order=1)
+        Question.objects.create(config=self.config, text='Feed', question_type='number', sort_order=0)
+
+    def form(self, **params):
+        return self.client.get('/api/reports/config/form/', params)
+
+    def assert_form_changes(self, write):
+        """Run `write` and check that clients holding the old form fetch the new one."""
+        before = self.form().json()['version']
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        response = self.form(version=before)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.json()['version'], before)
+        return response.json()['config']
+
+    def test_unchanged_form_is_not_sent_again(self):
+        response = self.form()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([question['text'] for question in response.json()['config']['questions']], ['Feed', 'Eggs'])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.form(version=response.json()['version']).status_code, 304)
+        self.assertEqual(
+            self.client.get('/api/reports/config/form/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304,
+        )
+
+    def test_report_writes_leave_the_form_version(self):
+        version = self.form().json()['version']
+        with self.captureOnCommitCallbacks(execute=True):
+            DailyReport.objects.create(farm=self.farm, user=self.user, reference_date=timezone.now().date())
+        self.assertEqual(self.form(version=version).status_code, 304)
+
+    def test_question_writes_bump_the_form(self):
+        config = self.assert_form_changes(
+            lambda: self.client.patch(f'/api/reports/questions/{self.eggs.id}/', {'text': 'Eggs laid'})
+        )
+        self.assertEqual([question['text'] for question in config['questions']], ['Feed', 'Eggs laid'])
+
+        config = self.assert_form_changes(lambda: self.client.delete(f'/api/reports/questions/{self.eggs.id}/'))
+        self.assertEqual([question['text'] for question in config['questions']], ['Feed'])
+        self.assertEqual(
+            [question['text'] for question in self.client.get('/api/reports/questions/').json()], ['Feed'],
+        )
+
+    def test_config_writes_bump_the_form(self):
+        config = self.assert_form_changes(
+            lambda: self.client.post('/api/reports/config/', {'deadline_time': '18:00:00'}, format='json')
+        )
+        self.assertEqual(config['deadline_time'], '18:00:00')
+
+
+@override_settings(**TEST_SETTINGS)
+class DerivedAnswerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='password', role='superuser')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.user.farm = self.farm
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.questions = {QUESTION_KEYS.get(question.text): question for question in seed_default_questions(self.farm)}
+        Question.objects.filter(config__farm=self.farm).update(is_required=False)
+        self.today = timezone.now().date()
+        self.flock = Flock.objects.create(
+            name='House 1', breed='Isa Brown', initial_quantity=100, current_quantity=100,
+            user=self.user, farm=self.farm,
+        )
+
+    def submit(self, day, **numbers):
+        answers = [
+            {'question_id': self.questions[key].id, 'answer_number': str(value)} for key, value in numbers.items()
+        ]
+        response = self.client.post(
+            '/api/reports/submissions/', {'reference_date': day.isoformat(), 'answers': answers}, format='json',
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        # Derivations without their inputs store no answer
+        stored = dict(
+            ReportAnswer.objects.filter(report__reference_date=day).values_list('question_id', 'answer_number')
+        )
+        return {key: stored.get(question.id) for key, question in self.questions.items() if key}
+
+    def test_derived_answers_are_stored(self):
+        yesterday = self.today - timedelta(days=1)
+        HealthLog.objects.create(
+            flock=self.flock, date=yesterday, log_type='mortality', description='', affected_birds=4,
+        )
+        FeedLog.objects.create(flock=self.flock, date=self.today, quantity_kg=14, feed_type='Layer mash', cost=30)
+        EggCollection.objects.create(flock=self.flock, date=self.today, quantity_collected=200)
+
+        self.submit(yesterday, feed_issued=50, feed_consumed=10)
+        values = self.submit(self.today, feed_issued=20, water_consumption=28)
+
+        self.assertEqual(values['closing_stock'], Decimal('96.00'))
+        # 40 left yesterday, plus 20 issued, minus the 14 kg logged today
+        self.assertEqual(values['feed_balance'], Decimal('46.00'))
+        self.assertEqual(values['water_to_feed_ratio'], Decimal('2.00'))
+        # 14 kg over the 7 day window is 2 kg a day
+        self.assertEqual(values['feed_days_remaining'], Decimal('23.00'))
+        self.assertIsNotNone(values['fcr'])
+
+    def test_logs_dated_before_the_flock_was_entered(self):
+        last_week = self.today - timedelta(days=7)
+        HealthLog.objects.create(
+            flock=self.flock, date=last_week, log_type='cull', description='', affected_birds=5,
+        )
+        EggCollection.objects.create(flock=self.flock, date=last_week, quantity_collected=90)
+        FeedLog.objects.create(flock=self.flock, date=last_week, quantity_kg=9, feed_type='Layer mash', cost=20)
+
+        values = self.submit(last_week, feed_issued=9)
+
+        self.assertEqual(values['closing_stock'], Decimal('95.00'))
+        self.assertEqual(values['feed_balance'], Decimal('0.00'))
+        self.assertIsNotNone(values['fcr'])
+
+    def test_prefill(self):
+        EggCollection.objects.create(flock=self.flock, date=self.today, quantity_collected=100)
+        FeedLog.objects.create(flock=self.flock, date=self.today, quantity_kg=7, feed_type='Layer mash', cost=15)
+
+        response = self.client.get('/api/reports/submissions/prefill/', {'date': self.today.isoformat()})
+
+        self.assertEqual(response.status_code, 200)
+        answers = {answer['question_id']: answer['answer_number'] for answer in response.json()['answers']}
+        self.assertEqual(answers[self.questions['closing_stock'].id], '100.00')
+        self.assertEqual(answers[self.questions['feed_balance'].id], '-7.00')
+        # A negative balance forecasts no days of feed left
+        self.assertEqual(answers[self.questions['feed_days_remaining'].id], '0.00')
+
+
+@override_settings(**TEST_SETTINGS)
+class DeadlineTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='password', role='superuser')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.config = ReportConfig.objects.create(farm=self.farm, is_enabled=True, deadline_time='18:00')
+
+    def test_schedule_is_the_next_deadline(self):
+        morning = timezone.make_aware(datetime(2026, 3, 10, 9, 0))
+        evening = timezone.make_aware(datetime(2026, 3, 10, 19, 0))
+        deadline = timezone.make_aware(datetime(2026, 3, 10, 18, 0))
+
+        self.assertEqual(deadline_schedule(time(18, 0), morning), (deadline - REMINDER_LEAD, deadline + MISSED_GRACE))
+        tomorrow = deadline + timedelta(days=1)
+        self.assertEqual(deadline_schedule('18:00', evening), (tomorrow - REMINDER_LEAD, tomorrow + MISSED_GRACE))
+        self.assertEqual(deadline_schedule(None, morning), (None, None))
+
+    def test_saving_schedules_the_config(self):
+        self.assertIsNotNone(self.config.next_reminder_at)
+        self.assertEqual(self.config.next_missed_at - self.config.next_reminder_at, REMINDER_LEAD + MISSED_GRACE)
+
+        self.config.is_enabled = False
+        self.config.save()
+        self.assertEqual((self.config.next_reminder_at, self.config.next_missed_at), (None, None))
+
+    def make_due(self, kind, deadline):
+        field, offset = SCHEDULES[kind]
+        ReportConfig.objects.filter(pk=self.config.pk).update(**{field: deadline + offset})
+
+    def run_check(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            queued = check_deadlines()
+        return queued, len(callbacks)
+
+    def test_missed_alert_is_sent_once(self):
+        deadline = timezone.now() - timedelta(minutes=10)
+        self.make_due('deadline_missed', deadline)
+
+        self.assertEqual(self.run_check(), (1, 1))
+        notification = ReportNotification.objects.get()
+        self.assertEqual(
+            (notification.kind, notification.reference_date), ('deadline_missed', timezone.localdate(deadline)),
+        )
+        self.config.refresh_from_db()
+        self.assertEqual(self.config.next_missed_at, deadline + MISSED_GRACE + timedelta(days=1))
+
+        # Made due again for the same day, it is not sent twice
+        self.make_due('deadline_missed', deadline)
+        self.assertEqual(self.run_check(), (0, 0))
+
+    def test_no_reminder_once_the_report_is_in(self):
+        deadline = timezone.now() + timedelta(minutes=30)
+        self.make_due('deadline_reminder', deadline)
+        DailyReport.objects.create(farm=self.farm, user=self.user, reference_date=timezone.localdate(deadline))
+
+        self.assertEqual(self.run_check(), (0, 0))
+        self.assertFalse(ReportNotification.objects.exists())
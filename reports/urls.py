@@ -1,11 +1,15 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ReportConfigViewSet, DailyReportViewSet, QuestionViewSet
+from .views import (
+    ReportConfigViewSet, DailyReportViewSet, QuestionViewSet, ReportAnswerViewSet, ReportExportViewSet,
+)
 
 router = DefaultRouter()
 router.register(r'config', ReportConfigViewSet, basename='report-config')
 router.register(r'submissions', DailyReportViewSet, basename='report-submission')
 router.register(r'questions', QuestionViewSet, basename='report-question')
+router.register(r'answers', ReportAnswerViewSet, basename='report-answer')
+router.register(r'exports', ReportExportViewSet, basename='report-export')
 
 urlpatterns = [
     path('', include(router.urls)),
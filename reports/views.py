@@ -1,23 +1,55 @@
-from rest_framework import viewsets, status, permissions
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, DateField, Max, Min, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from rest_framework import mixins, serializers, viewsets, status, permissions
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import ReportConfig, Question, DailyReport
+
+from core.archive import archived_years, read_archive
+from core.cache import ConditionalGetMixin, cache_per_farm, conditional_per_farm
+from core.pagination import DailyReportCursorPagination
+from core.permissions import IsManager
+from core.utils import parse_date_range
+from core.serializers import FieldSelectionMixin
+
+from .archive import archived_answers, archived_reports
+from .cache import get_report_form, get_report_form_version, report_form_etag
+from .derivations import derive_answers
+from .exports import export_path
+from .models import ReportConfig, Question, DailyReport, ReportAnswer, ReportExport
 from .serializers import (
     ReportConfigSerializer, QuestionSerializer, 
-    DailyReportSerializer, DailyReportSubmissionSerializer
+    DailyReportSerializer, DailyReportSubmissionSerializer, ReportExportSerializer
 )
+from .tasks import generate_report_export
 
-class ReportConfigViewSet(viewsets.ModelViewSet):
+class ReportConfigViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = ReportConfigSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
-        print(f"DEBUG: ReportConfig List - User: {user}, Farm: {getattr(user, 'farm', 'None')}")
         if not user.farm:
             return ReportConfig.objects.none()
-        return ReportConfig.objects.filter(farm=user.farm)
-    
+        return ReportConfig.objects.filter(farm=user.farm).prefetch_related('questions')
+
+    @conditional_per_farm
+    def list(self, request, *args, **kwargs):
+        # A farm has at most one config; serve it from the cached form
+        if request.user.farm_id is None:
+            return super().list(request, *args, **kwargs)
+        config = get_report_form(request.user.farm_id)['config']
+        return Response([config] if config else [])
+
     def create(self, request, *args, **kwargs):
         user = self.request.user
         if not user.farm:
@@ -42,17 +74,46 @@ class ReportConfigViewSet(viewsets.ModelViewSet):
              raise serializers.ValidationError("User has no farm")
         serializer.save(farm=user.farm)
 
-class QuestionViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def form(self, request):
+        """
+        The farm's config and ordered questions, in one cached payload with a
+        version stamp. Clients send the version back as ?version= or the
+        ETag as If-None-Match and get 304 Not Modified while the form is
+        unchanged; the stamp only moves when the config or a question changes.
+        """
+        farm_id = request.user.farm_id
+        if farm_id is None:
+            return Response({'error': 'User has no farm'}, status=status.HTTP_400_BAD_REQUEST)
+
+        version = get_report_form_version(farm_id)
+        etag = report_form_etag(farm_id, version)
+        response = get_conditional_response(request, etag=etag)
+        if response is None and request.query_params.get('version') == str(version):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        if response is None:
+            response = Response(get_report_form(farm_id))
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+class QuestionViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = QuestionSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
-        print(f"DEBUG: Question List - User: {user}, Farm: {getattr(user, 'farm', 'None')}")
         if not user.farm:
             return Question.objects.none()
         return Question.objects.filter(config__farm=user.farm)
 
+    @conditional_per_farm
+    def list(self, request, *args, **kwargs):
+        if request.user.farm_id is None:
+            return super().list(request, *args, **kwargs)
+        config = get_report_form(request.user.farm_id)['config']
+        return Response(config['questions'] if config else [])
+
     def perform_create(self, serializer):
         user = self.request.user
         if not user.farm:
@@ -63,18 +124,139 @@ class QuestionViewSet(viewsets.ModelViewSet):
         serializer.save(config=config)
 
 
-class DailyReportViewSet(viewsets.ModelViewSet):
+class DailyReportViewSet(FieldSelectionMixin, viewsets.ModelViewSet):
+    """
+    Query params for list:
+    - from / to: inclusive range on reference_date
+    - compact=true: one row per report with answers keyed by question id,
+      plus the questions once at the top, instead of nested answer objects
+    Answers and their questions are prefetched (see FieldSelectionMixin), so
+    the query count does not grow with the number of reports. Once the live
+    reports run out, `next` continues into the archived ones (archived_before).
+    """
     permission_classes = [permissions.IsAuthenticated]
-    
+    pagination_class = DailyReportCursorPagination
+
     def get_queryset(self):
         user = self.request.user
-        print(f"DEBUG: DailyReport List - Request User: {user}, Farm: {getattr(user, 'farm', 'None')}")
         if not user.farm:
-            print("DEBUG: User has no farm")
             return DailyReport.objects.none()
-        qs = DailyReport.objects.filter(farm=user.farm)
-        print(f"DEBUG: Found {qs.count()} reports for farm {user.farm}")
-        return qs
+        queryset = DailyReport.objects.filter(farm=user.farm)
+        start, end = parse_date_range(self.request.query_params)
+        if start:
+            queryset = queryset.filter(reference_date__gte=start)
+        if end:
+            queryset = queryset.filter(reference_date__lte=end)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        if 'archived_before' in request.query_params:
+            return self.list_archived(request)
+        response = self.list_live(request, *args, **kwargs)
+        if response.data['next'] is None and request.user.farm_id is not None:
+            start, end = parse_date_range(request.query_params)
+            if archived_years(request.user.farm_id, 'daily_reports', start, end):
+                url = remove_query_param(request.build_absolute_uri(), self.paginator.cursor_query_param)
+                response.data['next'] = replace_query_param(url, 'archived_before', '')
+        return response
+
+    def list_archived(self, request):
+        """
+        A page of archived reports dated before ?archived_before= (or the
+        newest ones when it is empty), newest first, in the compact form.
+        """
+        farm_id = request.user.farm_id
+        if farm_id is None:
+            return Response({'error': 'User has no farm'}, status=status.HTTP_400_BAD_REQUEST)
+        start, end = parse_date_range(request.query_params)
+        before, _ = parse_date_range(request.query_params, start_param='archived_before', end_param='archived_before')
+        if before:
+            end = min(end or before, before - timedelta(days=1))
+
+        page_size = self.paginator.get_page_size(request)
+        reports = list(archived_reports(farm_id, start, end))[::-1]
+        page = reports[:page_size]
+        answers = archived_answers(farm_id, page[-1]['reference_date'], page[0]['reference_date']) if page else {}
+        results = [
+            {
+                'id': report['id'], 'reference_date': report['reference_date'], 'user': report['user'],
+                # strings, as in the nested answers
+                'answers': {
+                    question_id: str(value) if isinstance(value, Decimal) else value
+                    for question_id, value in answers.get(report['id'], {}).items()
+                },
+            }
+            for report in page
+        ]
+        next_url = None
+        if len(reports) > page_size:
+            next_url = replace_query_param(
+                request.build_absolute_uri(), 'archived_before', page[-1]['reference_date'].isoformat()
+            )
+        questions = Question.objects.filter(config__farm_id=farm_id)
+        return Response({
+            'next': next_url,
+            'previous': None,
+            'results': results,
+            'questions': QuestionSerializer(questions, many=True).data,
+        })
+
+    def list_live(self, request, *args, **kwargs):
+        if request.query_params.get('compact', '').lower() not in ('1', 'true'):
+            return super().list(request, *args, **kwargs)
+
+        reports = self.paginate_queryset(self.get_queryset().only('id', 'reference_date', 'user'))
+        answers = ReportAnswer.objects.filter(report__in=[report.id for report in reports])
+        if reports:
+            # Lets Postgres prune the answer partitions to the page's dates
+            dates = [report.reference_date for report in reports]
+            answers = answers.filter(reference_date__range=(min(dates), max(dates)))
+        answers = answers.values_list(
+            'report_id', 'question_id', 'answer_text', 'answer_number', 'answer_date', 'answer_boolean',
+        )
+        matrix = {report.id: {} for report in reports}
+        for report_id, question_id, text, number, day, boolean in answers:
+            if number is not None:
+                number = str(number)  # strings, as in the nested answers
+            matrix[report_id][question_id] = next(
+                (value for value in (text, number, day, boolean) if value is not None), None
+            )
+
+        response = self.get_paginated_response([
+            {'id': report.id, 'reference_date': report.reference_date, 'user': report.user_id, 'answers': matrix[report.id]}
+            for report in reports
+        ])
+        questions = Question.objects.filter(config__farm=request.user.farm)
+        response.data['questions'] = QuestionSerializer(questions, many=True).data
+        return response
+
+    @action(detail=False, methods=['get'])
+    def prefill(self, request):
+        """
+        Values of the auto-calculated questions for a day, to pre-fill the form.
+        Query params:
+        - date: the report date (default: today)
+        Answers already submitted for that day are used as inputs.
+        """
+        farm = request.user.farm
+        if not farm:
+            return Response({'error': 'User has no farm'}, status=status.HTTP_400_BAD_REQUEST)
+        day, _ = parse_date_range(request.query_params, start_param='date', end_param='date')
+        day = day or timezone.now().date()
+
+        questions = Question.objects.filter(config__farm=farm)
+        submitted = dict(
+            ReportAnswer.objects.filter(report__farm=farm, reference_date=day, answer_number__isnull=False)
+            .values_list('question_id', 'answer_number')
+        )
+        values = derive_answers(farm, day, questions, submitted)
+        return Response({
+            'reference_date': day,
+            'answers': [
+                {'question_id': question_id, 'answer_number': None if value is None else str(value)}
+                for question_id, value in values.items()
+            ],
+        })
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -83,3 +265,150 @@ class DailyReportViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user, farm=self.request.user.farm)
+
+
+class ReportAnswerViewSet(viewsets.ViewSet):
+    permission_classes = [permissions.IsAuthenticated]
+    # The default series range ends today
+    vary_by_day = True
+    BUCKETS = ('day', 'week', 'month')
+
+    @staticmethod
+    def bucket_start(day, bucket):
+        """The first day of `day`'s bucket, as Trunc computes it."""
+        if bucket == 'week':
+            return day - timedelta(days=day.weekday())
+        if bucket == 'month':
+            return day.replace(day=1)
+        return day
+
+    @action(detail=False, methods=['get'])
+    @cache_per_farm
+    def series(self, request):
+        """
+        Min, max, average and sum of numeric answers per time bucket.
+        Query params:
+        - question: one or more numeric question ids (repeat or comma-separate)
+        - from / to: date range on the report date (default: the last 30 days)
+        - bucket: day (default), week or month
+        All questions are aggregated in one grouped query on (question, reference_date).
+        """
+        farm = request.user.farm
+        if not farm:
+            return Response({'error': 'User has no farm'}, status=status.HTTP_400_BAD_REQUEST)
+
+        bucket = request.query_params.get('bucket', 'day')
+        if bucket not in self.BUCKETS:
+            return Response(
+                {'error': f"Bucket must be one of: {', '.join(self.BUCKETS)}"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            question_ids = {
+                int(part) for value in request.query_params.getlist('question') for part in value.split(',') if part
+            }
+        except ValueError:
+            return Response({'error': 'Question must be a list of question ids'}, status=status.HTTP_400_BAD_REQUEST)
+        if not question_ids:
+            return Response({'error': 'At least one question is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        questions = Question.objects.filter(id__in=question_ids, config__farm=farm, question_type='number')
+        questions = {question.id: question for question in questions}
+        if set(questions) != question_ids:
+            missing = ', '.join(str(question_id) for question_id in sorted(question_ids - set(questions)))
+            return Response(
+                {'error': f"Not numeric questions of this farm: {missing}"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        start, end = parse_date_range(request.query_params)
+        end = end or timezone.now().date()
+        start = start or end - timedelta(days=29)
+
+        rows = (
+            ReportAnswer.objects.filter(
+                question_id__in=question_ids, reference_date__gte=start, reference_date__lte=end,
+                answer_number__isnull=False,
+            )
+            .annotate(bucket=Trunc('reference_date', bucket, output_field=DateField()))
+            .values('question_id', 'bucket')
+            .annotate(
+                min=Min('answer_number'), max=Max('answer_number'), avg=Avg('answer_number'),
+                sum=Sum('answer_number'), count=Count('id'),
+            )
+            .order_by('question_id', 'bucket')
+        )
+        totals = {(row.pop('question_id'), row.pop('bucket')): row for row in rows}
+        # Answers of archived reports are folded into the same buckets
+        for row in read_archive(farm.id, 'report_answers', start, end):
+            value = row['answer_number']
+            if row['question'] not in questions or value is None:
+                continue
+            key = (row['question'], self.bucket_start(row['reference_date'], bucket))
+            total = totals.setdefault(key, {'min': value, 'max': value, 'avg': None, 'sum': Decimal('0'), 'count': 0})
+            total['min'], total['max'] = min(total['min'], value), max(total['max'], value)
+            total['sum'] += value
+            total['count'] += 1
+            total['avg'] = total['sum'] / total['count']
+
+        series = {question_id: [] for question_id in questions}
+        for (question_id, day), total in sorted(totals.items()):
+            series[question_id].append({'date': day, **total})
+
+        return Response({
+            'bucket': bucket,
+            'from': start,
+            'to': end,
+            'questions': [
+                {'id': question.id, 'text': question.text, 'series': series[question.id]}
+                for question in sorted(questions.values(), key=lambda question: (question.sort_order, question.id))
+            ],
+        })
+
+
+class ReportExportViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin,
+                          viewsets.GenericViewSet):
+    """
+    CSV or PDF packs of the farm's daily reports for a date range.
+    POST {format, start_date, end_date} queues one and returns it with status
+    "queued"; the requester then receives status and progress updates on the
+    notifications websocket and fetches the file from `download` once done.
+    At most one export per farm and REPORT_EXPORT_QUEUE_LIMIT in total are
+    queued or running at a time; further requests get 429.
+    """
+    serializer_class = ReportExportSerializer
+    permission_classes = [IsManager]
+
+    def get_queryset(self):
+        user = self.request.user
+        if not user.farm:
+            return ReportExport.objects.none()
+        return ReportExport.objects.filter(farm=user.farm)
+
+    def create(self, request, *args, **kwargs):
+        if not request.user.farm:
+            return Response({'error': 'User has no farm'}, status=status.HTTP_400_BAD_REQUEST)
+        active = ReportExport.objects.filter(status__in=ReportExport.ACTIVE_STATUSES)
+        if active.filter(farm=request.user.farm).exists():
+            return Response(
+                {'error': 'An export for this farm is already in progress'}, status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+        if active.count() >= settings.REPORT_EXPORT_QUEUE_LIMIT:
+            return Response(
+                {'error': 'Too many exports in progress, try again shortly'},
+                status=status.HTTP_429_TOO_MANY_REQUESTS, headers={'Retry-After': '60'},
+            )
+        return super().create(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        export = serializer.save(farm=self.request.user.farm, user=self.request.user)
+        transaction.on_commit(lambda: generate_report_export.delay(export.id))
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        export = self.get_object()
+        path = export_path(export)
+        if export.status != 'done' or not path.exists():
+            return Response({'error': 'Export is not ready'}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(
+            open(path, 'rb'), as_attachment=True,
+            filename=f'daily-reports-{export.start_date}-{export.end_date}.{export.format}',
+        )
@@ -0,0 +1,18 @@
+from django.db import models
+
+class Tombstone(models.Model):
+    """
+    Records a deleted row so offline clients can drop it on their next sync.
+    farm_id is deliberately not a foreign key: tombstones are written while a
+    farm's own rows are being cascade-deleted.
+    """
+    farm_id = models.BigIntegerField()
+    model = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['farm_id', 'deleted_at'])]
+
+    def __str__(self):
+        return f"{self.model} {self.object_id} deleted {self.deleted_at}"
@@ -0,0 +1,44 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from finances.models import Transaction
+from flocks.models import Flock, FeedLog, HealthLog, EggCollection, flock_logs_deleted
+from reports.models import Question, DailyReport, ReportConfig
+from .models import Tombstone
+
+
+def record_tombstone(farm_id, model, object_id):
+    if farm_id is not None:
+        Tombstone.objects.create(farm_id=farm_id, model=model, object_id=object_id)
+
+
+@receiver(post_delete, sender=Flock)
+def flock_deleted(sender, instance, **kwargs):
+    record_tombstone(instance.farm_id, 'flocks', instance.pk)
+
+
+@receiver(flock_logs_deleted)
+def logs_deleted(sender, farm_id, ids, **kwargs):
+    # Sent once per single log delete, per farm for a queryset delete and per log table for a flock's cascade
+    if farm_id is None:
+        return
+    model = {FeedLog: 'feed_logs', HealthLog: 'health_logs', EggCollection: 'egg_collections'}[sender]
+    Tombstone.objects.bulk_create(
+        [Tombstone(farm_id=farm_id, model=model, object_id=object_id) for object_id in ids], batch_size=1000
+    )
+
+
+@receiver(post_delete, sender=Transaction)
+def transaction_deleted(sender, instance, **kwargs):
+    record_tombstone(instance.farm_id, 'transactions', instance.pk)
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    farm_id = ReportConfig.objects.filter(pk=instance.config_id).values_list('farm_id', flat=True).first()
+    record_tombstone(farm_id, 'questions', instance.pk)
+
+
+@receiver(post_delete, sender=DailyReport)
+def daily_report_deleted(sender, instance, **kwargs):
+    record_tombstone(instance.farm_id, 'daily_reports', instance.pk)
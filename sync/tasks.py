@@ -0,0 +1,12 @@
+from celery import shared_task
+from django.utils import timezone
+
+from .models import Tombstone
+from .views import TOMBSTONE_RETENTION
+
+
+@shared_task
+def prune_tombstones():
+    """Delete tombstones past the retention horizon; older cursors get a full reset."""
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=timezone.now() - TOMBSTONE_RETENTION).delete()
+    return deleted
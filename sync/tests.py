@@ -0,0 +1,173 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.cache import get_farm_version
+from core.models import Farm, User
+from flocks.models import EggCollection, FeedLog, Flock
+from reports.models import DailyReport, Question, ReportAnswer, ReportConfig
+
+from .models import Tombstone
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class SyncTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='password', role='superuser')
+        self.farm = Farm.objects.create(name='Test Farm', owner=self.user)
+        self.user.farm = self.farm
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.today = timezone.now().date()
+
+    def add_flock(self, name='House 1', logs=0):
+        flock = Flock.objects.create(
+            name=name, breed='Isa Brown', initial_quantity=100, current_quantity=100,
+            user=self.user, farm=self.farm,
+        )
+        FeedLog.objects.bulk_create(
+            FeedLog(flock=flock, date=self.today - timedelta(days=day), quantity_kg=10, feed_type='Layer mash')
+            for day in range(logs)
+        )
+        EggCollection.objects.bulk_create(
+            EggCollection(flock=flock, date=self.today - timedelta(days=day), quantity_collected=80)
+            for day in range(logs)
+        )
+        return flock
+
+
+class TombstoneTests(SyncTestCase):
+    def delete_flock_queries(self, logs):
+        flock = self.add_flock(logs=logs)
+        with CaptureQueriesContext(connection) as queries:
+            flock.delete()
+        return len(queries)
+
+    def test_flock_delete_does_not_load_each_log(self):
+        few = self.delete_flock_queries(logs=2)
+        many = self.delete_flock_queries(logs=30)
+        self.assertEqual(few, many)
+
+    def test_cascaded_and_single_log_deletes_leave_tombstones(self):
+        flock = self.add_flock(logs=3)
+        log_ids = set(FeedLog.objects.filter(flock=flock).values_list('id', flat=True))
+        response = self.client.delete(f'/api/feed-logs/{min(log_ids)}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            set(Tombstone.objects.filter(model='feed_logs').values_list('object_id', flat=True)), {min(log_ids)}
+        )
+
+        flock.delete()
+        tombstones = Tombstone.objects.filter(farm_id=self.farm.id)
+        self.assertEqual(set(tombstones.filter(model='feed_logs').values_list('object_id', flat=True)), log_ids)
+        self.assertEqual(tombstones.filter(model='egg_collections').count(), 3)
+        self.assertEqual(tombstones.filter(model='flocks').count(), 1)
+
+    def test_queryset_deletes_leave_tombstones_per_farm(self):
+        flock = self.add_flock(logs=3)
+        neighbour = User.objects.create_user('neighbour', password='password', role='superuser')
+        other_farm = Farm.objects.create(name='Other Farm', owner=neighbour)
+        other_log = FeedLog.objects.create(
+            flock=Flock.objects.create(
+                name='House 1', breed='Isa Brown', initial_quantity=100, current_quantity=100, user=neighbour,
+                farm=other_farm,
+            ),
+            date=self.today, quantity_kg=10, feed_type='Layer mash',
+        )
+        deleted = set(
+            FeedLog.objects.filter(flock=flock, date__gt=self.today - timedelta(days=2)).values_list('id', flat=True)
+        )
+        versions = {farm_id: get_farm_version(farm_id) for farm_id in (self.farm.id, other_farm.id)}
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FeedLog.objects.filter(date=self.today).delete()
+            FeedLog.objects.filter(flock=flock, date=self.today - timedelta(days=1)).delete()
+
+        self.assertEqual(
+            set(Tombstone.objects.filter(farm_id=self.farm.id, model='feed_logs').values_list('object_id', flat=True)),
+            deleted,
+        )
+        self.assertEqual(
+            list(Tombstone.objects.filter(farm_id=other_farm.id).values_list('model', 'object_id')),
+            [('feed_logs', other_log.id)],
+        )
+        self.assertTrue(all(get_farm_version(farm_id) != version for farm_id, version in versions.items()))
+        self.assertEqual(FeedLog.objects.filter(flock=flock).count(), 1)
+
+
+class DeltaTests(SyncTestCase):
+    def sync(self, **params):
+        response = self.client.get('/api/sync/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_pages_are_capped_per_model(self):
+        flock = self.add_flock(logs=5)
+        with patch('sync.views.PAGE_SIZE', 2):
+            first = self.sync()
+            self.assertEqual(len(first['changes']['feed_logs']), 2)
+            self.assertTrue(first['has_more']['feed_logs'])
+            self.assertFalse(first['has_more']['flocks'])
+
+            seen = [log['id'] for log in first['changes']['feed_logs']]
+            response = first
+            while response['next_page']:
+                response = self.sync(page=response['next_page'])
+                self.assertEqual(response['cursor'], first['cursor'])
+                self.assertEqual(response['changes']['flocks'], [])
+                seen += [log['id'] for log in response['changes']['feed_logs']]
+
+        self.assertEqual(sorted(seen), sorted(FeedLog.objects.filter(flock=flock).values_list('id', flat=True)))
+
+    def test_invalid_page(self):
+        response = self.client.get('/api/sync/', {'page': 'not-a-page'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_daily_report_queries_do_not_grow_with_reports(self):
+        config = ReportConfig.objects.create(farm=self.farm, is_enabled=True)
+        question = Question.objects.create(config=config, text='Eggs', question_type='number')
+
+        def add_reports(days):
+            for day in days:
+                report = DailyReport.objects.create(
+                    farm=self.farm, user=self.user, reference_date=self.today - timedelta(days=day)
+                )
+                ReportAnswer.objects.create(report=report, question=question, answer_number=day)
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.sync()
+            return len(queries)
+
+        add_reports(range(1))
+        one = count_queries()
+        add_reports(range(1, 6))
+        self.assertEqual(count_queries(), one)
+
+    def test_creates_can_reference_earlier_creates(self):
+        response = self.client.post('/api/sync/', {'operations': [
+            {'client_id': 'house', 'model': 'flocks', 'op': 'create', 'data': {
+                'name': 'House 9', 'breed': 'Isa Brown', 'initial_quantity': 50, 'current_quantity': 50,
+            }},
+            {'client_id': 'feed', 'model': 'feed_logs', 'op': 'create', 'data': {
+                'flock': {'client_id': 'house'}, 'date': self.today.isoformat(), 'quantity_kg': '5.00',
+                'feed_type': 'Layer mash',
+            }},
+            {'client_id': 'orphan', 'model': 'feed_logs', 'op': 'create', 'data': {
+                'flock': {'client_id': 'missing'}, 'date': self.today.isoformat(), 'quantity_kg': '1.00',
+                'feed_type': 'Layer mash',
+            }},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        body = response.json()
+
+        self.assertEqual([result['status'] for result in body['results']], ['ok', 'ok', 'error'])
+        self.assertEqual(set(body['ids']), {'house', 'feed'})
+        log = FeedLog.objects.get(pk=body['ids']['feed'])
+        self.assertEqual(log.flock_id, body['ids']['house'])
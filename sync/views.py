@@ -0,0 +1,251 @@
+import base64
+import binascii
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from rest_framework import status, viewsets, serializers
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from finances.views import TransactionViewSet
+from flocks.views import FlockViewSet, FeedLogViewSet, HealthLogViewSet, EggCollectionViewSet
+from reports.views import QuestionViewSet, DailyReportViewSet
+
+from .models import Tombstone
+
+# Rows are pulled and written through the regular viewsets, so farm scoping,
+# permissions and write side effects stay identical to the REST endpoints.
+SYNC_VIEWSETS = {
+    'flocks': FlockViewSet,
+    'feed_logs': FeedLogViewSet,
+    'health_logs': HealthLogViewSet,
+    'egg_collections': EggCollectionViewSet,
+    'transactions': TransactionViewSet,
+    'questions': QuestionViewSet,
+    'daily_reports': DailyReportViewSet,
+}
+
+# Writes that commit just after a sync started carry an earlier updated_at,
+# so cursors trail the clock and clients may see a row twice but never miss one.
+CURSOR_OVERLAP = timedelta(minutes=1)
+TOMBSTONE_RETENTION = timedelta(days=90)
+MAX_OPERATIONS = 500
+# Rows per model in one delta response; the rest are fetched with next_page
+PAGE_SIZE = 500
+
+
+class SyncOperationSerializer(serializers.Serializer):
+    OPS = ('create', 'update', 'delete')
+
+    client_id = serializers.CharField(required=False, allow_blank=True)
+    model = serializers.ChoiceField(choices=list(SYNC_VIEWSETS))
+    op = serializers.ChoiceField(choices=OPS)
+    id = serializers.IntegerField(required=False)
+    data = serializers.DictField(required=False, default=dict)
+
+    def validate(self, attrs):
+        if attrs['op'] != 'create' and 'id' not in attrs:
+            raise serializers.ValidationError({'id': f"Required for {attrs['op']}."})
+        return attrs
+
+
+class SyncUploadSerializer(serializers.Serializer):
+    operations = SyncOperationSerializer(many=True, max_length=MAX_OPERATIONS)
+
+
+def encode_cursor(moment):
+    return str(int(moment.timestamp() * 1000))
+
+
+def decode_cursor(cursor):
+    try:
+        return datetime.fromtimestamp(int(cursor) / 1000, tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        raise serializers.ValidationError({'since': 'Invalid sync cursor.'})
+
+
+def encode_page(started, positions):
+    """
+    Opaque token for the next page of a delta: when the first page was
+    built, and for each model with rows left, the (updated_at, pk) of the
+    last row sent.
+    """
+    payload = {
+        'started': started.isoformat(),
+        'after': {model: [updated_at.isoformat(), pk] for model, (updated_at, pk) in positions.items()},
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_page(token):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        started = datetime.fromisoformat(payload['started'])
+        positions = {
+            model: (datetime.fromisoformat(updated_at), int(pk))
+            for model, (updated_at, pk) in payload['after'].items() if model in SYNC_VIEWSETS
+        }
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError, AttributeError):
+        raise serializers.ValidationError({'page': 'Invalid sync page.'})
+    return started, positions
+
+
+def resolve_client_ids(value, ids):
+    """
+    Replace every {"client_id": ...} in operation data with the id of the row
+    created for it earlier in the same upload.
+    """
+    if isinstance(value, dict):
+        if set(value) == {'client_id'}:
+            if value['client_id'] not in ids:
+                raise KeyError(value['client_id'])
+            return ids[value['client_id']]
+        return {key: resolve_client_ids(item, ids) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_client_ids(item, ids) for item in value]
+    return value
+
+
+class SyncViewSet(viewsets.ViewSet):
+    """
+    Delta sync for offline clients.
+    GET  /api/sync/?since=<cursor> returns rows changed and ids deleted since the cursor.
+    POST /api/sync/?since=<cursor> first applies {"operations": [...]} queued
+    offline, then returns the same delta including the effects of those writes.
+    A create's data may reference a row created earlier in the same upload as
+    {"client_id": "<that operation's client_id>"}; "ids" maps each created
+    client_id to its server id.
+
+    Each model returns at most PAGE_SIZE rows. While "next_page" is set, the
+    client requests GET ?since=<same cursor>&page=<next_page> for the rest and
+    only stores "cursor" once a response has no next_page.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        if not request.user.farm:
+            return Response({'error': 'User has no farm'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.delta(request))
+
+    def create(self, request):
+        if not request.user.farm:
+            return Response({'error': 'User has no farm'}, status=status.HTTP_400_BAD_REQUEST)
+
+        upload = SyncUploadSerializer(data=request.data)
+        upload.is_valid(raise_exception=True)
+        results, ids = [], {}
+        for operation in upload.validated_data['operations']:
+            try:
+                operation['data'] = resolve_client_ids(operation['data'], ids)
+            except KeyError as e:
+                results.append({
+                    'client_id': operation.get('client_id'), 'model': operation['model'], 'op': operation['op'],
+                    'status': 'error', 'errors': {'detail': f'Unknown client_id reference {e.args[0]!r}.'},
+                })
+                continue
+            result = self.apply(request, operation)
+            if operation['op'] == 'create' and result['status'] == 'ok' and result['client_id']:
+                ids[result['client_id']] = result['id']
+            results.append(result)
+
+        return Response({**self.delta(request), 'results': results, 'ids': ids})
+
+    def get_viewset(self, request, model, action):
+        viewset = SYNC_VIEWSETS[model](
+            request=request, args=(), kwargs={}, format_kwarg=None, action=action
+        )
+        viewset.check_permissions(request)
+        return viewset
+
+    def apply(self, request, operation):
+        """Apply one queued write in its own savepoint and report the outcome."""
+        result = {'client_id': operation.get('client_id'), 'model': operation['model'], 'op': operation['op']}
+        action = {'create': 'create', 'update': 'partial_update', 'delete': 'destroy'}[operation['op']]
+        try:
+            with transaction.atomic():
+                viewset = self.get_viewset(request, operation['model'], action)
+                if action == 'create':
+                    serializer = viewset.get_serializer(data=operation['data'])
+                    serializer.is_valid(raise_exception=True)
+                    viewset.perform_create(serializer)
+                    result['id'] = serializer.instance.pk
+                else:
+                    instance = viewset.get_queryset().get(pk=operation['id'])
+                    viewset.check_object_permissions(request, instance)
+                    result['id'] = instance.pk
+                    if action == 'destroy':
+                        viewset.perform_destroy(instance)
+                    else:
+                        serializer = viewset.get_serializer(instance, data=operation['data'], partial=True)
+                        serializer.is_valid(raise_exception=True)
+                        viewset.perform_update(serializer)
+        except ObjectDoesNotExist:
+            result.update(status='error', errors={'detail': 'Not found.'})
+        except APIException as e:
+            result.update(status='error', errors=e.detail)
+        except IntegrityError:
+            result.update(status='error', errors={'detail': 'Conflicts with existing data.'})
+        else:
+            result['status'] = 'ok'
+        return result
+
+    def delta(self, request):
+        page = request.query_params.get('page')
+        started, positions = decode_page(page) if page else (timezone.now(), None)
+        since = request.query_params.get('since')
+        since = decode_cursor(since) if since else None
+
+        # Deletions older than the tombstone horizon are gone, so start over
+        reset = since is not None and since < started - TOMBSTONE_RETENTION
+        if reset:
+            since = None
+
+        changes, deleted, has_more, next_positions = {}, {}, {}, {}
+        for model in SYNC_VIEWSETS:
+            try:
+                viewset = self.get_viewset(request, model, 'list')
+            except APIException:
+                continue # e.g. staff do not receive finance data
+            changes[model], deleted[model], has_more[model] = [], [], False
+            if positions is not None and model not in positions:
+                continue # sent in full on an earlier page
+
+            # filter_queryset adds the joins and prefetches the serializer needs
+            queryset = viewset.filter_queryset(viewset.get_queryset())
+            if since is not None:
+                queryset = queryset.filter(updated_at__gt=since)
+            if positions is not None:
+                updated_at, pk = positions[model]
+                queryset = queryset.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, pk__gt=pk))
+            rows = list(queryset.order_by('updated_at', 'pk')[:PAGE_SIZE + 1])
+            if len(rows) > PAGE_SIZE:
+                rows = rows[:PAGE_SIZE]
+                has_more[model] = True
+                next_positions[model] = (rows[-1].updated_at, rows[-1].pk)
+            changes[model] = viewset.get_serializer(rows, many=True).data
+
+        # Deletions go out with the first page only
+        if since is not None and positions is None:
+            tombstones = Tombstone.objects.filter(
+                farm_id=request.user.farm_id, deleted_at__gt=since, deleted_at__lte=started,
+                model__in=list(deleted),
+            ).values_list('model', 'object_id')
+            for model, object_id in tombstones:
+                deleted[model].append(object_id)
+
+        return {
+            # Every page carries the cursor of the first, so rows written to a
+            # model after its last page are picked up by the next sync.
+            'cursor': encode_cursor(started - CURSOR_OVERLAP),
+            'reset': reset,
+            'changes': changes,
+            'deleted': deleted,
+            'has_more': has_more,
+            'next_page': encode_page(started, next_positions) if next_positions else None,
+        }